@@ -6,6 +6,9 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 #
+import gzip
+import json
+import ldap
 import time
 import subprocess
 import pytest
@@ -134,6 +137,49 @@ def test_dsconf_dbgen_users(topology_st, set_log_file_and_ldif):
     assert len(accounts.filter('(uid=*)')) > count_account
 
 
+def test_dsconf_dbgen_users_sharded(topology_st, set_log_file_and_ldif):
+    """Test that ldifgen generates the same users with any number of workers
+
+    :id: 9d5ada9a-70d6-49b8-86b5-63e026106e55
+    :setup: Standalone instance
+    :steps:
+         1. Generate a LDIF of users with a seed and 3 shards in one process
+         2. Generate it again with 3 worker processes
+         3. Generate it again with gzip compression
+         4. Import the generated ldif to database
+    :expectedresults:
+         1. Success
+         2. The LDIF files are identical
+         3. The uncompressed data is identical
+         4. Success
+    """
+
+    standalone = topology_st.standalone
+    sharded_ldif = ldif_file + '.sharded'
+    gzip_ldif = ldif_file + '.gz'
+
+    log.info('Generate the users with one process, then with 3 workers')
+    dbgen_users(standalone, 1000, ldif_file, DEFAULT_SUFFIX, seed=42, shards=3)
+    dbgen_users(standalone, 1000, sharded_ldif, DEFAULT_SUFFIX, seed=42, shards=3, workers=3)
+    dbgen_users(standalone, 1000, gzip_ldif, DEFAULT_SUFFIX, seed=42, shards=3, workers=3, compress=True)
+    try:
+        with open(ldif_file, 'rb') as f:
+            content = f.read()
+        with open(sharded_ldif, 'rb') as f:
+            assert f.read() == content
+        with gzip.open(gzip_ldif, 'rb') as f:
+            assert f.read() == content
+    finally:
+        os.remove(sharded_ldif)
+        os.remove(gzip_ldif)
+    assert content.count(b'\ndn: uid=') == 1000
+
+    accounts = Accounts(standalone, DEFAULT_SUFFIX)
+    count_account = len(accounts.filter('(uid=*)'))
+    run_offline_import(standalone, ldif_file)
+    assert len(accounts.filter('(uid=*)')) > count_account
+
+
 @pytest.mark.ds50545
 @pytest.mark.bz1798394
 @pytest.mark.skipif(ds_is_older("1.4.3"), reason="Not implemented")
@@ -781,6 +827,105 @@ def test_dsconf_dbgen_nested_ldif(topology_st, set_log_file_and_ldif):
     assert len(accounts.filter('(ou=*)')) > count_ou
 
 
+def test_dsconf_dbgen_workload(topology_st, set_log_file_and_ldif):
+    """Test ldifgen to create a workload model ldif, modify load and filters
+
+    :id: e75dabc0-b840-4ed2-98d2-414116545347
+    :setup: Standalone instance
+    :steps:
+         1. Run ldifgen to generate a workload ldif with a small profile
+         2. Import generated ldif to database
+         3. Check the users and groups were imported
+         4. Apply the modify load with ldapmodify
+         5. Check the search filters match entries
+    :expectedresults:
+         1. Success
+         2. Success
+         3. Success
+         4. Success
+         5. Success
+    """
+
+    standalone = topology_st.standalone
+    profile_file = ldif_file + '.json'
+    with open(profile_file, 'w') as f:
+        json.dump({"users": {"number": 500},
+                   "groups": {"number": 20, "size": {"max": 200},
+                              "large": {"number": 1, "size": 400}},
+                   "modLoad": {"number": 200},
+                   "searches": {"number": 50}}, f)
+
+    args = FakeArgs()
+    args.profile = profile_file
+    args.show_profile = False
+    args.suffix = DEFAULT_SUFFIX
+    args.seed = 1
+    args.ldif_file = ldif_file
+    args.mod_ldif_file = None
+    args.filter_file = None
+
+    log.info('Run ldifgen to create the workload ldif')
+    dbgen_create_workload(standalone, log, args)
+    os.remove(profile_file)
+    mod_ldif_file = os.path.splitext(ldif_file)[0] + '-mods.ldif'
+    filter_file = os.path.splitext(ldif_file)[0] + '-filters.txt'
+    check_value_in_log_and_reset(['Writing LDIF',
+                                  'containing 500 users and 20 groups',
+                                  'containing 200 operations',
+                                  'containing 50 filters'])
+
+    run_offline_import(standalone, ldif_file)
+    accounts = Accounts(standalone, DEFAULT_SUFFIX)
+    assert len(accounts.filter('(uid=*)')) == 500
+    groups = Groups(standalone, DEFAULT_SUFFIX, rdn='ou=groups')
+    assert len(groups.list()) == 20
+
+    try:
+        with open(filter_file, 'r') as f:
+            filters = [l.strip() for l in f if not l.startswith('(memberOf=')]
+        for filt in filters:
+            assert standalone.search_s(DEFAULT_SUFFIX, ldap.SCOPE_SUBTREE, filt, ['dn'])
+
+        run_ldapmodify_from_file(standalone, mod_ldif_file)
+    finally:
+        os.remove(mod_ldif_file)
+        os.remove(filter_file)
+
+
+def test_dsconf_dbgen_workload_membership_attr(topology_st):
+    """Test ldifgen rejects a workload with an unsupported group membership attribute
+
+    :id: 3c6f0f8e-5f0b-4d1e-9a43-0c2f4f7e8d21
+    :setup: Standalone instance
+    :steps:
+         1. Run ldifgen to generate a workload ldif with owner as membership attribute
+    :expectedresults:
+         1. A ValueError is raised and no ldif is written
+    """
+
+    standalone = topology_st.standalone
+    workload_ldif = get_ldif_dir(standalone) + '/workload.ldif'
+    profile_file = workload_ldif + '.json'
+    with open(profile_file, 'w') as f:
+        json.dump({"groups": {"membershipAttr": "owner"}}, f)
+
+    args = FakeArgs()
+    args.profile = profile_file
+    args.show_profile = False
+    args.suffix = DEFAULT_SUFFIX
+    args.seed = 1
+    args.ldif_file = workload_ldif
+    args.mod_ldif_file = None
+    args.filter_file = None
+
+    try:
+        with pytest.raises(ValueError, match='membershipAttr'):
+            dbgen_create_workload(standalone, log, args)
+    finally:
+        os.remove(profile_file)
+    assert not os.path.exists(workload_ldif)
+
+
 if __name__ == '__main__':
     # Run isolated
     # -s for DEBUG mode
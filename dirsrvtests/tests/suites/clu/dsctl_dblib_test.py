@@ -10,16 +10,23 @@ import logging
 import pytest
 import ldap
 import os
-from lib389._constants import DEFAULT_SUFFIX
-from lib389.backend import DatabaseConfig
-from lib389.cli_ctl.dblib import (FakeArgs, dblib_bdb2mdb, dblib_mdb2bdb, dblib_cleanup)
+from lib389._constants import DEFAULT_SUFFIX, INSTALL_LATEST_CONFIG
+from lib389.backend import Backend, DatabaseConfig
+from lib389.cli_ctl import dblib
+from lib389.cli_ctl.dblib import (FakeArgs, dblib_bdb2mdb, dblib_mdb2bdb, dblib_cleanup,
+                                  Bdb2MdbCheckpoint, DBLIB_CHECKPOINT, DBLIB_LDIF_PREFIX)
+from lib389.idm.domain import Domain
 from lib389.idm.user import UserAccounts
+from lib389.properties import BACKEND_SAMPLE_ENTRIES
 from lib389.replica import ReplicationManager
 from lib389.topologies import topology_m2 as topo_m2
 
 
 log = logging.getLogger(__name__)
 
+STREAM_BE_NAME = 'streamRoot'
+STREAM_BE_SUFFIX = 'dc=stream,dc=test'
+
 
 @pytest.fixture
 def init_user(topo_m2, request):
@@ -50,6 +57,53 @@ def init_user(topo_m2, request):
     request.addfinalizer(fin)
 
 
+@pytest.fixture
+def second_backend(topo_m2, request):
+    """Add a second backend, so that a migration can be interrupted
+    after one backend
+    """
+    s1 = topo_m2.ms["supplier1"]
+    be = Backend(s1)
+    be.create(properties={'cn': STREAM_BE_NAME,
+                          'nsslapd-suffix': STREAM_BE_SUFFIX,
+                          BACKEND_SAMPLE_ENTRIES: INSTALL_LATEST_CONFIG})
+
+    def fin():
+        s1.start()
+        be.delete()
+
+    request.addfinalizer(fin)
+
+
+def _interrupted_stream_migration(inst, monkeypatch):
+    """Migrate to lmdb with --stream, the migration of all the backends but
+    the first one failing. Returns the migration args
+    """
+    args = FakeArgs({'tmpdir': None})
+    if DatabaseConfig(inst).get_db_lib() == 'mdb':
+        dblib_mdb2bdb(inst, log, args)
+        dblib_cleanup(inst, log, args)
+    migrated = []
+    real_stream_backend = dblib.stream_backend
+
+    def stream_first_backend(inst, be, *rest):
+        if migrated:
+            return False
+        migrated.append(be['bename'])
+        return real_stream_backend(inst, be, *rest)
+
+    args = FakeArgs({'tmpdir': None, 'stream': True, 'jobs': 1, 'compress': True, 'resume': False})
+    with monkeypatch.context() as m:
+        m.setattr(dblib, 'stream_backend', stream_first_backend)
+        dblib_bdb2mdb(inst, log, args)
+
+    ckpt = Bdb2MdbCheckpoint.load(os.path.join(inst.dbdir, DBLIB_CHECKPOINT))
+    assert ckpt is not None
+    assert ckpt.state['switched']
+    assert [bename for bename, state in ckpt.state['backends'].items() if state == 'done'] == migrated
+    return args
+
+
 def _check_db(inst, log, impl):
     users = UserAccounts(inst, DEFAULT_SUFFIX)
     # Cannot use inst..get_db_lib() because it caches the value
@@ -116,3 +170,110 @@ def test_dblib_migration(topo_m2, init_user):
         dblib_cleanup(s1, log, args)
         _check_db(s1, log, 'mdb')
         repl.test_replication_topology([s1, s2])
+
+
+def test_dblib_stream_migration(topo_m2, init_user):
+    """
+    Verify dsctl dblib bdb2mdb --stream (pipelined migration to lmdb)
+
+    :id: 0f1f6b5e-2a47-4c53-9e0a-6f3f4a2d7c91
+    :setup: Two suppliers Instance
+    :steps:
+        1. Switch to bdb if needed
+        2. Migrate to lmdb with --stream --jobs 2 --compress
+        3. Check that the entries and the replication are still there
+        4. Check that no checkpoint or ldif spool is left
+    :expectedresults:
+        1. Success
+        2. Success
+        3. Success
+        4. Success
+    """
+    s1 = topo_m2.ms["supplier1"]
+    s2 = topo_m2.ms["supplier2"]
+    repl = ReplicationManager(DEFAULT_SUFFIX)
+    args = FakeArgs({'tmpdir': None})
+    if s1.get_db_lib() == 'mdb':
+        dblib_mdb2bdb(s1, log, args)
+        dblib_cleanup(s1, log, args)
+        _check_db(s1, log, 'bdb')
+    args = FakeArgs({'tmpdir': None, 'stream': True, 'jobs': 2, 'compress': True, 'resume': False})
+    dblib_bdb2mdb(s1, log, args)
+    dblib_cleanup(s1, log, args)
+    _check_db(s1, log, 'mdb')
+    repl.test_replication_topology([s1, s2])
+    assert not os.path.exists(os.path.join(s1.dbdir, DBLIB_CHECKPOINT))
+    assert not [f for f in os.listdir(s1.get_ldif_dir()) if f.startswith(DBLIB_LDIF_PREFIX)]
+
+
+def test_dblib_stream_migration_resume(topo_m2, init_user, second_backend, monkeypatch):
+    """
+    Verify dsctl dblib bdb2mdb --resume finishes an interrupted --stream migration
+
+    :id: 8c5e0d43-6b1f-4f0e-9a57-2d4b7e1c3f60
+    :setup: Two suppliers Instance, with a second backend
+    :steps:
+        1. Migrate to lmdb with --stream, interrupting it after one backend
+        2. Migrate again without --resume
+        3. Migrate with --resume
+        4. Check that the entries of both backends and the replication are there
+        5. Check that no checkpoint or ldif spool is left
+    :expectedresults:
+        1. The checkpoint records the migrated backend
+        2. The migration is refused, the checkpoint is kept
+        3. Success
+        4. Success
+        5. Success
+    """
+    s1 = topo_m2.ms["supplier1"]
+    s2 = topo_m2.ms["supplier2"]
+    repl = ReplicationManager(DEFAULT_SUFFIX)
+    args = _interrupted_stream_migration(s1, monkeypatch)
+    ckptname = os.path.join(s1.dbdir, DBLIB_CHECKPOINT)
+
+    dblib_bdb2mdb(s1, log, args)
+    assert os.path.exists(ckptname)
+
+    args.resume = True
+    dblib_bdb2mdb(s1, log, args)
+    dblib_cleanup(s1, log, args)
+    _check_db(s1, log, 'mdb')
+    assert Domain(s1, STREAM_BE_SUFFIX).exists()
+    repl.test_replication_topology([s1, s2])
+    assert not os.path.exists(ckptname)
+    assert not [f for f in os.listdir(s1.get_ldif_dir()) if f.startswith(DBLIB_LDIF_PREFIX)]
+
+
+def test_dblib_stream_migration_rollback(topo_m2, init_user, second_backend, monkeypatch):
+    """
+    Verify dsctl dblib cleanup rolls back an interrupted --stream migration
+
+    :id: 3a9d71f2-0c84-4e6b-b1d5-74e2f8a06c1b
+    :setup: Two suppliers Instance, with a second backend
+    :steps:
+        1. Migrate to lmdb with --stream, failing after one backend
+        2. Run the cleanup sub command
+        3. Check that the instance is back on its bdb databases
+        4. Check that the entries of both backends and the replication are there
+    :expectedresults:
+        1. The checkpoint records the migrated backend
+        2. Success
+        3. No checkpoint, lmdb file or ldif spool is left
+        4. Success
+    """
+    s1 = topo_m2.ms["supplier1"]
+    s2 = topo_m2.ms["supplier2"]
+    repl = ReplicationManager(DEFAULT_SUFFIX)
+    args = _interrupted_stream_migration(s1, monkeypatch)
+
+    dblib_cleanup(s1, log, args)
+    assert not os.path.exists(os.path.join(s1.dbdir, DBLIB_CHECKPOINT))
+    assert not [f for f in os.listdir(s1.dbdir) if f.endswith('.mdb')]
+    assert not [f for f in os.listdir(s1.get_ldif_dir()) if f.startswith(DBLIB_LDIF_PREFIX)]
+
+    s1.start()
+    users = UserAccounts(s1, DEFAULT_SUFFIX)
+    assert DatabaseConfig(s1).get_db_lib() == 'bdb'
+    assert users.get('test entry')
+    assert Domain(s1, STREAM_BE_SUFFIX).exists()
+    repl.test_replication_topology([s1, s2])
@@ -6,6 +6,7 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 #
+import json
 import time
 import subprocess
 import pytest
@@ -14,7 +15,7 @@ import os
 
 from lib389 import DEFAULT_SUFFIX
 from lib389.cli_idm.account import list, get_dn, lock, unlock, delete, modify, rename, entry_status, \
-    subtree_status, reset_password, change_password
+    subtree_status, status, reset_password, change_password
 from lib389.topologies import topology_st
 from lib389.cli_base import FakeArgs
 from lib389.utils import ds_is_older
@@ -103,6 +104,57 @@ def test_dsidm_account_entry_status_with_lock(topology_st, create_test_user):
     check_value_in_log_and_reset(topology_st, content_list=entry_list, check_value=state_unlock)
 
 
+def test_dsidm_account_status_all(topology_st, create_test_user):
+    """ Test dsidm account status with --all and --filter
+
+    :id: 7b0f4a56-5ab1-4c8e-9a7c-3d1e26f0b2d4
+    :setup: Standalone instance
+    :steps:
+         1. Create user account and lock it
+         2. Run dsidm account status --all with JSON output
+         3. Run dsidm account status --filter with JSON output
+         4. Unlock the account
+    :expectedresults:
+         1. Success
+         2. The locked account is reported as directly locked
+         3. Only the matching account is reported
+         4. Success
+    """
+
+    standalone = topology_st.standalone
+    users = nsUserAccounts(standalone, DEFAULT_SUFFIX)
+    test_user = users.get('test_user_1000')
+    test_user.lock()
+
+    args = FakeArgs()
+    args.dn = None
+    args.all = True
+    args.filter = None
+    args.scope = None
+    args.inactive_only = False
+    args.become_inactive_on = None
+    args.page_size = 10
+    args.json = True
+
+    log.info('Test dsidm account status --all')
+    status(standalone, DEFAULT_SUFFIX, topology_st.logcap.log, args)
+    result = json.loads(topology_st.logcap.outputs[-1].getMessage())
+    topology_st.logcap.flush()
+    items = {item['dn'].lower(): item for item in result['items']}
+    assert len(items) > 1
+    assert items[test_user.dn.lower()]['state'] == 'directly_locked'
+
+    log.info('Test dsidm account status --filter')
+    args.all = False
+    args.filter = '(uid=test_user_1000)'
+    status(standalone, DEFAULT_SUFFIX, topology_st.logcap.log, args)
+    result = json.loads(topology_st.logcap.outputs[-1].getMessage())
+    topology_st.logcap.flush()
+    assert [item['dn'].lower() for item in result['items']] == [test_user.dn.lower()]
+
+    test_user.unlock()
+
+
 if __name__ == '__main__':
     # Run isolated
     # -s for DEBUG mode
@@ -103,17 +103,19 @@ def test_dsconf_replication_monitor(topology_m2, set_log_file):
     :steps:
          1. Create DS instance
          2. Run replication monitor with connections option
-         3. Run replication monitor with aliases option
-         4. Run replication monitor with --json option
-         5. Run replication monitor with .dsrc file created
-         6. Run replication monitor with connections option as if using dsconf CLI
+         3. Run replication monitor with connections and --parallel options
+         4. Run replication monitor with aliases option
+         5. Run replication monitor with --json option
+         6. Run replication monitor with .dsrc file created
+         7. Run replication monitor with connections option as if using dsconf CLI
     :expectedresults:
          1. Success
          2. Success
-         3. Success
+         3. Success, with the same report
          4. Success
          5. Success
          6. Success
+         7. Success
     """
 
     m1 = topology_m2.ms["supplier1"]
@@ -206,12 +208,19 @@ def test_dsconf_replication_monitor(topology_m2, set_log_file):
     args.connections = connections
     args.aliases = None
     args.json = False
+    args.parallel = None
 
     log.info('Run replication monitor with connections option')
     get_repl_monitor_info(m1, DEFAULT_SUFFIX, log, args)
     (host_m1, host_m2) = get_hostnames_from_log(m1.port, m2.port)
     check_value_in_log_and_reset(content_list, connection_content, error_list=error_list)
 
+    log.info('Run replication monitor querying the instances in parallel')
+    args.parallel = 4
+    get_repl_monitor_info(m1, DEFAULT_SUFFIX, log, args)
+    check_value_in_log_and_reset(content_list, connection_content, error_list=error_list)
+    args.parallel = None
+
     # Prepare the data for next tests
     aliases = ['M1=' + host_m1 + ':' + str(m1.port),
                'M2=' + host_m2 + ':' + str(m2.port)]
@@ -6,12 +6,19 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 #
+import importlib.machinery
+import io
+import ldap
 import pytest
+import random
 import subprocess
+import types
+from ldap.controls import SimplePagedResultsControl
 from lib389.utils import *
 from lib389.replica import Replicas, Replica, ReplicationManager
 from lib389._constants import *
 from lib389.config import CertmapLegacy
+from lib389.paths import Paths
 from lib389.idm.nscontainer import nsContainers
 from lib389.idm.user import UserAccounts, TEST_USER_PROPERTIES
 from lib389.idm.services import ServiceAccounts
@@ -43,6 +50,123 @@ def _delete_container(cont):
     time.sleep(1)
 
 
+def _load_replcheck():
+    """Load the ds-replcheck script as a module, to drive it with stub connections"""
+
+    loader = importlib.machinery.SourceFileLoader('ds_replcheck', os.path.join(Paths().bin_dir, 'ds-replcheck'))
+    replcheck = types.ModuleType(loader.name)
+    loader.exec_module(replcheck)
+    return replcheck
+
+
+class _PagedConnection(object):
+    """Stub of a SimpleLDAPObject returning its entries to paged searches,
+    each page after a random delay
+    """
+
+    OPERATIONAL = ('nsuniqueid', 'createtimestamp', 'modifytimestamp')
+
+    def __init__(self, entries, ruv, rng):
+        self.entries = entries
+        self.ruv = ruv
+        self.rng = rng
+        self.searches = {}
+        self.attrlists = []
+        self.bases = []
+
+    def _select(self, attrs, attrlist):
+        wanted = [attr.lower() for attr in attrlist]
+        return {attr: vals for attr, vals in attrs.items()
+                if attr.lower() in wanted or ('*' in wanted and attr.lower() not in self.OPERATIONAL)}
+
+    def search_s(self, base, scope, filterstr, attrlist=None):
+        if base == 'cn=config':
+            return [('cn=replica,cn=config', {'nsDS5ReplicaId': [b'1']})]
+        if scope == ldap.SCOPE_BASE:
+            for dn, attrs in self.entries:
+                if dn.lower() == base.lower():
+                    return [(dn, self._select(attrs, attrlist))]
+            raise ldap.NO_SUCH_OBJECT()
+        return [('nsuniqueid=ffffffff-ffffffff-ffffffff-ffffffff,' + base, {'nsds50ruv': self.ruv})]
+
+    def search_ext(self, base, scope, filterstr, attrlist, serverctrls):
+        ctrl = serverctrls[0]
+        msgid = len(self.searches) + 1
+        self.searches[msgid] = (int(ctrl.cookie or 0), ctrl.size, attrlist, base.lower(), scope)
+        self.attrlists.append(attrlist)
+        if not ctrl.cookie:
+            self.bases.append((base.lower(), scope))
+        return msgid
+
+    def result3(self, msgid):
+        start, size, attrlist, base, scope = self.searches[msgid]
+        time.sleep(self.rng.uniform(0, 0.005))
+        if scope == ldap.SCOPE_BASE:
+            entries = [(dn, attrs) for dn, attrs in self.entries if dn.lower() == base]
+        elif scope == ldap.SCOPE_ONELEVEL:
+            entries = [(dn, attrs) for dn, attrs in self.entries if dn.lower().split(',', 1)[1] == base]
+        else:
+            entries = [(dn, attrs) for dn, attrs in self.entries if dn.lower().endswith(base)]
+        end = start + size
+        cookie = str(end) if end < len(entries) else ''
+        return (ldap.RES_SEARCH_RESULT, [(dn, self._select(attrs, attrlist)) for dn, attrs in entries[start:end]],
+                msgid, [SimplePagedResultsControl(True, size=0, cookie=cookie)])
+
+    def unbind_s(self):
+        pass
+
+
+def _online_replcheck(replcheck, supplier, replica, seed, fingerprint=False, ignore=()):
+    """Run the online report of two stub servers, and return the report
+    without its header, and the connections
+    """
+    rng = random.Random(seed)
+    ruv = [b'{replica 1 ldap://localhost:389} 5f000000000000010000 5f000001000000010000']
+    conns = {'supplier': _PagedConnection(supplier, ruv, rng), 'replica': _PagedConnection(replica, ruv, rng)}
+    replcheck.connect_to_server = lambda protocol, host, port, name, opts: conns[host]
+    opts = {'mprotocol': 'ldap', 'mhost': 'supplier', 'mport': 389,
+            'replicas': [{'protocol': 'ldap', 'host': 'replica', 'port': 389}],
+            'suffix': 'dc=example,dc=com', 'verbose': False, 'starttime': int(time.time()),
+            'pagesize': 3, 'conflicts': False, 'ignore': ['createtimestamp', 'nscpentrywsi'] + list(ignore), 'lag': 0}
+    output = io.StringIO()
+    if fingerprint:
+        replcheck.do_fingerprint_report(opts, output)
+    else:
+        replcheck.do_online_report(opts, output)
+    # Skip the header and its timestamp
+    return output.getvalue().split('\n', 3)[3], conns
+
+
+def _online_replcheck_user(i, desc=b'a user', uid=None, modified=b'20200913000000Z', parent='ou=people'):
+    """Return a user entry as returned by a search"""
+    uid = uid or 'user{}'.format(i)
+    return ('uid={},{},dc=example,dc=com'.format(uid, parent),
+            {'objectClass': [b'top', b'person'], 'uid': [uid.encode()], 'description': [desc],
+             'nsUniqueId': ['{:08x}-00000000-00000000-00000000'.format(i).encode()],
+             'createTimestamp': [b'20200913000000Z'], 'modifyTimestamp': [modified]})
+
+
+def _online_replcheck_entries():
+    """Return the entries of a Supplier and of a Replica where two entries
+    are missing, two are extra, two are different and one was renamed.  The
+    Replica returns them in the reverse order
+    """
+    user = _online_replcheck_user
+
+    supplier = [user(i) for i in range(40)]
+    replica = []
+    for i in range(40):
+        if i in (5, 25):
+            replica.append(user(i, desc=b'changed', modified=b'20200914000000Z'))
+        elif i == 9:
+            replica.append(user(i, uid='moved', modified=b'20200914000000Z'))
+        elif i not in (3, 33):
+            replica.append(user(i))
+    replica += [user(100), user(101)]
+    replica.reverse()
+    return supplier, replica
+
+
 @pytest.fixture(scope="module")
 def topo_tls_ldapi(topo):
     """Enable TLS on both suppliers and reconfigure both agreements
@@ -548,6 +672,242 @@ def test_dsreplcheck_timeout_connection_mechanisms(topo_tls_ldapi):
         assert OUTPUT in ensure_str(result)
 
 
+REPLCHECK_RUV = """dn: nsuniqueid=ffffffff-ffffffff-ffffffff-ffffffff,dc=example,dc=com
+objectClass: top
+objectClass: nsTombstone
+nsds50ruv: {replicageneration} 5f0000000000000001000000
+nsds50ruv: {replica 1 ldap://localhost:389} 5f000000000000010000 5f000001000000010000
+
+"""
+
+
+def _replcheck_user(uid, desc='a user', extra='', rdn=None):
+    """Return a user entry, with its replication state information"""
+    return ('dn: {},ou=people,dc=example,dc=com\n'
+            'objectClass;vucsn-5f000000000000010000: top\n'
+            'objectClass;vucsn-5f000000000000010000: person\n'
+            'uid;vucsn-5f000000000000010000;mdcsn-5f000000000000010000: {}\n'
+            'description;vucsn-5f000000000000010000: {}\n'
+            'createTimestamp;vucsn-5f000000000000010000: 20200913000000Z\n{}\n').format(
+                rdn or 'uid=' + uid, uid, desc, extra)
+
+
+def test_offline_report(tmpdir):
+    """Check the offline report of two LDIF files with missing, extra,
+    different, tombstone and conflict entries
+
+    :id: 08c09264-b08f-427c-a08a-10efc38207ac
+    :setup: None, the LDIF files are generated
+    :steps:
+        1. Write a Supplier and a Replica LDIF file
+        2. Run the offline report, with a sort size smaller than the number of entries
+        3. Check the report is the one of the former per entry LDIF search
+    :expectedresults:
+        1. Success
+        2. Success
+        3. Success
+    """
+
+    mldif = tmpdir.join('supplier.ldif')
+    mldif.write(REPLCHECK_RUV + _replcheck_user('alice') + _replcheck_user('bob') + _replcheck_user('carol') +
+                _replcheck_user('dave', extra='nsTombstoneCSN: 5f000000000000010000\n'))
+    rldif = tmpdir.join('replica.ldif')
+    rldif.write(REPLCHECK_RUV + _replcheck_user('alice') + _replcheck_user('bob', desc='changed') +
+                _replcheck_user('eve') +
+                _replcheck_user('frank', rdn='uid=frank+nsuniqueid=5f000000-00000000-00000000-00000001',
+                                extra='objectClass: ldapsubentry\n'
+                                      'nsds5ReplConflict: namingConflict (ADD) uid=frank,ou=people,dc=example,dc=com\n'))
+
+    ds_replcheck_path = os.path.join(Paths().bin_dir, 'ds-replcheck')
+    result = subprocess.check_output([ds_replcheck_path, 'offline', '-b', 'dc=example,dc=com', '--rid', '1',
+                                      '-m', mldif.strpath, '-r', rldif.strpath, '-s', '2'], encoding='utf-8')
+
+    created = time.ctime(time.mktime((2020, 9, 13, 0, 0, 0, 0, 0, 0)))
+    changed = time.ctime(0x5f000000)
+    # The report of ds-replcheck 2.0, that searched the Replica LDIF for
+    # every Supplier entry
+    expected = """Database RUV's
+=====================================================
+
+Supplier RUV:
+  {replica 1 ldap://localhost:389} 5f000000000000010000 5f000001000000010000
+  {replicageneration} 5f0000000000000001000000
+
+Replica RUV:
+  {replica 1 ldap://localhost:389} 5f000000000000010000 5f000001000000010000
+  {replicageneration} 5f0000000000000001000000
+
+Replication State: Supplier and Replica are in perfect synchronization
+
+
+Entry Counts
+=====================================================
+
+Supplier:  4
+Replica: 4
+
+
+Tombstones
+=====================================================
+
+Supplier:  1
+Replica: 0
+
+
+Conflict Entries
+=====================================================
+
+Replica Conflict Entries: 1
+
+
+Missing Entries
+=====================================================
+
+  Entries missing on Replica:
+   - uid=carol,ou=people,dc=example,dc=com  (Created on Supplier at: CREATED)
+
+  Entries missing on Supplier:
+   - uid=eve,ou=people,dc=example,dc=com  (Created on Replica at: CREATED)
+
+
+
+Entry Inconsistencies
+=====================================================
+
+uid=bob,ou=people,dc=example,dc=com
+-----------------------------------
+ - Attribute 'description' is different:
+      Supplier:
+        - Value:      a user
+        - State Info: description;vucsn-5f000000000000010000: a user
+        - Date:       CHANGED
+
+      Replica:
+        - Value:      changed
+        - State Info: description;vucsn-5f000000000000010000: changed
+        - Date:       CHANGED
+
+
+
+Result
+=====================================================
+
+There are replication differences between Supplier and Replica
+""".replace('CREATED', created).replace('CHANGED', changed)
+    assert result[result.index("Database RUV's"):].rstrip('\n') == expected.rstrip('\n')
+
+
+def test_online_report_scheduling():
+    """Check the online report does not depend on the order the concurrent
+    searches return their pages
+
+    :id: a3385ae8-82b2-45c5-83dc-241d70f4745b
+    :setup: None, the servers are stubbed
+    :steps:
+        1. Run the online report of a Supplier and a Replica returning their
+           entries in different orders, the pages coming after random delays
+        2. Repeat with other delays
+        3. Check the reports are the same, and list the differences
+    :expectedresults:
+        1. Success
+        2. Success
+        3. Success
+    """
+
+    supplier, replica = _online_replcheck_entries()
+    replcheck = _load_replcheck()
+    reports = set()
+    for seed in range(5):
+        reports.add(_online_replcheck(replcheck, supplier, replica, seed)[0])
+
+    assert len(reports) == 1
+    report = reports.pop()
+    assert 'Supplier:  40\nReplica: 40\n' in report
+    assert ('  Entries missing on Replica:\n'
+            '   - uid=user3,ou=people,dc=example,dc=com  (Created on Supplier at: {created})\n'
+            '   - uid=user33,ou=people,dc=example,dc=com  (Created on Supplier at: {created})\n').format(
+                created=replcheck.convert_timestamp('20200913000000Z')) in report
+    assert ('  Entries missing on Supplier:\n'
+            '   - uid=user100,ou=people,dc=example,dc=com  (Created on Replica at: {created})\n'
+            '   - uid=user101,ou=people,dc=example,dc=com  (Created on Replica at: {created})\n').format(
+                created=replcheck.convert_timestamp('20200913000000Z')) in report
+    diffs = [line for line in report.splitlines() if line.startswith('uid=')]
+    assert diffs == ['uid=user25,ou=people,dc=example,dc=com',
+                     'uid=user5,ou=people,dc=example,dc=com',
+                     'uid=user9,ou=people,dc=example,dc=com']
+
+
+def test_online_report_fingerprint():
+    """Check the fingerprint report only searches the subtrees that differ
+    again, without the state information, and finds the differences of the
+    full online report
+
+    :id: b870c56a-85ba-4e71-bb72-0c171f812808
+    :setup: None, the servers are stubbed
+    :steps:
+        1. Run the full online report of a Supplier and a Replica, with a
+           subtree that is the same on both
+        2. Run the fingerprint report of the same servers
+        3. Check the fingerprint searches did not fetch the state information
+        4. Check the subtree that is the same was not searched again
+        5. Check both reports are the same
+    :expectedresults:
+        1. Success
+        2. Success
+        3. Success
+        4. Success
+        5. Success
+    """
+
+    supplier, replica = _online_replcheck_entries()
+    same = [_online_replcheck_user(i, parent='ou=staff') for i in range(200, 210)]
+    supplier += same
+    replica += same
+    replcheck = _load_replcheck()
+    report, conns = _online_replcheck(replcheck, supplier, replica, 0)
+    fingerprint_report, conns = _online_replcheck(replcheck, supplier, replica, 0, fingerprint=True)
+
+    for conn in conns.values():
+        assert conn.attrlists
+        for attrlist in conn.attrlists:
+            assert 'nscpentrywsi' not in attrlist
+        assert conn.bases == [('dc=example,dc=com', ldap.SCOPE_SUBTREE),
+                              ('dc=example,dc=com', ldap.SCOPE_BASE),
+                              ('dc=example,dc=com', ldap.SCOPE_ONELEVEL),
+                              ('ou=people,dc=example,dc=com', ldap.SCOPE_ONELEVEL)]
+    assert 'Entry Inconsistencies' in fingerprint_report
+    assert fingerprint_report == report
+
+
+def test_online_report_fingerprint_values():
+    """Check the fingerprint report finds a value that differs while the
+    modification time of the entry is the same, even when the modification
+    time is ignored
+
+    :id: 0f7b0a3c-2d4e-4b8e-9a61-6c5d3e1f2a47
+    :setup: None, the servers are stubbed
+    :steps:
+        1. Change the description of a Replica entry, keeping its
+           modifyTimestamp
+        2. Run the fingerprint report
+        3. Run the fingerprint report, ignoring modifytimestamp
+    :expectedresults:
+        1. Success
+        2. The entry is reported as different
+        3. The entry is reported as different
+    """
+
+    supplier = [_online_replcheck_user(i) for i in range(20)]
+    replica = [_online_replcheck_user(i) for i in range(20)]
+    replica[7] = _online_replcheck_user(7, desc=b'diverged')
+    replcheck = _load_replcheck()
+    for ignore in ((), ('modifytimestamp',)):
+        report, conns = _online_replcheck(replcheck, supplier, replica, 0, fingerprint=True, ignore=ignore)
+        diffs = [line for line in report.splitlines() if line.startswith('uid=')]
+        assert diffs == ['uid=user7,ou=people,dc=example,dc=com']
+        assert "Attribute 'description' is different" in report
+
+
 if __name__ == '__main__':
     # Run isolated
     # -s for DEBUG mode
@@ -17,6 +17,7 @@
 
 import sys
 import os
+import importlib
 from urllib.parse import urlparse
 import stat
 import pwd
@@ -68,7 +69,7 @@ from lib389.utils import (
     selinux_label_port)
 from lib389.paths import Paths
 from lib389.nss_ssl import NssSsl
-from lib389.tasks import BackupTask, RestoreTask
+from lib389.tasks import BackupTask, RestoreTask, TaskProgress
 from lib389.dseldif import DSEldif
 
 # mixin
@@ -266,8 +267,63 @@ def _ds_shutil_copytree(src, dst, symlinks=False, ignore=None, copy_function=cop
     return dst
 
 
+class _Broker(object):
+    """A DirSrv attribute holding a manager object (i.e. inst.config), the
+    module is only imported and the object only created on first use.
+
+    :param module: The module of the class, i.e. lib389.config
+    :type module: str
+    :param name: The class name
+    :type name: str
+    """
+
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+        self._attr = None
+
+    def __set_name__(self, owner, attr):
+        self._attr = attr
+
+    def __get__(self, inst, owner=None):
+        if inst is None:
+            return self
+        broker = getattr(importlib.import_module(self._module), self._name)(inst)
+        # Cache it in the instance, which takes precedence from now on
+        inst.__dict__[self._attr] = broker
+        return broker
+
+
 class DirSrv(SimpleLDAPObject, object):
 
+    # The managers, created on first use
+    # Need updating
+    agreement = _Broker('lib389.agreement', 'AgreementLegacy')
+    replica = _Broker('lib389.replica', 'ReplicaLegacy')
+    backend = _Broker('lib389.backend', 'BackendLegacy')
+    config = _Broker('lib389.config', 'Config')
+    index = _Broker('lib389.index', 'IndexLegacy')
+    mappingtree = _Broker('lib389.mappingTree', 'MappingTreeLegacy')
+    suffix = _Broker('lib389.suffix', 'Suffix')
+    schema = _Broker('lib389.schema', 'SchemaLegacy')
+    plugins = _Broker('lib389.plugins', 'Plugins')
+    tasks = _Broker('lib389.tasks', 'Tasks')
+    saslmap = _Broker('lib389.saslmap', 'SaslMapping')
+    pwpolicy = _Broker('lib389.pwpolicy', 'PwPolicyManager')
+    monitor = _Broker('lib389.monitor', 'Monitor')
+    monitorldbm = _Broker('lib389.monitor', 'MonitorLDBM')
+    rootdse = _Broker('lib389.rootdse', 'RootDSE')
+    backends = _Broker('lib389.backend', 'Backends')
+    mappingtrees = _Broker('lib389.mappingTree', 'MappingTrees')
+    replicas = _Broker('lib389.replica', 'Replicas')
+    aci = _Broker('lib389.aci', 'Aci')
+    rsa = _Broker('lib389.config', 'RSA')
+    encryption = _Broker('lib389.config', 'Encryption')
+    ds_access_log = _Broker('lib389.dirsrv_log', 'DirsrvAccessLog')
+    ds_error_log = _Broker('lib389.dirsrv_log', 'DirsrvErrorLog')
+    ldclt = _Broker('lib389.ldclt', 'Ldclt')
+    saslmaps = _Broker('lib389.saslmap', 'SaslMappings')
+
     def __initPart2(self):
         """Initialize the DirSrv structure filling various fields, like:
                 self.errlog          -> nsslapd-errorlog
@@ -311,57 +367,11 @@ class DirSrv(SimpleLDAPObject, object):
         self.simple_bind_s(ensure_str(self.binddn), self.bindpw, escapehatch='i am sure')
 
     def __add_brookers__(self):
-        from lib389.config import Config
-        from lib389.aci import Aci
-        from lib389.config import RSA
-        from lib389.config import Encryption
-        from lib389.dirsrv_log import DirsrvAccessLog, DirsrvErrorLog
-        from lib389.ldclt import Ldclt
-        from lib389.mappingTree import MappingTrees
-        from lib389.mappingTree import MappingTreeLegacy as MappingTree
-        from lib389.backend import Backends
-        from lib389.backend import BackendLegacy as Backend
-        from lib389.suffix import Suffix
-        from lib389.replica import ReplicaLegacy as Replica
-        from lib389.replica import Replicas
-        from lib389.agreement import AgreementLegacy as Agreement
-        from lib389.schema import SchemaLegacy as Schema
-        from lib389.plugins import Plugins
-        from lib389.tasks import Tasks
-        from lib389.index import IndexLegacy as Index
-        from lib389.monitor import Monitor, MonitorLDBM
-        from lib389.rootdse import RootDSE
-        from lib389.saslmap import SaslMapping, SaslMappings
-        from lib389.pwpolicy import PwPolicyManager
-
-        # Need updating
-        self.agreement = Agreement(self)
-        self.replica = Replica(self)
-        self.backend = Backend(self)
-        self.config = Config(self)
-        self.index = Index(self)
-        self.mappingtree = MappingTree(self)
-        self.suffix = Suffix(self)
-        self.schema = Schema(self)
-        self.plugins = Plugins(self)
-        self.tasks = Tasks(self)
-        self.saslmap = SaslMapping(self)
-        self.pwpolicy = PwPolicyManager(self)
-        # Do we have a certdb path?
-        # if MAJOR < 3:
-        self.monitor = Monitor(self)
-        self.monitorldbm = MonitorLDBM(self)
-        self.rootdse = RootDSE(self)
-        self.backends = Backends(self)
-        self.mappingtrees = MappingTrees(self)
-        self.replicas = Replicas(self)
-        self.aci = Aci(self)
-        self.rsa = RSA(self)
-        self.encryption = Encryption(self)
-        self.ds_access_log = DirsrvAccessLog(self)
-        self.ds_error_log = DirsrvErrorLog(self)
-        self.ldclt = Ldclt(self)
-        self.saslmaps = SaslMappings(self)
+        # The managers are created on first use (see _Broker), drop the ones
+        # created for a previous connection so they start afresh.
+        for name, attr in vars(DirSrv).items():
+            if isinstance(attr, _Broker):
+                self.__dict__.pop(name, None)
 
     def __init__(self, verbose=False, external_log=None, containerised=False):
         """
@@ -2885,12 +2895,14 @@ class DirSrv(SimpleLDAPObject, object):
 
         return True
 
-    def db2index(self, bename=None, suffixes=None, attrs=None, vlvTag=None):
+    def db2index(self, bename=None, suffixes=None, attrs=None, vlvTag=None, progress=None):
         """
         @param bename - The backend name to reindex
         @param suffixes - List/tuple of suffixes to reindex, currently unused
         @param attrs - List/tuple of the attributes to index
         @param vlvTag - The VLV index name to index, currently unused
+        @param progress - A function called with a TaskProgress for every
+                          output line of the reindex, and when it ends
         @return - True if reindexing succeeded
         """
         prog = os.path.join(self.ds_paths.sbin_dir, 'ns-slapd')
@@ -2927,12 +2939,31 @@ class DirSrv(SimpleLDAPObject, object):
         cmd.append('-D')
         cmd.append(self.get_config_dir())
 
-        try:
-            result = subprocess.check_output(cmd, encoding='utf-8')
-        except subprocess.CalledProcessError as e:
-            self.log.debug("Command: %s failed with the return code %s and the error %s",
-                           format_cmd_list(cmd), e.returncode, e.output)
-            return False
+        if progress is None:
+            try:
+                result = subprocess.check_output(cmd, encoding='utf-8')
+            except subprocess.CalledProcessError as e:
+                self.log.debug("Command: %s failed with the return code %s and the error %s",
+                               format_cmd_list(cmd), e.returncode, e.output)
+                return False
+        else:
+            # Read the output as it is written, to follow the reindex
+            task_progress = TaskProgress()
+            output = []
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8')
+            for line in proc.stdout:
+                line = line.rstrip('\n')
+                output.append(line)
+                task_progress.update(lines=[line])
+                progress(task_progress)
+            returncode = proc.wait()
+            task_progress.update(exit_code=returncode, complete=True)
+            progress(task_progress)
+            result = "\n".join(output)
+            if returncode != 0:
+                self.log.debug("Command: %s failed with the return code %s and the error %s",
+                               format_cmd_list(cmd), returncode, result)
+                return False
 
         self.log.debug("db2index output: BEGIN")
         for line in result.split("\n"):
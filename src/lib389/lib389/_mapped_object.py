@@ -13,6 +13,7 @@ from ldap.controls import SimplePagedResultsControl
 from ldap import filter as ldap_filter
 import logging
 import json
+from collections import Counter
 from functools import partial
 from lib389._entry import Entry
 from lib389._constants import DIRSRV_STATE_ONLINE
@@ -22,6 +23,26 @@ from lib389.utils import (
         ensure_list_int, display_log_value, display_log_data
         )
 
+# Counters of the opt-in attribute cache of DSLdapObject:
+#  - hits: reads answered from the cache, each one a saved round trip
+#  - misses: searches done for attributes that were not cached yet
+#  - invalidations: attributes dropped from the cache by a write
+_cache_stats = Counter()
+
+
+def get_cache_stats():
+    """Get the counters of the DSLdapObject attribute cache
+
+    :returns: A dict with the 'hits', 'misses' and 'invalidations' counts
+    """
+    return {k: _cache_stats[k] for k in ('hits', 'misses', 'invalidations')}
+
+
+def reset_cache_stats():
+    """Reset the counters of the DSLdapObject attribute cache"""
+    _cache_stats.clear()
+
+
 # This function filter and term generation provided thanks to
 # The University of Adelaide. <william@adelaide.edu.au>
 
@@ -84,6 +105,56 @@ class DSLogging(object):
             self._log.setLevel(logging.INFO)
 
 
+class _DSLdapObjectBatch(object):
+    """The context manager returned by DSLdapObject.batch()"""
+
+    def __init__(self, obj, attrlist):
+        self._obj = obj
+        self._attrlist = attrlist
+        self._had_cache = False
+
+    def __enter__(self):
+        obj = self._obj
+        obj._batch_depth += 1
+        if obj._batch_depth == 1:
+            # The batch reads and writes go through the attribute cache
+            self._had_cache = obj._cache is not None
+            obj.enable_cache()
+            if self._attrlist:
+                try:
+                    obj._cache_fetch(self._attrlist)
+                except Exception:
+                    # __exit__ is not called, put the object back as it was
+                    obj._batch_depth -= 1
+                    if not self._had_cache:
+                        obj.disable_cache()
+                    raise
+            obj._batch_mods = []
+        return obj
+
+    def __exit__(self, type, value, tb):
+        obj = self._obj
+        obj._batch_depth -= 1
+        if obj._batch_depth > 0:
+            # Nested batch, the outer one sends the mods
+            return False
+        mods = obj._batch_mods
+        obj._batch_mods = None
+        try:
+            if type is None and len(mods) > 0:
+                obj._log.debug("%s batch of %d mods" % (obj._dn, len(mods)))
+                obj._instance.modify_ext_s(obj._dn, mods, serverctrls=obj._server_controls,
+                                           clientctrls=obj._client_controls, escapehatch='i am sure')
+        finally:
+            if self._had_cache:
+                # Let the server normalise the values we wrote
+                for (action, key, value) in mods:
+                    obj._cache_invalidate(key)
+            else:
+                obj.disable_cache()
+        return False
+
+
 class DSLdapObject(DSLogging, DSLint):
     """A single instance of DSLdapObjects
 
@@ -112,6 +183,11 @@ class DSLdapObject(DSLogging, DSLint):
         self._server_controls = None
         self._client_controls = None
         self._object_filter = '(objectClass=*)'
+        # Attribute cache, None unless enabled with enable_cache()
+        self._cache = None
+        # Pending mods, a list while in a batch()
+        self._batch_mods = None
+        self._batch_depth = 0
 
     def __unicode__(self):
         val = self._dn
@@ -133,6 +209,126 @@ class DSLdapObject(DSLogging, DSLint):
                                            serverctrls=self._server_controls, clientctrls=self._client_controls,
                                            escapehatch='i am sure')[0]
 
+    def enable_cache(self, entry=None, attrlist=None):
+        """Keep the attribute values read from the server, so that reading
+        them again does not need another search. The cache is dropped for
+        an attribute when it is written through this object.
+
+        Changes made by other connections or objects are not seen until
+        refresh() is called.
+
+        :param entry: An Entry to seed the cache with, i.e. the search result
+                      that created this object
+        :type entry: lib389._entry.Entry
+        :param attrlist: The attributes requested by the search of entry, the
+                         ones missing from entry are cached as absent
+        :type attrlist: list of str
+        """
+
+        if self._cache is None:
+            self._cache = {}
+        if entry is not None:
+            self._cache_seed(entry, attrlist)
+
+    def disable_cache(self):
+        """Drop the attribute cache and read every attribute from the server again"""
+
+        self._cache = None
+
+    def refresh(self, attrlist=None):
+        """Drop the cached attributes, and read them again from the server
+
+        :param attrlist: The attributes to read, by default the ones that were cached
+        :type attrlist: list of str
+        """
+
+        if self._cache is None:
+            return
+        if attrlist is None:
+            attrlist = list(self._cache.keys()) or ['*']
+        self._cache = {}
+        self._cache_fetch(attrlist)
+
+    def _cache_fetch(self, attrlist):
+        _cache_stats['misses'] += 1
+        entry = self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter, attrlist=attrlist,
+                                            serverctrls=self._server_controls, clientctrls=self._client_controls,
+                                            escapehatch='i am sure')[0]
+        self._cache_seed(entry, attrlist)
+
+    def _cache_seed(self, entry, attrlist=None):
+        # Attributes that were asked for by name but are not in the entry are
+        # known to be absent.
+        for attr in attrlist or []:
+            if attr not in ('*', '+'):
+                self._cache[attr.lower()] = []
+        for (attr, values) in entry.data.items():
+            self._cache[attr.lower()] = list(values)
+
+    def _cache_invalidate(self, attr=None):
+        if self._cache is None:
+            return
+        _cache_stats['invalidations'] += 1
+        if attr is None:
+            self._cache = {}
+        else:
+            self._cache.pop(ensure_str(attr).lower(), None)
+
+    def _get_cached_values(self, keys):
+        """Get the values of several attributes, from the attribute cache
+        when possible. The attributes that are not cached are read with a
+        single search.
+
+        :returns: A dict of lowercased attribute name to list of bytes values
+        """
+
+        missing = [k for k in keys if k.lower() not in self._cache]
+        if missing:
+            self._cache_fetch(missing)
+        else:
+            _cache_stats['hits'] += 1
+        return {k.lower(): self._cache[k.lower()] for k in keys}
+
+    def batch(self, attrlist=['*']):
+        """Group the reads and writes of several attributes, i.e.:
+
+            with backend.batch():
+                if backend.get_attr_val_utf8('nsslapd-readonly') == 'off':
+                    backend.replace('nsslapd-cachesize', '1000')
+                    backend.replace('nsslapd-cachememsize', '10000000')
+
+        The attributes of attrlist are read with a single search when the
+        batch starts, and other attributes are cached once read. The writes
+        done with set(), add(), replace(), remove(), replace_many() and
+        apply_mods() are sent as a single modify operation when the batch
+        ends, and are visible to the reads of the batch. If an exception
+        is raised in the batch, the writes are dropped.
+
+        :param attrlist: The attributes to read when the batch starts
+        :type attrlist: list of str
+        :returns: A context manager
+        """
+
+        return _DSLdapObjectBatch(self, attrlist)
+
+    def _batch_mod(self, action, key, value):
+        # Apply the mod to the cached values, so that the reads of the batch
+        # see it, before queuing it.
+        attr = ensure_str(key).lower()
+        if action == ldap.MOD_DELETE and value is None:
+            if len(self._get_cached_values([attr])[attr]) == 0:
+                # Like remove_all(), there is nothing to remove
+                return
+            self._cache[attr] = []
+        elif action == ldap.MOD_REPLACE:
+            self._cache[attr] = list(value)
+        elif action == ldap.MOD_ADD:
+            self._cache[attr] = self._get_cached_values([attr])[attr] + list(value)
+        else:
+            removed = [v.lower() for v in value]
+            self._cache[attr] = [v for v in self._get_cached_values([attr])[attr] if v.lower() not in removed]
+        self._batch_mods.append((action, key, value))
+
     def exists(self):
         """Check if the entry exists
 
@@ -258,9 +454,10 @@ class DSLdapObject(DSLogging, DSLint):
             raise ValueError("Invalid state. Cannot get presence on instance that is not ONLINE")
         self._log.debug("%s present(%r) %s" % (self._dn, attr, value))
 
-        self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter, attrlist=[attr, ],
-                                        serverctrls=self._server_controls, clientctrls=self._client_controls,
-                                        escapehatch='i am sure')[0]
+        if self._cache is None:
+            self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter, attrlist=[attr, ],
+                                            serverctrls=self._server_controls, clientctrls=self._client_controls,
+                                            escapehatch='i am sure')[0]
         values = self.get_attr_vals_bytes(attr)
         self._log.debug("%s contains %s" % (self._dn, values))
 
@@ -313,6 +510,12 @@ class DSLdapObject(DSLogging, DSLint):
             else:
                 value = [ensure_bytes(arg[1])]
             mods.append((ldap.MOD_REPLACE, ensure_str(arg[0]), value))
+        if self._batch_mods is not None:
+            for (action, key, value) in mods:
+                self._batch_mod(action, key, value)
+            return None
+        for (action, key, value) in mods:
+            self._cache_invalidate(key)
         return self._instance.modify_ext_s(self._dn, mods, serverctrls=self._server_controls,
                                            clientctrls=self._client_controls, escapehatch='i am sure')
 
@@ -457,6 +660,10 @@ class DSLdapObject(DSLogging, DSLint):
         elif value is not None:
             value = [ensure_bytes(value)]
 
+        if self._batch_mods is not None:
+            self._batch_mod(action, key, value)
+            return None
+        self._cache_invalidate(key)
         return self._instance.modify_ext_s(self._dn, [(action, key, value)],
                                            serverctrls=self._server_controls, clientctrls=self._client_controls,
                                            escapehatch='i am sure')
@@ -497,6 +704,12 @@ class DSLdapObject(DSLogging, DSLint):
             else:
                 # Error too many items
                 raise ValueError('Too many arguments in the mod op')
+        if self._batch_mods is not None:
+            for (action, key, value) in mod_list:
+                self._batch_mod(action, key, value)
+            return None
+        for (action, key, value) in mod_list:
+            self._cache_invalidate(key)
         return self._instance.modify_ext_s(self._dn, mod_list, serverctrls=self._server_controls, clientctrls=self._client_controls, escapehatch='i am sure')
 
     def _unsafe_compare_attribute(self, other):
@@ -596,6 +809,8 @@ class DSLdapObject(DSLogging, DSLint):
             attrs_entry = self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter,
                                                       attrlist=["*", "+"], serverctrls=self._server_controls,
                                                       clientctrls=self._client_controls, escapehatch='i am sure')[0]
+            if self._cache is not None:
+                self._cache_seed(attrs_entry)
             # getting dict from 'entry' object
             attrs_dict = attrs_entry.data
             # Should we normalise the attr names here to lower()?
@@ -626,6 +841,9 @@ class DSLdapObject(DSLogging, DSLint):
         self._log.debug("%s get_attrs_vals(%r)" % (self._dn, keys))
         if self._instance.state != DIRSRV_STATE_ONLINE:
             raise ValueError("Invalid state. Cannot get properties on instance that is not ONLINE")
+        elif self._cache is not None:
+            cached = self._get_cached_values(keys)
+            return {k: cached[k.lower()] for k in keys}
         else:
             entry = self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter,
                                                 attrlist=keys, serverctrls=self._server_controls,
@@ -636,6 +854,8 @@ class DSLdapObject(DSLogging, DSLint):
         self._log.debug("%s get_attrs_vals_utf8(%r)" % (self._dn, keys))
         if self._instance.state != DIRSRV_STATE_ONLINE:
             raise ValueError("Invalid state. Cannot get properties on instance that is not ONLINE")
+        if self._cache is not None:
+            return {k: ensure_list_str(v) for (k, v) in self.get_attrs_vals(keys).items()}
         entry = self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter, attrlist=keys,
                                             serverctrls=self._server_controls, clientctrls=self._client_controls,
                                             escapehatch='i am sure')[0]
@@ -652,6 +872,8 @@ class DSLdapObject(DSLogging, DSLint):
             raise ValueError("Invalid state. Cannot get properties on instance that is not ONLINE")
             # In the future, I plan to add a mode where if local == true, we
             # can use get on dse.ldif to get values offline.
+        elif self._cache is not None:
+            vals = self._get_cached_values([key])[key.lower()]
         else:
             # It would be good to prevent the entry code intercepting this ....
             # We have to do this in this method, because else we ignore the scope base.
@@ -659,13 +881,13 @@ class DSLdapObject(DSLogging, DSLint):
                                                 attrlist=[key], serverctrls=self._server_controls,
                                                 clientctrls=self._client_controls, escapehatch='i am sure')[0]
             vals = entry.getValues(key)
-            if use_json:
-                result = {key: []}
-                for val in vals:
-                    result[key].append(val)
-                return result
-            else:
-                return vals
+        if use_json:
+            result = {key: []}
+            for val in vals:
+                result[key].append(val)
+            return result
+        else:
+            return vals
 
     def get_attr_val(self, key, use_json=False):
         self._log.debug("%s getVal(%r)" % (self._dn, key))
@@ -674,6 +896,11 @@ class DSLdapObject(DSLogging, DSLint):
             raise ValueError("Invalid state. Cannot get properties on instance that is not ONLINE")
             # In the future, I plan to add a mode where if local == true, we
             # can use get on dse.ldif to get values offline.
+        elif self._cache is not None:
+            vals = self._get_cached_values([key])[key.lower()]
+            if len(vals) == 0:
+                return None
+            return vals[0]
         else:
             entry = self._instance.search_ext_s(self._dn, ldap.SCOPE_BASE, self._object_filter,
                                                 attrlist=[key], serverctrls=self._server_controls,
@@ -809,6 +1036,7 @@ class DSLdapObject(DSLogging, DSLint):
         self._instance.rename_s(self._dn, new_rdn, newsuperior,
                                 serverctrls=self._server_controls, clientctrls=self._client_controls,
                                 delold=deloldrdn, escapehatch='i am sure')
+        self._cache_invalidate()
         if newsuperior is not None:
             # Well, the new DN should be rdn + newsuperior.
             self._dn = '%s,%s' % (new_rdn, newsuperior)
@@ -828,6 +1056,7 @@ class DSLdapObject(DSLogging, DSLint):
 
         self._log.debug("%s delete" % (self._dn))
         if not self._protected:
+            self._cache_invalidate()
             # Is there a way to mark this as offline and kill it
             if recursive:
                 filterstr = "(|(objectclass=*)(objectclass=ldapsubentry))"
@@ -1023,6 +1252,37 @@ class DSLdapObjects(DSLogging, DSLints):
         self._scope = ldap.SCOPE_SUBTREE
         self._server_controls = None
         self._client_controls = None
+        # The attributes to seed the cache of the children with, see enable_cache()
+        self._cache_attrlist = None
+
+    def enable_cache(self, attrlist=['*']):
+        """Enable the attribute cache of the children entries returned by
+        list(), filter() and get(). The cache of each child is seeded from
+        the search that returned it, so reading these attributes later does
+        not need another search.
+
+        :param attrlist: The attributes to fetch with the search and seed the cache with
+        :type attrlist: list of str
+        """
+
+        self._cache_attrlist = list(attrlist)
+
+    def disable_cache(self):
+        """Stop enabling the attribute cache of the children entries"""
+
+        self._cache_attrlist = None
+
+    def _search_attrlist(self):
+        if self._cache_attrlist is None:
+            return self._list_attrlist
+        attrlist = [a for a in self._list_attrlist if a.lower() != 'dn']
+        return attrlist + [a for a in self._cache_attrlist if a not in attrlist]
+
+    def _wrap_entry(self, entry):
+        inst = self._entry_to_instance(dn=entry.dn, entry=entry)
+        if self._cache_attrlist is not None:
+            inst.enable_cache(entry, self._search_attrlist())
+        return inst
 
     def _get_objectclass_filter(self):
         return _gen_and(
@@ -1046,78 +1306,107 @@ class DSLdapObjects(DSLogging, DSLints):
         # functions with very little work on the behalf of the overloader
         return self._childobject(instance=self._instance, dn=dn)
 
-    def list(self, paged_search=None, paged_critical=True):
-        """Get a list of children entries (DSLdapObject, Replica, etc.) using a base DN
-        and objectClasses of our object (DSLdapObjects, Replicas, etc.)
+    def _iter_search(self, filterstr, scope, paged_search=None, paged_critical=True):
+        """Search for children entries and yield them as soon as they are
+        received, instead of waiting for the full result set.
 
+        With a paged search, the request for the next page is sent before the
+        entries of the current page are yielded, so the server prepares it
+        while the caller is still consuming the current one.
+
+        :param filterstr: The search filter
+        :param scope: The search scope
         :param paged_search: None for no paged search, or an int of page size to use.
-        :returns: A list of children entries
+        :param paged_critical: Set the criticality of the paged results control
+        :returns: A generator of children entries
         """
-
-        # Filter based on the objectclasses and the basedn
-        insts = None
-        # This will yield and & filter for objectClass with as many terms as needed.
-        filterstr = self._get_objectclass_filter()
-        self._log.debug('list filter = %s' % filterstr)
-
         if type(paged_search) == int:
             self._log.debug('listing with paged search -> %d', paged_search)
-            # If paged_search ->
-            results = []
-            pages = 0
-            pctrls = []
             req_pr_ctrl = SimplePagedResultsControl(paged_critical, size=paged_search, cookie='')
-            if self._server_controls is not None:
+        else:
+            req_pr_ctrl = None
+
+        def _search():
+            if req_pr_ctrl is None:
+                controls = self._server_controls
+            elif self._server_controls is not None:
                 controls = [req_pr_ctrl] + self._server_controls
             else:
                 controls = [req_pr_ctrl]
-            while True:
-                msgid = self._instance.search_ext(
-                        base=self._basedn,
-                        scope=self._scope,
-                        filterstr=filterstr,
-                        attrlist=self._list_attrlist,
-                        serverctrls=controls,
-                        clientctrls=self._client_controls,
-                        escapehatch='i am sure'
-                    )
-                self._log.info('Getting page %d' % (pages,))
-                rtype, rdata, rmsgid, rctrls = self._instance.result3(msgid, escapehatch='i am sure')
-                results.extend(rdata)
-                pages += 1
-                self._log.debug("%s" % rctrls)
-                pctrls = [ c for c in rctrls
-                    if c.controlType == SimplePagedResultsControl.controlType]
-                if pctrls and pctrls[0].cookie:
-                    req_pr_ctrl.cookie = pctrls[0].cookie
-                    if self._server_controls is not None:
-                        controls = [req_pr_ctrl] + self._server_controls
-                    else:
-                        controls = [req_pr_ctrl]
+            return self._instance.search_ext(
+                base=self._basedn,
+                scope=scope,
+                filterstr=filterstr,
+                attrlist=self._search_attrlist(),
+                serverctrls=controls,
+                clientctrls=self._client_controls,
+                escapehatch='i am sure'
+            )
+
+        pages = 0
+        msgid = _search()
+        try:
+            while msgid is not None:
+                if req_pr_ctrl is None:
+                    # Not paged, get the entries one at a time
+                    rtype, rdata, rmsgid, rctrls = self._instance.result3(msgid, all=0, escapehatch='i am sure')
+                    if rtype == ldap.RES_SEARCH_RESULT:
+                        msgid = None
+                    elif rtype != ldap.RES_SEARCH_ENTRY:
+                        continue
                 else:
-                    break
-                #End while
-            # Result3 doesn't map through Entry, so we have to do it manually.
-            results = [Entry(r) for r in results]
-            insts = [self._entry_to_instance(dn=r.dn, entry=r) for r in results]
-            # End paged search
-        else:
-            # If not paged
-            try:
-                results = self._instance.search_ext_s(
-                    base=self._basedn,
-                    scope=self._scope,
-                    filterstr=filterstr,
-                    attrlist=self._list_attrlist,
-                    serverctrls=self._server_controls, clientctrls=self._client_controls,
-                    escapehatch='i am sure'
-                )
-                # def __init__(self, instance, dn=None):
-                insts = [self._entry_to_instance(dn=r.dn, entry=r) for r in results]
-            except ldap.NO_SUCH_OBJECT:
-                # There are no objects to select from, se we return an empty array
-                insts = []
-        return insts
+                    self._log.info('Getting page %d' % (pages,))
+                    rtype, rdata, rmsgid, rctrls = self._instance.result3(msgid, escapehatch='i am sure')
+                    pages += 1
+                    self._log.debug("%s" % rctrls)
+                    pctrls = [c for c in rctrls
+                              if c.controlType == SimplePagedResultsControl.controlType]
+                    if pctrls and pctrls[0].cookie:
+                        # Request the next page before handing out this one
+                        req_pr_ctrl.cookie = pctrls[0].cookie
+                        msgid = _search()
+                    else:
+                        msgid = None
+                # Result3 doesn't map through Entry, so we have to do it manually.
+                for r in rdata:
+                    yield self._wrap_entry(Entry(r))
+        except ldap.NO_SUCH_OBJECT:
+            # There are no objects to select from
+            msgid = None
+            raise
+        finally:
+            if msgid is not None:
+                # The caller stopped early, drop the outstanding request
+                self._instance.abandon(msgid)
+
+    def iter_list(self, paged_search=None, paged_critical=True):
+        """Iterate over the children entries (DSLdapObject, Replica, etc.) using a
+        base DN and objectClasses of our object (DSLdapObjects, Replicas, etc.)
+
+        Unlike list(), the entries are yielded as they are received from the
+        server, so the whole result set is never held in memory.
+
+        :param paged_search: None for no paged search, or an int of page size to use.
+        :param paged_critical: Set the criticality of the paged results control
+        :returns: A generator of children entries
+        """
+        # This will yield and & filter for objectClass with as many terms as needed.
+        filterstr = self._get_objectclass_filter()
+        self._log.debug('list filter = %s' % filterstr)
+        try:
+            yield from self._iter_search(filterstr, self._scope, paged_search, paged_critical)
+        except ldap.NO_SUCH_OBJECT:
+            # There are no objects to select from, so we stop here
+            return
+
+    def list(self, paged_search=None, paged_critical=True):
+        """Get a list of children entries (DSLdapObject, Replica, etc.) using a base DN
+        and objectClasses of our object (DSLdapObjects, Replicas, etc.)
+
+        :param paged_search: None for no paged search, or an int of page size to use.
+        :returns: A list of children entries
+        """
+        return list(self.iter_list(paged_search, paged_critical))
 
     def exists(self, selector=[], dn=None):
         """Check if a child entry exists
@@ -1163,9 +1452,9 @@ class DSLdapObjects(DSLogging, DSLints):
         if len(results) > 1:
             raise ldap.UNWILLING_TO_PERFORM("Too many objects matched selection criteria %s" % selector)
         if json:
-            return self._entry_to_instance(results[0].dn, results[0]).get_all_attrs_json()
+            return self._wrap_entry(results[0]).get_all_attrs_json()
         else:
-            return self._entry_to_instance(results[0].dn, results[0])
+            return self._wrap_entry(results[0])
 
     def _get_dn(self, dn):
         # This will yield and & filter for objectClass with as many terms as needed.
@@ -1176,7 +1465,7 @@ class DSLdapObjects(DSLogging, DSLints):
             base=dn,
             scope=ldap.SCOPE_BASE,
             filterstr=filterstr,
-            attrlist=self._list_attrlist,
+            attrlist=self._search_attrlist(),
             serverctrls=self._server_controls, clientctrls=self._client_controls,
             escapehatch='i am sure'
         )
@@ -1191,7 +1480,7 @@ class DSLdapObjects(DSLogging, DSLints):
             base=self._basedn,
             scope=self._scope,
             filterstr=filterstr,
-            attrlist=self._list_attrlist,
+            attrlist=self._search_attrlist(),
             serverctrls=self._server_controls, clientctrls=self._client_controls,
             escapehatch='i am sure'
         )
@@ -1249,7 +1538,20 @@ class DSLdapObjects(DSLogging, DSLints):
         # Now actually commit the creation req
         return co.ensure_state(rdn, properties, self._basedn)
 
-    def filter(self, search, attrlist=None, scope=None, strict=False):
+    def iter_filter(self, search, attrlist=None, scope=None, strict=False,
+                    paged_search=None, paged_critical=True):
+        """Iterate over the children entries matching a filter, in addition
+        to the objectClasses of our object. The entries are yielded as they are
+        received from the server.
+
+        :param search: An additional search filter, or None
+        :param attrlist: The attributes to fetch for the entries
+        :param scope: The search scope, the default one of our object if None
+        :param strict: Raise ldap.NO_SUCH_OBJECT if the base DN does not exist
+        :param paged_search: None for no paged search, or an int of page size to use.
+        :param paged_critical: Set the criticality of the paged results control
+        :returns: A generator of children entries
+        """
         # This will yield and & filter for objectClass with as many terms as needed.
         if search:
             search_filter = _gen_and([self._get_objectclass_filter(), search])
@@ -1261,18 +1563,12 @@ class DSLdapObjects(DSLogging, DSLints):
             self._list_attrlist = attrlist
         self._log.debug(f'list filter = {search_filter} with scope {scope} and attribute list {attrlist}')
         try:
-            results = self._instance.search_ext_s(
-                base=self._basedn,
-                scope=scope,
-                filterstr=search_filter,
-                attrlist=self._list_attrlist,
-                serverctrls=self._server_controls, clientctrls=self._client_controls
-            )
-            # def __init__(self, instance, dn=None):
-            insts = [self._entry_to_instance(dn=r.dn, entry=r) for r in results]
+            yield from self._iter_search(search_filter, scope, paged_search, paged_critical)
         except ldap.NO_SUCH_OBJECT:
-            # There are no objects to select from, se we return an empty array
+            # There are no objects to select from
             if strict:
                 raise ldap.NO_SUCH_OBJECT
-            insts = []
-        return insts
+            return
+
+    def filter(self, search, attrlist=None, scope=None, strict=False):
+        return list(self.iter_filter(search, attrlist, scope, strict))
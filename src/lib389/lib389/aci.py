@@ -11,7 +11,938 @@
 You will access this via the Entry Class.
 """
 
+import re
 import ldap
+from ldap.dn import str2dn, dn2str
+from lib389.utils import ensure_str
+
+# The rights granted by "all", proxy has to be named explicitly
+ACI_ALL_RIGHTS = frozenset(['read', 'write', 'add', 'delete', 'search', 'compare', 'selfwrite'])
+ACI_TARGET_SCOPES = ('base', 'onelevel', 'subtree', 'subordinate')
+# Bind rule keywords that match the bind identity, the others are conditions
+# (ip, dns, authmethod, dayofweek, timeofday, ssf) that are only known at bind time
+ACI_SUBJECT_KEYWORDS = ('userdn', 'groupdn', 'roledn', 'userattr')
+
+_ACI_TERM_RE = re.compile(r'^([a-zA-Z]+)\s*(!?=)\s*"?(.*?)"?$', re.DOTALL)
+_ACI_VERSION_RE = re.compile(r'^version\s+3\.0\s*;(.*)$', re.DOTALL | re.IGNORECASE)
+_ACI_NAME_RE = re.compile(r'^acl\s+"?(.*?)"?$', re.DOTALL | re.IGNORECASE)
+_ACI_PERMISSION_RE = re.compile(r'^(allow|deny)\s*\(([^)]*)\)(.*)$', re.DOTALL | re.IGNORECASE)
+_ACI_BIND_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|(and|or|not)(?=[\s(])|'
+                                r'([a-zA-Z]+)\s*(!=|>=|<=|=|>|<)\s*("[^"]*"|[^\s()]+))', re.IGNORECASE)
+_ACI_MACRO_RE = re.compile(r'\(\$dn\)|\[\$dn\]|\(\$attr\.[^)]*\)', re.IGNORECASE)
+_ACI_TARGATTRFILTERS_RE = re.compile(r'(?:^|&&|,|=)\s*([\w;-]+)\s*:')
+
+
+def _dn_rdns(dn):
+    """Split a DN into its lowercased RDNs, the leftmost one first"""
+
+    try:
+        return tuple(dn2str([rdn]).lower() for rdn in str2dn(dn))
+    except ldap.DECODING_ERROR:
+        # Wildcards and macros are not always valid DN values
+        return tuple(rdn.strip().lower() for rdn in dn.split(',') if rdn.strip())
+
+
+def _is_under(rdns, base_rdns, strict=False):
+    """Check if a DN is (strictly) below or equal to a base DN, both as RDNs"""
+
+    if len(rdns) < len(base_rdns) or (strict and len(rdns) == len(base_rdns)):
+        return False
+    return rdns[len(rdns) - len(base_rdns):] == base_rdns
+
+
+def _split_outside_quotes(text, sep):
+    parts = []
+    quoted = False
+    start = 0
+    for i, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == sep and not quoted:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _aci_terms(rawaci):
+    """Split an aci into its top level "(...)" terms"""
+
+    terms = []
+    depth = 0
+    quoted = False
+    start = 0
+    for i, char in enumerate(rawaci):
+        if char == '"' and depth > 0:
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == '(':
+            if depth == 0:
+                start = i + 1
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                terms.append(rawaci[start:i].strip())
+            elif depth < 0:
+                raise ValueError("Unbalanced parenthesis")
+    if depth != 0 or quoted:
+        raise ValueError("Unbalanced parenthesis or quotes")
+    return terms
+
+
+def _aci_values(keyword, value):
+    values = [v.strip() for v in value.split('||')]
+    if keyword in ('target', 'userdn', 'groupdn', 'roledn'):
+        values = [v[len('ldap:///'):] if v.lower().startswith('ldap:///') else v for v in values]
+    return [v for v in values if v]
+
+
+def _parse_bind_rule(rule):
+    """Parse a bind rule into a tree of tuples:
+    ('or', [nodes]), ('and', [nodes]), ('not', node) and
+    ('term', keyword, operator, [values])
+    """
+
+    tokens = []
+    pos = 0
+    rule = rule.strip()
+    while pos < len(rule):
+        m = _ACI_BIND_TOKEN_RE.match(rule, pos)
+        if m is None or m.end() == pos:
+            if rule[pos:].strip():
+                raise ValueError(f"Invalid bind rule at: {rule[pos:]}")
+            break
+        pos = m.end()
+        if m.group(1):
+            tokens.append('(')
+        elif m.group(2):
+            tokens.append(')')
+        elif m.group(3):
+            tokens.append(m.group(3).lower())
+        else:
+            keyword = m.group(4).lower()
+            value = m.group(6)
+            if value.startswith('"'):
+                value = value[1:-1]
+            tokens.append(('term', keyword, m.group(5), _aci_values(keyword, value)))
+
+    def parse_or(i):
+        node, i = parse_and(i)
+        nodes = [node]
+        while i < len(tokens) and tokens[i] == 'or':
+            node, i = parse_and(i + 1)
+            nodes.append(node)
+        return (nodes[0] if len(nodes) == 1 else ('or', nodes)), i
+
+    def parse_and(i):
+        node, i = parse_unary(i)
+        nodes = [node]
+        while i < len(tokens) and tokens[i] == 'and':
+            node, i = parse_unary(i + 1)
+            nodes.append(node)
+        return (nodes[0] if len(nodes) == 1 else ('and', nodes)), i
+
+    def parse_unary(i):
+        if i >= len(tokens):
+            raise ValueError("Truncated bind rule")
+        token = tokens[i]
+        if token == 'not':
+            node, i = parse_unary(i + 1)
+            return ('not', node), i
+        if token == '(':
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ')':
+                raise ValueError("Unbalanced parenthesis in bind rule")
+            return node, i + 1
+        if isinstance(token, tuple):
+            return token, i + 1
+        raise ValueError(f"Unexpected {token} in bind rule")
+
+    node, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError("Unexpected tokens at the end of the bind rule")
+    return node
+
+
+def _is_dynamic_dn(value):
+    return '*' in value or '?' in value or _ACI_MACRO_RE.search(value) is not None
+
+
+def _subject_key(keyword, value):
+    """The index key of a userdn, groupdn or roledn value, None if the value
+    depends on the target entry or needs a search (self, parent, ldap urls,
+    wildcards and macros)
+    """
+
+    lvalue = value.lower()
+    if keyword == 'userdn':
+        if lvalue in ('anyone', 'all'):
+            return (lvalue,)
+        if lvalue in ('self', 'parent'):
+            return None
+    if keyword not in ('userdn', 'groupdn', 'roledn') or _is_dynamic_dn(value):
+        return None
+    return (keyword, ','.join(_dn_rdns(value)))
+
+
+def _bind_keys(node):
+    """The subject keys of which the bind identity must match one for the
+    bind rule to be true, or None if it can not be known from the keys
+    """
+
+    kind = node[0]
+    if kind == 'term':
+        (keyword, op, values) = node[1:]
+        if op != '=':
+            return None
+        keys = set()
+        for value in values:
+            key = _subject_key(keyword, value)
+            if key is None:
+                return None
+            keys.add(key)
+        return keys
+    if kind == 'or':
+        keys = set()
+        for child in node[1]:
+            child_keys = _bind_keys(child)
+            if child_keys is None:
+                return None
+            keys |= child_keys
+        return keys
+    if kind == 'and':
+        # Any operand restricts the identity, take the most selective one
+        candidates = [k for k in (_bind_keys(child) for child in node[1]) if k is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=len)
+    return None
+
+
+def _bind_subjects(node):
+    """The subject keys of a bind rule that is only an "or" of userdn, groupdn
+    and roledn terms (without conditions), None otherwise
+    """
+
+    if node[0] == 'term' or node[0] == 'or':
+        for child in ([node] if node[0] == 'term' else node[1]):
+            if child[0] != 'term' or child[1] not in ('userdn', 'groupdn', 'roledn'):
+                return None
+        keys = _bind_keys(node)
+        return frozenset(keys) if keys is not None else None
+    return None
+
+
+def _and3(a, b):
+    if a is False or b is False:
+        return False
+    if a is None or b is None:
+        return None
+    return True
+
+
+def _or3(a, b):
+    if a is True or b is True:
+        return True
+    if a is None or b is None:
+        return None
+    return False
+
+
+def _dn_pattern(value):
+    """A regular expression of a DN with wildcards or macros, the macros
+    are matched as wildcards
+    """
+
+    pattern = ','.join(_dn_rdns(_ACI_MACRO_RE.sub('*', value)))
+    return re.compile('.*'.join(re.escape(p) for p in pattern.split('*')) + '$')
+
+
+class _BindIdentity(object):
+    """The bind identity of an AciModel query
+
+    :param binddn: The bind DN, '' for anonymous
+    :type binddn: str
+    :param groups: The DNs of the groups of the identity, None if unknown
+    :type groups: list of str
+    :param roles: The DNs of the roles of the identity, None if unknown
+    :type roles: list of str
+    """
+
+    def __init__(self, binddn, groups=None, roles=None):
+        self.anonymous = not binddn
+        self.rdns = _dn_rdns(binddn) if binddn else ()
+        self.dn = ','.join(self.rdns)
+        self.groups = None if groups is None else set(','.join(_dn_rdns(g)) for g in groups)
+        self.roles = None if roles is None else set(','.join(_dn_rdns(r)) for r in roles)
+
+    def _match_value(self, keyword, value, target_rdns):
+        lvalue = value.lower()
+        if keyword == 'userdn' and lvalue == 'anyone':
+            return True
+        if self.anonymous:
+            return False
+        if keyword == 'userdn':
+            if lvalue == 'all':
+                return True
+            if lvalue in ('self', 'parent'):
+                if target_rdns is None:
+                    return None
+                if lvalue == 'self':
+                    return self.rdns == target_rdns
+                return self.rdns == target_rdns[1:]
+            if '?' in value or _ACI_MACRO_RE.search(value):
+                return None
+            if '*' in value:
+                return _dn_pattern(value).match(self.dn) is not None
+            return self.dn == ','.join(_dn_rdns(value))
+        if keyword in ('groupdn', 'roledn'):
+            members = self.groups if keyword == 'groupdn' else self.roles
+            if members is None or _is_dynamic_dn(value):
+                return None
+            return ','.join(_dn_rdns(value)) in members
+        # userattr depends on the target entry
+        return None
+
+    def evaluate(self, node, target_rdns=None):
+        """Evaluate a bind rule for this identity
+
+        :returns: True, False, or None if it depends on the directory content
+                  or on the connection (ip, dns, time, authentication method)
+        """
+
+        kind = node[0]
+        if kind == 'or':
+            result = False
+            for child in node[1]:
+                result = _or3(result, self.evaluate(child, target_rdns))
+            return result
+        if kind == 'and':
+            result = True
+            for child in node[1]:
+                result = _and3(result, self.evaluate(child, target_rdns))
+            return result
+        if kind == 'not':
+            result = self.evaluate(node[1], target_rdns)
+            return None if result is None else not result
+        (keyword, op, values) = node[1:]
+        if keyword not in ACI_SUBJECT_KEYWORDS or op not in ('=', '!='):
+            return None
+        result = False
+        for value in values:
+            result = _or3(result, self._match_value(keyword, value, target_rdns))
+        if op == '!=' and result is not None:
+            result = not result
+        return result
+
+
+class AciRule(object):
+    """An allow or deny permission of a compiled aci, and its bind rule
+
+    :param effect: 'allow' or 'deny'
+    :type effect: str
+    :param rights: The rights, "all" expanded
+    :type rights: frozenset of str
+    :param bindrule: The raw bind rule
+    :type bindrule: str
+    """
+
+    def __init__(self, effect, rights, bindrule):
+        self.effect = effect
+        self.rights = rights
+        self.bindrule = bindrule
+        self.normalized_bindrule = ' '.join(bindrule.lower().split())
+        self.tree = _parse_bind_rule(bindrule)
+        self.keys = _bind_keys(self.tree)
+        self.subjects = _bind_subjects(self.tree)
+        self.keywords = set()
+        self._collect_keywords(self.tree)
+
+    def _collect_keywords(self, node):
+        if node[0] == 'term':
+            self.keywords.add(node[1])
+            if any(_ACI_MACRO_RE.search(v) for v in node[3]):
+                self.keywords.add('macro')
+            if any('?' in v for v in node[3]):
+                self.keywords.add('ldapurl')
+        elif node[0] == 'not':
+            self._collect_keywords(node[1])
+        else:
+            for child in node[1]:
+                self._collect_keywords(child)
+
+    def covers(self, other):
+        """Check if this rule grants (or denies) at least the rights of another
+        rule, to at least the identities of the other rule
+        """
+
+        if not other.rights <= self.rights:
+            return False
+        if self.normalized_bindrule == other.normalized_bindrule:
+            return True
+        if self.subjects is None:
+            return False
+        if ('anyone',) in self.subjects:
+            return True
+        if other.subjects is None:
+            return False
+        if ('all',) in self.subjects and ('anyone',) not in other.subjects:
+            return True
+        return other.subjects <= self.subjects
+
+
+class CompiledAci(object):
+    """An aci parsed once into the parts needed to know to which entries,
+    attributes and bind identities it applies.
+
+    :param dn: The DN of the entry holding the aci
+    :type dn: str
+    :param rawaci: The aci value
+    :type rawaci: str
+    :param index: The position of the aci in its AciModel
+    :type index: int
+    :raises: ValueError - if the aci can not be parsed
+    """
+
+    def __init__(self, dn, rawaci, index=0):
+        self.dn = dn
+        self.rdns = _dn_rdns(dn)
+        self.rawaci = ensure_str(rawaci)
+        self.index = index
+        self.name = None
+        self.target_equal = True
+        # Static targets as RDNs, and the targets with wildcards or macros
+        self.targets = []
+        self.target_patterns = []
+        self.targetscope = 'subtree'
+        self.targetfilter = None
+        self.targattrfilters = None
+        # 'none' if there is no targetattr, 'set' for targetattr="a || b",
+        # and 'all_but' for targetattr="*" or targetattr!="a || b"
+        self.attr_mode = 'none'
+        self.attrs = frozenset()
+        self.rules = []
+        self._compile()
+
+    def __str__(self):
+        return f"{self.dn} {self.rawaci}"
+
+    def _compile(self):
+        for term in _aci_terms(self.rawaci):
+            version = _ACI_VERSION_RE.match(term)
+            if version:
+                self._compile_version(version.group(1))
+                continue
+            m = _ACI_TERM_RE.match(term)
+            if m is None:
+                raise ValueError(f"Invalid aci term: {term}")
+            keyword = m.group(1).lower()
+            equal = m.group(2) == '='
+            value = m.group(3).strip()
+            if keyword == 'target':
+                self.target_equal = equal
+                for target in _aci_values(keyword, value):
+                    if _is_dynamic_dn(target):
+                        rdns = _dn_rdns(target)
+                        static = [i for i, rdn in enumerate(rdns) if '*' in rdn or '$' in rdn]
+                        self.target_patterns.append((_dn_pattern(target), rdns[static[-1] + 1:],
+                                                     _ACI_MACRO_RE.search(target) is not None))
+                    else:
+                        self.targets.append(_dn_rdns(target))
+            elif keyword == 'targetattr':
+                attrs = frozenset(a.lower() for a in _aci_values(keyword, value))
+                if not equal:
+                    self.attr_mode = 'all_but'
+                    self.attrs = attrs
+                elif '*' in attrs:
+                    self.attr_mode = 'all_but'
+                else:
+                    self.attr_mode = 'set'
+                    self.attrs = attrs
+            elif keyword == 'targetscope':
+                if value.lower() not in ACI_TARGET_SCOPES:
+                    raise ValueError(f"Invalid targetscope: {value}")
+                self.targetscope = value.lower()
+            elif keyword == 'targetfilter':
+                self.targetfilter = ' '.join(value.lower().split())
+            elif keyword in ('targattrfilters', 'targetattrfilters'):
+                self.targattrfilters = ' '.join(value.lower().split())
+                self.attr_mode = 'set'
+                self.attrs = frozenset(a.lower() for a in _ACI_TARGATTRFILTERS_RE.findall(value))
+            else:
+                raise ValueError(f"Unknown aci keyword: {keyword}")
+        if self.name is None or not self.rules:
+            raise ValueError("The aci has no version 3.0 acl or permission")
+
+    def _compile_version(self, body):
+        for part in _split_outside_quotes(body, ';'):
+            part = part.strip()
+            if not part:
+                continue
+            if self.name is None:
+                m = _ACI_NAME_RE.match(part)
+                if m is None:
+                    raise ValueError(f"Missing acl name: {part}")
+                self.name = m.group(1)
+                continue
+            m = _ACI_PERMISSION_RE.match(part)
+            if m is None:
+                raise ValueError(f"Invalid permission: {part}")
+            rights = set(r.strip().lower() for r in m.group(2).split(',') if r.strip())
+            if 'all' in rights:
+                rights = (rights - {'all'}) | ACI_ALL_RIGHTS
+            self.rules.append(AciRule(m.group(1).lower(), frozenset(rights), m.group(3)))
+
+    @property
+    def bases(self):
+        """The DNs (as RDNs) under which the aci applies"""
+
+        if self.target_equal and self.targets:
+            return self.targets
+        if self.target_equal and self.target_patterns:
+            return [suffix for (_, suffix, _) in self.target_patterns]
+        return [self.rdns]
+
+    def applies_to_dn(self, rdns):
+        """Check if the aci applies to an entry
+
+        :param rdns: The RDNs of the entry DN, see _dn_rdns()
+        :type rdns: tuple
+        :returns: True, False, or None if it depends on the entry content
+                  (targetfilter) or on a macro
+        """
+
+        # The aci never applies outside of the subtree of its entry
+        if not _is_under(rdns, self.rdns):
+            return False
+        if not (self.targets or self.target_patterns):
+            result = self._in_scope(rdns, self.rdns)
+        else:
+            dn = ','.join(rdns)
+            result = False
+            for target in self.targets:
+                if self._in_scope(rdns, target):
+                    result = True
+            for (pattern, _, macro) in self.target_patterns:
+                if pattern.match(dn):
+                    # A macro is matched as a wildcard
+                    result = _or3(result, None if macro else True)
+            if not self.target_equal:
+                if result is not None:
+                    result = not result and self._in_scope(rdns, self.rdns)
+        if result is True and self.targetfilter is not None:
+            return None
+        return result
+
+    def _in_scope(self, rdns, base):
+        if self.targetscope == 'base':
+            return rdns == base
+        if self.targetscope == 'onelevel':
+            return rdns[1:] == base
+        return _is_under(rdns, base, strict=self.targetscope == 'subordinate')
+
+    def applies_to_attr(self, attr):
+        """Check if the aci applies to an attribute
+
+        :param attr: An attribute name
+        :type attr: str
+        :returns: bool
+        """
+
+        attr = attr.lower()
+        if self.attr_mode == 'set':
+            return attr in self.attrs
+        if self.attr_mode == 'all_but':
+            return attr not in self.attrs
+        return False
+
+    def _regions(self):
+        # The (base RDNs, scope) of the entries the aci applies to: its
+        # bases, intersected with the subtree of its own entry
+        scope = self.targetscope if self.targets or not self.target_patterns else 'subtree'
+        regions = []
+        for base in self.bases:
+            if _is_under(base, self.rdns):
+                regions.append((base, scope))
+            elif _is_under(self.rdns, base, strict=True):
+                # The target is above the aci entry
+                if scope in ('subtree', 'subordinate'):
+                    regions.append((self.rdns, 'subtree'))
+                elif scope == 'onelevel' and self.rdns[1:] == base:
+                    regions.append((self.rdns, 'base'))
+        return regions
+
+    def _region_covers(self, other):
+        # Do we apply to all the entries the other aci applies to?
+        if self.targetfilter is not None and self.targetfilter != other.targetfilter:
+            return False
+        if self.target_patterns or not self.target_equal:
+            return False
+        own_regions = self._regions()
+        other_regions = other._regions()
+        if not other_regions:
+            return False
+        for base, scope in other_regions:
+            if not any(self._base_covers(own, own_scope, base, scope) for (own, own_scope) in own_regions):
+                return False
+        return True
+
+    @staticmethod
+    def _base_covers(own, own_scope, base, scope):
+        if own_scope == 'subtree':
+            return _is_under(base, own)
+        if own_scope == 'subordinate':
+            return _is_under(base, own, strict=True) or (base == own and scope in ('onelevel', 'subordinate'))
+        if own_scope == 'onelevel':
+            return (scope == 'base' and base[1:] == own) or (scope == 'onelevel' and base == own)
+        return scope == 'base' and base == own
+
+    def _attrs_cover(self, other):
+        if self.targattrfilters is not None or other.targattrfilters is not None:
+            return self.targattrfilters == other.targattrfilters and self.attrs >= other.attrs
+        if self.attr_mode == 'none' or other.attr_mode == 'none':
+            return other.attr_mode == 'none' and (self.attr_mode == 'none' or
+                                                  (self.attr_mode == 'all_but' and not self.attrs))
+        if self.attr_mode == 'set':
+            return other.attr_mode == 'set' and other.attrs <= self.attrs
+        if other.attr_mode == 'set':
+            return not (other.attrs & self.attrs)
+        return self.attrs <= other.attrs
+
+    def covers(self, other, effect, other_effect=None):
+        """Check if the rules of an effect of this aci apply to at least the
+        entries, attributes, rights and identities of all the rules of
+        another aci
+
+        :param other: Another aci
+        :type other: CompiledAci
+        :param effect: The effect of our rules to consider, 'allow' or 'deny'
+        :type effect: str
+        :param other_effect: The effect of the rules of the other aci, effect if None
+        :type other_effect: str
+        :returns: bool
+        """
+
+        other_rules = [r for r in other.rules if r.effect == (other_effect or effect)]
+        rules = [r for r in self.rules if r.effect == effect]
+        if not other_rules or not rules:
+            return False
+        if not self._region_covers(other) or not self._attrs_cover(other):
+            return False
+        return all(any(rule.covers(other_rule) for rule in rules) for other_rule in other_rules)
+
+
+class AciModel(object):
+    """The compiled acis of a directory, indexed by target subtree, target
+    attribute and bind rule subject so that the acis that apply to an entry,
+    an attribute or a bind identity are found without checking all of them.
+
+    The model is built offline, from search results or an LDIF file, and
+    answers without running get_effective_rights against the server.
+
+    :param entries: (dn, acis) tuples or Entry objects to add
+    :type entries: iterable
+    """
+
+    def __init__(self, entries=()):
+        self.acis = []
+        # (dn, rawaci, error) of the acis that could not be parsed
+        self.invalid = []
+        # Normalized base DN -> aci indexes
+        self._by_base = {}
+        # Attribute -> aci indexes, and the acis on all attributes but some
+        self._by_attr = {}
+        self._all_attrs = set()
+        # Subject key -> aci indexes, and the acis with a dynamic bind rule
+        self._by_subject = {}
+        self._by_subject_kind = {'userdn': set(), 'groupdn': set(), 'roledn': set()}
+        self._dynamic_subject = set()
+        for entry in entries:
+            if isinstance(entry, tuple):
+                self.add_entry(*entry)
+            else:
+                self.add_entry(entry.dn, entry.getValues('aci'))
+
+    @classmethod
+    def from_ldif(cls, ldif_file):
+        """Build a model from the acis of an LDIF file, i.e. an export or
+        dse.ldif, without contacting any server
+
+        :param ldif_file: The LDIF file path
+        :type ldif_file: str
+        :returns: AciModel
+        """
+
+        from ldif import LDIFParser
+        model = cls()
+
+        class _AciParser(LDIFParser):
+            def handle(self, dn, entry):
+                for attr, values in entry.items():
+                    if attr.lower() == 'aci':
+                        model.add_entry(dn, values)
+
+        with open(ldif_file, 'r') as f:
+            _AciParser(f).parse()
+        return model
+
+    def __len__(self):
+        return len(self.acis)
+
+    def add_entry(self, dn, rawacis):
+        """Compile and index the acis of an entry
+
+        :param dn: The entry DN
+        :type dn: str
+        :param rawacis: The aci values of the entry
+        :type rawacis: list of str or bytes
+        """
+
+        for rawaci in rawacis:
+            try:
+                aci = CompiledAci(dn, rawaci, len(self.acis))
+            except ValueError as e:
+                self.invalid.append((dn, ensure_str(rawaci), str(e)))
+                continue
+            self._index(aci)
+
+    def _index(self, aci):
+        self.acis.append(aci)
+        i = aci.index
+        for base in aci.bases:
+            self._by_base.setdefault(','.join(base), set()).add(i)
+        if aci.attr_mode == 'set':
+            for attr in aci.attrs:
+                self._by_attr.setdefault(attr, set()).add(i)
+        elif aci.attr_mode == 'all_but':
+            self._all_attrs.add(i)
+        for rule in aci.rules:
+            if rule.keys is None:
+                self._dynamic_subject.add(i)
+                continue
+            for key in rule.keys:
+                self._by_subject.setdefault(key, set()).add(i)
+                if key[0] in self._by_subject_kind:
+                    self._by_subject_kind[key[0]].add(i)
+
+    def _candidates_by_dn(self, rdns):
+        candidates = set()
+        for i in range(len(rdns) + 1):
+            candidates |= self._by_base.get(','.join(rdns[i:]), set())
+        return candidates
+
+    def _candidates_by_attr(self, attr):
+        return self._by_attr.get(attr.lower(), set()) | self._all_attrs
+
+    def _candidates_by_identity(self, identity):
+        candidates = set(self._dynamic_subject)
+        candidates |= self._by_subject.get(('anyone',), set())
+        if identity.anonymous:
+            return candidates
+        candidates |= self._by_subject.get(('all',), set())
+        candidates |= self._by_subject.get(('userdn', identity.dn), set())
+        for (kind, members) in (('groupdn', identity.groups), ('roledn', identity.roles)):
+            if members is None:
+                candidates |= self._by_subject_kind[kind]
+            else:
+                for member in members:
+                    candidates |= self._by_subject.get((kind, member), set())
+        return candidates
+
+    def query(self, dn=None, attr=None, binddn=None, groups=None, roles=None, rights=None):
+        """Find the acis, and their rules, that apply to an entry, an attribute
+        and a bind identity. The criteria that are None are not checked.
+
+        :param dn: The DN of the target entry
+        :type dn: str
+        :param attr: The target attribute
+        :type attr: str
+        :param binddn: The bind DN, '' for anonymous
+        :type binddn: str
+        :param groups: The DNs of the groups of the bind DN, None if unknown
+        :type groups: list of str
+        :param roles: The DNs of the roles of the bind DN, None if unknown
+        :type roles: list of str
+        :param rights: Only return the rules with one of these rights
+        :type rights: list of str
+        :returns: A list of (CompiledAci, AciRule, match) tuples, in the
+                  order of the acis. match is True if the rule applies, and
+                  None if it depends on the entry content, a group or role
+                  membership that is not known, or the connection.
+        """
+
+        rdns = _dn_rdns(dn) if dn is not None else None
+        identity = _BindIdentity(binddn, groups, roles) if binddn is not None else None
+        candidate_sets = []
+        if rdns is not None:
+            candidate_sets.append(self._candidates_by_dn(rdns))
+        if attr is not None:
+            candidate_sets.append(self._candidates_by_attr(attr))
+        if identity is not None:
+            candidate_sets.append(self._candidates_by_identity(identity))
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            candidates = candidate_sets[0].intersection(*candidate_sets[1:])
+        else:
+            candidates = range(len(self.acis))
+        if rights is not None:
+            rights = set(r.lower() for r in rights)
+            if 'all' in rights:
+                rights = (rights - {'all'}) | ACI_ALL_RIGHTS
+
+        results = []
+        for i in sorted(candidates):
+            aci = self.acis[i]
+            match = True
+            if rdns is not None:
+                match = aci.applies_to_dn(rdns)
+                if match is False:
+                    continue
+            if attr is not None and not aci.applies_to_attr(attr):
+                continue
+            for rule in aci.rules:
+                if rights is not None and not (rule.rights & rights):
+                    continue
+                rule_match = match
+                if identity is not None:
+                    rule_match = _and3(match, identity.evaluate(rule.tree, rdns))
+                    if rule_match is False:
+                        continue
+                results.append((aci, rule, rule_match))
+        return results
+
+    def access(self, dn, attr, binddn, right, groups=None, roles=None):
+        """Work out from the acis alone if a bind identity has a right on an
+        attribute of an entry. A deny wins over an allow, and there is no
+        access without an allow.
+
+        :param dn: The DN of the target entry
+        :type dn: str
+        :param attr: The target attribute, None for entry level rights (add, delete)
+        :type attr: str
+        :param binddn: The bind DN, '' for anonymous
+        :type binddn: str
+        :param right: The right, i.e. read or write
+        :type right: str
+        :returns: True, False, or None if it depends on the directory content
+                  or the connection
+        """
+
+        allowed = False
+        denied = False
+        for (aci, rule, match) in self.query(dn, attr, binddn, groups, roles, [right]):
+            if rule.effect == 'deny':
+                denied = _or3(denied, match)
+            else:
+                allowed = _or3(allowed, match)
+        if denied is True or allowed is False:
+            return False
+        if denied is False and allowed is True:
+            return True
+        return None
+
+    def cost(self, dn):
+        """Describe the acis the server evaluates for an entry, and how many of
+        them need more than the bind DN to be evaluated.
+
+        :param dn: The DN of the target entry
+        :type dn: str
+        :returns: A dict of counts
+        """
+
+        rdns = _dn_rdns(dn)
+        cost = {'acis': 0, 'rules': 0, 'targetfilter': 0, 'groupdn': 0, 'roledn': 0,
+                'userattr': 0, 'ldapurl': 0, 'macro': 0}
+        for i in self._candidates_by_dn(rdns):
+            aci = self.acis[i]
+            if aci.applies_to_dn(rdns) is False:
+                continue
+            cost['acis'] += 1
+            cost['rules'] += len(aci.rules)
+            if aci.targetfilter is not None:
+                cost['targetfilter'] += 1
+            keywords = set()
+            for rule in aci.rules:
+                keywords |= rule.keywords
+            if aci.target_patterns and any(macro for (_, _, macro) in aci.target_patterns):
+                keywords.add('macro')
+            for keyword in ('groupdn', 'roledn', 'userattr', 'ldapurl', 'macro'):
+                if keyword in keywords:
+                    cost[keyword] += 1
+        return cost
+
+    def _coverage_index(self, effect):
+        # (base, subject key) -> indexes of the acis with rules of effect, only
+        # the acis with static targets can cover others
+        index = {}
+        for aci in self.acis:
+            if aci.target_patterns or not aci.target_equal:
+                continue
+            keys = set()
+            for rule in aci.rules:
+                if rule.effect != effect:
+                    continue
+                keys.add(('raw', rule.normalized_bindrule))
+                keys |= rule.subjects or set()
+            for base in aci.bases:
+                for key in keys:
+                    index.setdefault((','.join(base), key), []).append(aci.index)
+        return index
+
+    def _covering(self, aci, index, effect, other_effect):
+        rules = [r for r in aci.rules if r.effect == other_effect]
+        if not rules:
+            return []
+        rule = rules[0]
+        keys = [('raw', rule.normalized_bindrule), ('anyone',)]
+        if rule.subjects is not None:
+            keys.append(('all',))
+            keys.append(sorted(rule.subjects)[0])
+        base = aci.bases[0]
+        candidates = set()
+        for i in range(len(base) + 1):
+            for key in keys:
+                candidates.update(index.get((','.join(base[i:]), key), ()))
+        candidates.discard(aci.index)
+        return [self.acis[i] for i in sorted(candidates)
+                if self.acis[i].covers(aci, effect, other_effect)]
+
+    def redundant(self):
+        """Find the acis that grant or deny nothing more than another aci.
+        Of two identical acis, the second one is redundant.
+
+        :returns: A list of (CompiledAci, list of covering CompiledAci)
+        """
+
+        results = []
+        for effect in ('allow', 'deny'):
+            index = self._coverage_index(effect)
+            for aci in self.acis:
+                if any(r.effect != effect for r in aci.rules):
+                    continue
+                covering = [c for c in self._covering(aci, index, effect, effect)
+                            if c.index < aci.index or not aci.covers(c, effect)]
+                if covering:
+                    results.append((aci, covering))
+        return results
+
+    def shadowed(self):
+        """Find the acis whose allow rules are all overridden by deny rules of
+        other acis, so they never grant anything.
+
+        :returns: A list of (CompiledAci, list of shadowing CompiledAci)
+        """
+
+        results = []
+        index = self._coverage_index('deny')
+        for aci in self.acis:
+            shadowing = self._covering(aci, index, 'deny', 'allow')
+            if shadowing:
+                results.append((aci, shadowing))
+        return results
+
 
 # Helpers to detect common patterns in aci
 def _aci_any_targetattr_ne(aci):
@@ -56,6 +987,21 @@ class Aci(object):
             acis += rawacientry.getAcis()
         return acis
 
+    def compile(self, basedn, scope=ldap.SCOPE_SUBTREE):
+        """Compile all acis in the directory server below the basedn confined
+        by scope into an AciModel, that can then be queried offline.
+
+        :param basedn: Base DN
+        :type basedn: str
+        :param scope: ldap.SCOPE_SUBTREE, ldap.SCOPE_BASE,
+                       ldap.SCOPE_ONELEVEL, ldap.SCOPE_SUBORDINATE
+        :type scope: int
+
+        :returns: An AciModel
+        """
+
+        return AciModel(self.conn.search_s(basedn, scope, 'aci=*', ['aci']))
+
     def lint(self, basedn, scope=ldap.SCOPE_SUBTREE):
         """Validate and check for potential aci issues.
 
@@ -89,6 +1035,9 @@ class Aci(object):
         # Checks again "all acis" go here.
         self._lint_dsale_0001_ne_internal(acis)
         self._lint_dsale_0002_ne_mult_subtree(acis)
+        model = AciModel((aci.entry.dn, [aci.acidata['rawaci']]) for aci in acis)
+        self._lint_dsale_0003_redundant(model)
+        self._lint_dsale_0004_shadowed(model)
         # checks again individual here
 
         if len(self.warnings) > 0:
@@ -235,3 +1184,70 @@ Prevent the acis from overlapping, and have them on unique subtrees.
                     """
                 }
             )
+
+    def _lint_dsale_0003_redundant(self, model):
+        """Check for acis that are covered by another aci with the same effect,
+        on the same or a larger subtree, attributes, rights and bind rule.
+        """
+
+        affected = []
+        for (aci, covering) in model.redundant():
+            buf = "%s\n" % aci
+            for aci_inner in covering:
+                buf += "|- %s\n" % aci_inner
+            affected.append(buf)
+
+        if len(affected) > 0:
+            self.warnings.append(
+                {
+                    'dsale': 'DSALE0003',
+                    'severity': 'LOW',
+                    'acis': "\n".join(affected),
+                    'detail': """
+Acis on your system exist which grant or deny nothing more than another aci
+(listed below them): the other aci applies to the same or a larger subtree,
+to the same or more attributes and rights, and to the same or more bind
+identities.
+
+These acis are still evaluated by the server for every operation in their
+scope, which costs time without changing the access control.
+                    """,
+                    'fix': """
+Remove the redundant acis, or merge them with the acis covering them.
+                    """
+                }
+            )
+
+    def _lint_dsale_0004_shadowed(self, model):
+        """Check for allow acis that are always overridden by deny acis, as a
+        deny takes precedence over an allow.
+        """
+
+        affected = []
+        for (aci, shadowing) in model.shadowed():
+            buf = "%s\n" % aci
+            for aci_inner in shadowing:
+                buf += "|- %s\n" % aci_inner
+            affected.append(buf)
+
+        if len(affected) > 0:
+            self.warnings.append(
+                {
+                    'dsale': 'DSALE0004',
+                    'severity': 'MEDIUM',
+                    'acis': "\n".join(affected),
+                    'detail': """
+Acis on your system exist which allow access that is always denied by other
+acis (listed below them): the deny acis apply to the same or a larger subtree,
+to the same or more attributes and rights, and to the same or more bind
+identities.
+
+As a deny takes precedence over an allow, these allow acis never grant
+anything. This usually means the deny acis are broader than intended.
+                    """,
+                    'fix': """
+Remove the shadowed allow acis, or narrow the deny acis so they do not
+overlap with them.
+                    """
+                }
+            )
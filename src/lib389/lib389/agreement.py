@@ -17,6 +17,7 @@ from lib389._entry import FormatDict
 from lib389.utils import normalizeDN, ensure_bytes, ensure_str, ensure_dict_str, ensure_list_str
 from lib389 import Entry, DirSrv, NoSuchEntryError, InvalidArgumentError
 from lib389._mapped_object import DSLdapObject, DSLdapObjects
+from lib389.connpool import get_pool
 
 
 class Agreement(DSLdapObject):
@@ -162,19 +163,11 @@ class Agreement(DSLdapObject):
         replica = replicas.get(suffix)
         rid = replica.get_attr_val_utf8(REPL_ID)
 
-        # Open a connection to the consumer
-        consumer = DirSrv(verbose=self._instance.verbose)
-        args_instance[SER_HOST] = host
-        if protocol == "ssl" or protocol == "ldaps":
-            args_instance[SER_SECURE_PORT] = int(port)
-        else:
-            args_instance[SER_PORT] = int(port)
-        args_instance[SER_ROOT_DN] = binddn
-        args_instance[SER_ROOT_PW] = bindpw
-        args_standalone = args_instance.copy()
-        consumer.allocate(args_standalone)
+        # Get a connection to the consumer
+        pool = get_pool()
         try:
-            consumer.open()
+            consumer = pool.acquire(host, port, binddn, bindpw,
+                                    secure=(protocol == "ssl" or protocol == "ldaps"))
         except ldap.INVALID_CREDENTIALS as e:
             raise(e)
         except ldap.LDAPError as e:
@@ -182,6 +175,7 @@ class Agreement(DSLdapObject):
             return result_msg
 
         # Search for the tombstone RUV entry
+        discard = False
         try:
             entry = consumer.search_s(suffix, ldap.SCOPE_SUBTREE,
                                       REPLICA_RUV_FILTER, ['nsds50ruv'])
@@ -196,12 +190,15 @@ class Agreement(DSLdapObject):
                             result_msg = ruv_parts[4]
                         break
         except ldap.INVALID_CREDENTIALS as e:
+            discard = True
             raise(e)
         except ldap.LDAPError as e:
+            discard = True
             self._log.debug('Failed to search for the suffix ' +
                                      '({}) consumer ({}:{}) failed, error: {}'.format(
                                          suffix, host, port, e))
-        consumer.close()
+        finally:
+            pool.release(consumer, discard=discard)
         return result_msg
 
     def get_agmt_status(self, binddn=None, bindpw=None, return_json=False):
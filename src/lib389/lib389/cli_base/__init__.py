@@ -7,8 +7,14 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 
+import argparse
 import ast
+import importlib
+import io
 import logging
+import os
+import shlex
+from contextlib import nullcontext, redirect_stdout
 import sys
 import json
 import ldap
@@ -19,6 +25,30 @@ from lib389 import DirSrv
 from lib389.utils import assert_c, get_ldapurl_from_serverid
 from lib389.properties import SER_ROOT_PW, SER_ROOT_DN
 
+# Set while run_batch() runs a command: it can't prompt the user, the
+# terminal (or stdin) is not the one of the command
+_batch_mode = False
+
+
+def _is_batch_mode():
+    return _batch_mode
+
+
+def _prompt(msg, hidden=False):
+    """Read a value typed by the user, or raise a ValueError in batch mode
+
+    :param msg: The prompt
+    :type msg: str
+    :param hidden: Do not echo the value, i.e. a password
+    :type hidden: bool
+    :returns: The value
+    """
+    if _batch_mode:
+        raise ValueError(f"A value is missing and can not be prompted for in batch mode ({msg.strip(' :')})")
+    if hidden:
+        return getpass(msg)
+    return input(msg)
+
 
 def _get_arg(args, msg=None, hidden=False, confirm=False):
     if args is not None and len(args) > 0:
@@ -29,14 +59,14 @@ def _get_arg(args, msg=None, hidden=False, confirm=False):
     else:
         if hidden:
             if confirm:
-                x = getpass("%s : " % msg)
-                y = getpass("CONFIRM - %s : " % msg)
+                x = _prompt("%s : " % msg, hidden=True)
+                y = _prompt("CONFIRM - %s : " % msg, hidden=True)
                 assert_c(x == y, "inputs do not match, aborting.")
                 return y
             else:
-                return getpass("%s : " % msg)
+                return _prompt("%s : " % msg, hidden=True)
         else:
-            return input("%s : " % msg)
+            return _prompt("%s : " % msg)
 
 
 def _get_dn_arg(args, msg=None):
@@ -55,9 +85,9 @@ def _get_args(args, kws):
             kwargs[kw] = args.pop(0)
         else:
             if priv:
-                kwargs[kw] = getpass("%s : " % msg)
+                kwargs[kw] = _prompt("%s : " % msg, hidden=True)
             else:
-                kwargs[kw] = input("%s : " % msg)
+                kwargs[kw] = _prompt("%s : " % msg)
     return kwargs
 
 
@@ -73,18 +103,21 @@ def _get_attributes(args, attrs):
             kwargs[attr] = getattr(args, attr_normal)
         else:
             if attr.lower() == 'userpassword':
-                kwargs[attr] = getpass("Enter value for %s : " % attr)
+                kwargs[attr] = _prompt("Enter value for %s : " % attr, hidden=True)
             else:
                 attr_normal = attr.lower()
-                kwargs[attr_normal] = input("Enter value for %s : " % attr)
+                kwargs[attr_normal] = _prompt("Enter value for %s : " % attr)
 
     return kwargs
 
 
 def _warn(data, msg=None):
+    if _batch_mode:
+        # The command of the batch file is the confirmation
+        return data
     if msg is not None:
         print("%s :" % msg)
-    if 'Yes I am sure' != input("Type 'Yes I am sure' to continue: "):
+    if 'Yes I am sure' != _prompt("Type 'Yes I am sure' to continue: "):
         raise Exception("Not sure if want")
     return data
 
@@ -179,24 +212,24 @@ def _format_status(log, mtype, json=False):
 
 def _generic_list(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
-    ol = mc.list()
-    if len(ol) == 0:
+    # Stream the objects as they are received rather than listing them all first
+    found = False
+    if args and args.json:
+        json_result = {"type": "list", "items": []}
+    for o in mc.iter_list():
+        found = True
+        o_str = o.__unicode__()
+        if args and args.json:
+            json_result['items'].append(o_str)
+        else:
+            print(o_str)
+    if not found:
         if args and args.json:
             print(json.dumps({"type": "list", "items": []}, indent=4))
         else:
             log.info("No objects to display")
-    elif len(ol) > 0:
-        # We might sort this in the future
-        if args and args.json:
-            json_result = {"type": "list", "items": []}
-        for o in ol:
-            o_str = o.__unicode__()
-            if args and args.json:
-                json_result['items'].append(o_str)
-            else:
-                print(o_str)
-        if args and args.json:
-            print(json.dumps(json_result, indent=4))
+    elif args and args.json:
+        print(json.dumps(json_result, indent=4))
 
 
 # Display these entries better!
@@ -222,11 +255,13 @@ def _generic_get_entry(inst, basedn, log, manager_class, args=None):
 def _generic_get_attr(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
     vals = {}
-    for attr in args.attrs:
-        if args and args.json:
-            vals[attr] = mc.get_attr_vals_utf8(attr)
-        else:
-            print(mc.display_attr(attr).rstrip())
+    # Read all the attributes with a single search
+    with mc.batch(args.attrs):
+        for attr in args.attrs:
+            if args and args.json:
+                vals[attr] = mc.get_attr_vals_utf8(attr)
+            else:
+                print(mc.display_attr(attr).rstrip())
     if args.json:
         print(json.dumps({"type": "entry", "dn": mc._dn, "attrs": vals}, indent=4))
 
@@ -257,13 +292,18 @@ def _generic_delete(inst, basedn, log, object_class, dn, args=None):
 def _generic_replace_attr(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
     if args and args.attr:
-        for myattr in args.attr:
-            if "=" in myattr:
-                [attr, val] = myattr.split("=", 1)
-                mc.replace(attr, val)
-                print("Successfully replaced \"{}\"".format(attr))
-            else:
-                raise ValueError("You must specify a value to replace the attribute ({})".format(myattr))
+        replaced = []
+        # Apply all the changes with a single modify
+        with mc.batch([]):
+            for myattr in args.attr:
+                if "=" in myattr:
+                    [attr, val] = myattr.split("=", 1)
+                    mc.replace(attr, val)
+                    replaced.append(attr)
+                else:
+                    raise ValueError("You must specify a value to replace the attribute ({})".format(myattr))
+        for attr in replaced:
+            print("Successfully replaced \"{}\"".format(attr))
     else:
         # Missing value
         raise ValueError("Missing attribute to replace")
@@ -272,13 +312,18 @@ def _generic_replace_attr(inst, basedn, log, manager_class, args=None):
 def _generic_add_attr(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
     if args and args.attr:
-        for myattr in args.attr:
-            if "=" in myattr:
-                [attr, val] = myattr.split("=", 1)
-                mc.add(attr, val)
-                print("Successfully added \"{}\"".format(attr))
-            else:
-                raise ValueError("You must specify a value to add for the attribute ({})".format(myattr))
+        added = []
+        # Apply all the changes with a single modify
+        with mc.batch([]):
+            for myattr in args.attr:
+                if "=" in myattr:
+                    [attr, val] = myattr.split("=", 1)
+                    mc.add(attr, val)
+                    added.append(attr)
+                else:
+                    raise ValueError("You must specify a value to add for the attribute ({})".format(myattr))
+        for attr in added:
+            print("Successfully added \"{}\"".format(attr))
     else:
         # Missing value
         raise ValueError("Missing attribute to add")
@@ -287,15 +332,20 @@ def _generic_add_attr(inst, basedn, log, manager_class, args=None):
 def _generic_del_attr(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
     if args and args.attr:
-        for myattr in args.attr:
-            if "=" in myattr:
-                # we have a specific value
-                [attr, val] = myattr.split("=", 1)
-                mc.remove(attr, val)
-            else:
-                # remove all
-                mc.remove_all(myattr)
-                attr = myattr  # for logging
+        removed = []
+        # Apply all the changes with a single modify
+        with mc.batch([]):
+            for myattr in args.attr:
+                if "=" in myattr:
+                    # we have a specific value
+                    [attr, val] = myattr.split("=", 1)
+                    mc.remove(attr, val)
+                else:
+                    # remove all
+                    mc.remove_all(myattr)
+                    attr = myattr  # for logging
+                removed.append(attr)
+        for attr in removed:
             print("Successfully removed \"{}\"".format(attr))
     else:
         # Missing value
@@ -450,3 +500,326 @@ def format_error_to_dict(exception):
     except Exception:
         msg = {'desc': errmsg}
     return msg
+
+
+class _LazyChoices(dict):
+    """The subcommand parsers of a LazySubParsersAction: a command that was
+    not declared loads all the pending modules before being looked up, a
+    declared one loads its module, and walking all the parsers (i.e. to
+    build the man pages) loads all of them
+    """
+
+    def __init__(self, action):
+        super(_LazyChoices, self).__init__()
+        self._action = action
+
+    def _load_all(self):
+        if not self._action._loading:
+            self._action.load_all()
+
+    def __contains__(self, name):
+        if not super(_LazyChoices, self).__contains__(name):
+            self._load_all()
+        return super(_LazyChoices, self).__contains__(name)
+
+    def __getitem__(self, name):
+        if super(_LazyChoices, self).get(name) is None and not self._action._loading:
+            self._action.load_name(name)
+        return super(_LazyChoices, self).__getitem__(name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __iter__(self):
+        self._load_all()
+        return super(_LazyChoices, self).__iter__()
+
+    def keys(self):
+        self._load_all()
+        return super(_LazyChoices, self).keys()
+
+    def values(self):
+        self._load_all()
+        return super(_LazyChoices, self).values()
+
+    def items(self):
+        self._load_all()
+        return super(_LazyChoices, self).items()
+
+
+class _LazyChoicesActions(list):
+    """The help entries of the subcommands of a LazySubParsersAction, they
+    are created with the parsers so reading them loads all the modules
+    """
+
+    def __init__(self, action):
+        super(_LazyChoicesActions, self).__init__()
+        self._action = action
+
+    def _load_all(self):
+        if not self._action._loading:
+            self._action.load_all()
+
+    def __iter__(self):
+        self._load_all()
+        return super(_LazyChoicesActions, self).__iter__()
+
+    def __len__(self):
+        self._load_all()
+        return super(_LazyChoicesActions, self).__len__()
+
+    def __getitem__(self, index):
+        self._load_all()
+        return super(_LazyChoicesActions, self).__getitem__(index)
+
+
+class LazySubParsersAction(argparse._SubParsersAction):
+    """A subparsers action whose subcommands are only built when used.
+
+    Building the parsers of every subcommand imports most of lib389, while a
+    command line only needs the parser of one of them.  add_lazy_parsers()
+    declares the commands created by the create_parser() function of a
+    module, the module is imported when one of its commands is parsed.  The
+    help, an unknown command and walking the choices (argcomplete,
+    argparse-manpage) load all of them, so the tool behaves as if all the
+    parsers were built upfront, i.e.:
+
+        subparsers = parser.add_subparsers(help="resources to act upon", action=LazySubParsersAction)
+        subparsers.add_lazy_parsers('lib389.cli_conf.backend', ['backend'])
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LazySubParsersAction, self).__init__(*args, **kwargs)
+        self._name_parser_map = _LazyChoices(self)
+        self.choices = self._name_parser_map
+        self._choices_actions = _LazyChoicesActions(self)
+        # [(module, function, names)] of the modules not loaded yet
+        self._lazy = []
+        self._loading = False
+        # The commands in the order they were added, kept by the help
+        self._order = []
+
+    def add_parser(self, name, **kwargs):
+        if name not in self._order:
+            self._order.append(name)
+        return super(LazySubParsersAction, self).add_parser(name, **kwargs)
+
+    def add_lazy_parsers(self, module, names, function='create_parser'):
+        """Declare the commands added by a module
+
+        :param module: The module name, i.e. lib389.cli_conf.backend
+        :type module: str
+        :param names: The names of the commands the module adds
+        :type names: list
+        :param function: The function of the module adding the commands to the subparsers
+        :type function: str
+        """
+        self._lazy.append((module, function, names))
+        for name in names:
+            self._order.append(name)
+            # A placeholder, the real parser is added when the module is loaded
+            dict.__setitem__(self._name_parser_map, name, None)
+
+    def _load(self, lazy):
+        module, function, names = lazy
+        self._lazy.remove(lazy)
+        for name in names:
+            dict.pop(self._name_parser_map, name, None)
+        self._loading = True
+        try:
+            getattr(importlib.import_module(module), function)(self)
+        finally:
+            self._loading = False
+        # Restore the order of the declarations
+        order = {name: idx for idx, name in enumerate(self._order)}
+        parsers = sorted(dict.items(self._name_parser_map), key=lambda item: order.get(item[0], len(order)))
+        dict.clear(self._name_parser_map)
+        dict.update(self._name_parser_map, parsers)
+        self._choices_actions.sort(key=lambda action: order.get(action.dest, len(order)))
+
+    def load_name(self, name):
+        """Load the module of a declared command, or all the modules if the
+        command was not declared
+
+        :param name: The command name
+        :type name: str
+        """
+
+        for lazy in list(self._lazy):
+            if name in lazy[2]:
+                self._load(lazy)
+        if dict.get(self._name_parser_map, name) is None:
+            self.load_all()
+
+    def load_all(self):
+        """Load the modules of all the declared commands"""
+
+        while self._lazy:
+            self._load(self._lazy[0])
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        self.load_name(values[0])
+        super(LazySubParsersAction, self).__call__(parser, namespace, values, option_string)
+
+    def _get_subactions(self):
+        self.load_all()
+        return super(LazySubParsersAction, self)._get_subactions()
+
+
+def load_all_parsers_for_completion(subparsers):
+    """Load all the lazy subcommands when called by argcomplete, which
+    walks the whole parser tree
+
+    :param subparsers: The subparsers action of the tool
+    :type subparsers: LazySubParsersAction
+    """
+    if '_ARGCOMPLETE' in os.environ:
+        subparsers.load_all()
+
+
+class _BatchCapture(logging.Handler):
+    """Collect the messages logged by a command run by run_batch()"""
+
+    def __init__(self):
+        super(_BatchCapture, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _batch_command(line):
+    # A command is a shell like line, a JSON list of arguments, or a JSON
+    # object with the arguments in "args"
+    line = line.strip()
+    if line.startswith('['):
+        return [str(arg) for arg in json.loads(line)]
+    if line.startswith('{'):
+        return [str(arg) for arg in json.loads(line)['args']]
+    return shlex.split(line)
+
+
+def _batch_output(messages, as_json):
+    # The output of a JSON command is a list of JSON documents
+    output = []
+    for msg in messages:
+        if as_json:
+            try:
+                output.append(json.loads(msg))
+                continue
+            except ValueError:
+                pass
+        output.append(msg)
+    return output
+
+
+def run_batch(parser, inst, basedn, log, args, stream):
+    """Run the commands read from a stream over one connection, one
+    command per line (the arguments following the instance name), i.e.:
+
+        config replace nsslapd-accesslog-logbuffering=off
+        ["backend", "create", "--suffix", "dc=example,dc=com", "--be-name", "userRoot"]
+        {"args": ["plugin", "memberof", "enable"]}
+
+    Empty lines and lines starting with # are skipped.  The result of each
+    command is logged, as a JSON object per line with args.json, and
+    processing stops on the first failure with args.stop_on_error.
+
+    :param parser: The argument parser of the tool
+    :type parser: argparse.ArgumentParser
+    :param inst: The connected instance
+    :type inst: DirSrv
+    :param basedn: The base DN of the commands, overridden by their -b option,
+                   None if the tool doesn't use it
+    :type basedn: str
+    :param log: The logger of the tool
+    :type log: logging.Logger
+    :param args: The arguments of the tool
+    :type args: argparse.Namespace
+    :param stream: The file the commands are read from
+    :type stream: file
+    :returns: True if all the commands succeeded
+    """
+
+    # The commands log to a logger of their own so their output can be
+    # collected and reported with their result
+    cmd_log = logging.getLogger(f"{log.name}.batch")
+    cmd_log.setLevel(log.getEffectiveLevel())
+    cmd_log.propagate = False
+    failures = 0
+    count = 0
+    global _batch_mode
+    for lineno, line in enumerate(stream, start=1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        count += 1
+        result = {"line": lineno, "command": line.strip()}
+        capture = _BatchCapture()
+        cmd_log.addHandler(capture)
+        stdout = io.StringIO()
+        success = False
+        # The commands can't prompt: their stdout is captured, and with
+        # "--batch -" stdin is the batch itself
+        _batch_mode = True
+        stdin = sys.stdin
+        sys.stdin = io.StringIO()
+        try:
+            with redirect_stdout(stdout):
+                cmd = _batch_command(line)
+                result["command"] = cmd
+                try:
+                    cmd_args = parser.parse_args([args.instance] + cmd)
+                except SystemExit:
+                    raise ValueError(f"Invalid command: {' '.join(cmd)}")
+                if not hasattr(cmd_args, 'func'):
+                    raise ValueError(f"No action provided: {' '.join(cmd)}")
+                cmd_args.json = args.json
+                cmd_args.verbose = args.verbose
+                cmd_basedn = basedn
+                if basedn is not None and getattr(cmd_args, 'basedn', None):
+                    cmd_basedn = cmd_args.basedn
+                try:
+                    success = cmd_args.func(inst, cmd_basedn, cmd_log, cmd_args) is not False
+                except SystemExit as e:
+                    # Don't let a command end the whole batch
+                    if e.code not in (None, 0):
+                        raise ValueError(f"The command exited with status {e.code}")
+                    success = True
+        except Exception as e:
+            cmd_log.debug(e, exc_info=True)
+            result["error"] = format_error_to_dict(e)
+        finally:
+            _batch_mode = False
+            sys.stdin = stdin
+            cmd_log.removeHandler(capture)
+        messages = capture.messages + stdout.getvalue().splitlines()
+        result["result"] = "success" if success else "failure"
+        result["output"] = _batch_output(messages, args.json)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            for msg in messages:
+                log.info(msg)
+            if not success:
+                desc = " - ".join(str(val) for val in result.get("error", {"desc": "Command failed"}).values())
+                log.error(f"Error: line {lineno}: {desc}")
+        if not success:
+            failures += 1
+            if args.stop_on_error:
+                break
+
+    if not args.json:
+        log.info(f"Ran {count} command(s), {failures} failed")
+    return failures == 0
+
+
+def open_batch(path):
+    """Open the batch file of a tool, '-' being stdin (which is not closed)
+
+    :param path: The path of the file
+    :type path: str
+    :returns: A context manager giving the file
+    """
+    if path == '-':
+        return nullcontext(sys.stdin)
+    return open(path, 'r')
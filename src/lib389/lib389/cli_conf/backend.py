@@ -250,6 +250,31 @@ def backend_delete(inst, basedn, log, args, warn=True):
     log.info("The database, and any sub-suffixes, were sucessfully deleted")
 
 
+def _count_ldif_entries(ldifs):
+    """Count the entries of LDIF files, or return None if one of them can't be read"""
+    total = 0
+    try:
+        for ldif in ldifs:
+            with open(ldif, 'rb') as f:
+                total += sum(1 for line in f if line.startswith(b'dn:'))
+    except OSError:
+        return None
+    return total
+
+
+def _wait_task(task, log, args, total=None):
+    """Wait for an import or export task, and log its progress if requested.
+    total is the expected number of entries, needed for the ETA of an import.
+    """
+    if not getattr(args, 'progress', False) or args.json:
+        task.wait(timeout=None)
+        return
+    for progress in task.progress(total=total):
+        for line in progress.lines:
+            log.info(line)
+        log.info("Progress: {}".format(progress))
+
+
 def backend_import(inst, basedn, log, args):
     log = log.getChild('backend_import')
     dn = _search_backend_dn(inst, args.be_name)
@@ -260,7 +285,12 @@ def backend_import(inst, basedn, log, args):
     task = mc.import_ldif(ldifs=args.ldifs, chunk_size=args.chunks_size, encrypted=args.encrypted,
                           gen_uniq_id=args.gen_uniq_id, only_core=args.only_core, include_suffixes=args.include_suffixes,
                           exclude_suffixes=args.exclude_suffixes)
-    task.wait(timeout=None)
+    total = None
+    if getattr(args, 'progress', False) and inst.isLocal and not args.include_suffixes and not args.exclude_suffixes:
+        # The import only reports the number of entries processed so far:
+        # without the total of the LDIF files (remote or filtered) no ETA
+        total = _count_ldif_entries(task.get_attr_vals_utf8('nsFilename'))
+    _wait_task(task, log, args, total=total)
     result = task.get_exit_code()
     warning = task.get_task_warn()
 
@@ -292,7 +322,7 @@ def backend_export(inst, basedn, log, args):
                           encrypted=args.encrypted, min_base64=args.min_base64, no_dump_uniq_id=args.no_dump_uniq_id,
                           replication=args.replication, not_folded=args.not_folded, no_seq_num=args.no_seq_num,
                           include_suffixes=args.include_suffixes, exclude_suffixes=args.exclude_suffixes)
-    task.wait(timeout=None)
+    _wait_task(task, log, args)
     result = task.get_exit_code()
 
     if task.is_complete() and result == 0:
@@ -471,32 +501,33 @@ def backend_set(inst, basedn, log, args):
     if args.enable_readonly and args.disable_readonly:
         raise ValueError("You can not set the backend to be both enabled and disabled at the same time")
 
-    # Update backend
+    # Update backend, with a single modify of the backend entry
     be = _get_backend(inst, args.be_name)
-    if args.enable_readonly:
-        be.set('nsslapd-readonly', 'on')
-    if args.disable_readonly:
-        be.set('nsslapd-readonly', 'off')
-    if args.add_referral:
-        be.add('nsslapd-referral', args.add_referral)
-    if args.del_referral:
-        be.remove('nsslapd-referral', args.del_referral)
-    if args.cache_size:
-        be.set('nsslapd-cachesize', args.cache_size)
-    if args.cache_memsize:
-        be.set('nsslapd-cachememsize', args.cache_memsize)
-    if args.dncache_memsize:
-        be.set('nsslapd-dncachememsize', args.dncache_memsize)
-    if args.require_index:
-        be.set('nsslapd-require-index', 'on')
-    if args.ignore_index:
-        be.set('nsslapd-require-index', 'off')
-    if args.state:
-        be.set_state(args.state)
-    if args.enable:
-        be.enable()
-    if args.disable:
-        be.disable()
+    with be.batch():
+        if args.enable_readonly:
+            be.set('nsslapd-readonly', 'on')
+        if args.disable_readonly:
+            be.set('nsslapd-readonly', 'off')
+        if args.add_referral:
+            be.add('nsslapd-referral', args.add_referral)
+        if args.del_referral:
+            be.remove('nsslapd-referral', args.del_referral)
+        if args.cache_size:
+            be.set('nsslapd-cachesize', args.cache_size)
+        if args.cache_memsize:
+            be.set('nsslapd-cachememsize', args.cache_memsize)
+        if args.dncache_memsize:
+            be.set('nsslapd-dncachememsize', args.dncache_memsize)
+        if args.require_index:
+            be.set('nsslapd-require-index', 'on')
+        if args.ignore_index:
+            be.set('nsslapd-require-index', 'off')
+        if args.state:
+            be.set_state(args.state)
+        if args.enable:
+            be.enable()
+        if args.disable:
+            be.disable()
     log.info("The backend configuration was successfully updated")
 
 
@@ -1095,6 +1126,10 @@ def create_parser(subparsers):
                                help="Specifies the suffixes or the subtrees to be included")
     import_parser.add_argument('-x', '--exclude-suffixes', nargs='+',
                                help="Specifies the suffixes to be excluded")
+    import_parser.add_argument('--progress', action='store_true',
+                               help="Displays the task log, the throughput and the estimated time to completion while the import runs. "
+                                    "The estimated time is only displayed when the LDIF files can be read locally "
+                                    "and no suffix is included or excluded")
 
     #######################################################
     # Export LDIF
@@ -1124,6 +1159,8 @@ def create_parser(subparsers):
                                help="Specifies the suffixes or the subtrees to be included")
     export_parser.add_argument('-x', '--exclude-suffixes', nargs='+',
                                help="Specifies the suffixes to be excluded")
+    export_parser.add_argument('--progress', action='store_true',
+                               help="Displays the task log, the throughput and the estimated time to completion while the export runs")
 
     #######################################################
     # Create a new backend database
@@ -11,12 +11,15 @@ import os
 import json
 import ldap
 import stat
+import time
+from collections import deque
 from shutil import copyfile
-from getpass import getpass
 from lib389._constants import ReplicaRole, DSRC_HOME
+from lib389.cli_base import _prompt
 from lib389.cli_base.dsrc import dsrc_to_repl_monitor
 from lib389.utils import is_a_dn, copy_with_permissions, ds_supports_new_changelog
-from lib389.replica import Replicas, ReplicationMonitor, BootstrapReplicationManager, Changelog5, ChangelogLDIF, Changelog
+from lib389.replica import (Replicas, ReplicationMonitor, BootstrapReplicationManager, Changelog5, ChangelogLDIF,
+                            Changelog, ReplicationLagSampler, summarize_lag_samples)
 from lib389.tasks import CleanAllRUVTask, AbortCleanAllRUVTask
 from lib389._mapped_object import DSLdapObjects
 
@@ -404,13 +407,13 @@ def get_repl_monitor_info(inst, basedn, log, args):
                             with open(pwd_file_path) as f:
                                 bindpw = f.readline().strip()
                         except FileNotFoundError:
-                            bindpw = getpass(f"File '{pwd_file_path}' was not found. Please, enter "
-                                             f"a password for {binddn} on {host}:{port}: ").rstrip()
+                            bindpw = _prompt(f"File '{pwd_file_path}' was not found. Please, enter "
+                                             f"a password for {binddn} on {host}:{port}: ", hidden=True).rstrip()
                     if bindpw == "*":
-                        bindpw = getpass(f"Enter a password for {binddn} on {host}:{port}: ").rstrip()
+                        bindpw = _prompt(f"Enter a password for {binddn} on {host}:{port}: ", hidden=True).rstrip()
         if not found:
-            binddn = input(f'\nEnter a bind DN for {host}:{port}: ').rstrip()
-            bindpw = getpass(f"Enter a password for {binddn} on {host}:{port}: ").rstrip()
+            binddn = _prompt(f'\nEnter a bind DN for {host}:{port}: ').rstrip()
+            bindpw = _prompt(f"Enter a password for {binddn} on {host}:{port}: ", hidden=True).rstrip()
 
         credentials = {"binddn": binddn,
                        "bindpw": bindpw}
@@ -418,7 +421,7 @@ def get_repl_monitor_info(inst, basedn, log, args):
         return credentials
 
     repl_monitor = ReplicationMonitor(inst)
-    report_dict = repl_monitor.generate_report(get_credentials, args.json)
+    report_dict = repl_monitor.generate_report(get_credentials, args.json, parallel=args.parallel)
     report_items = []
 
     for instance, report_data in report_dict.items():
@@ -476,6 +479,97 @@ def get_repl_monitor_info(inst, basedn, log, args):
     if args.json:
         log.info(json.dumps({"type": "list", "items": report_items}, indent=4))
 
+
+def _print_lag_sample(log, sample, use_json):
+    if use_json:
+        log.info(json.dumps(sample))
+        return
+    lag = "unavailable" if sample["lag"] is None else f"{sample['lag']}s"
+    when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sample["time"]))
+    log.info(f"{when}  {sample['agmt']} ({sample['consumer']})  lag: {lag}  status: {sample['status']}")
+
+
+def _print_lag_summary(log, summary, use_json):
+    if use_json:
+        log.info(json.dumps({"type": "list", "items": summary}, indent=4))
+        return
+    for name, agmt in summary.items():
+        lag = agmt["lag"]
+        log.info(f"\nAgreement: {name} ({agmt['consumer']})")
+        log.info(f"Samples: {agmt['samples']} ({agmt['unavailable']} unavailable)")
+        if lag["count"] > 0:
+            log.info(f"Lag: max {lag['max']}s, mean {lag['mean']:.1f}s, "
+                     f"p50 {lag['p50']:.0f}s, p90 {lag['p90']:.0f}s, p99 {lag['p99']:.0f}s")
+
+
+def sample_repl_lag(inst, basedn, log, args):
+    get_credentials = None
+    if args.bind_dn is not None:
+        def get_credentials(host, port):
+            return {"binddn": args.bind_dn, "bindpw": args.bind_passwd}
+    sampler = ReplicationLagSampler(inst, args.suffix, interval=args.interval, capacity=args.capacity,
+                                    path=args.file, get_credentials=get_credentials, logger=log)
+
+    def print_samples(samples):
+        for sample in samples:
+            _print_lag_sample(log, sample, args.json)
+
+    try:
+        sampler.run(count=args.count, callback=print_samples)
+    except KeyboardInterrupt:
+        pass
+    _print_lag_summary(log, sampler.summary(), args.json)
+
+
+def _tail_lag_samples(path, lines, follow):
+    """Return the last samples of a file to display, and the summary of all
+    the samples, or None when following the file
+    """
+    if follow:
+        # No summary, only read the end of the file
+        return (ReplicationLagSampler.read_samples(path, last=max(lines, 0)), None)
+    # The summary needs every sample, stream them once and keep the last ones
+    tail = deque(maxlen=max(lines, 0))
+
+    def keep_tail(samples):
+        for sample in samples:
+            tail.append(sample)
+            yield sample
+
+    summary = summarize_lag_samples(keep_tail(ReplicationLagSampler.iter_samples(path)))
+    return (list(tail), summary)
+
+
+def tail_repl_lag(inst, basedn, log, args):
+    try:
+        samples, summary = _tail_lag_samples(args.file, args.lines, args.follow)
+    except OSError as e:
+        raise ValueError(f"Failed to read the lag samples file: {e}")
+    for sample in samples:
+        _print_lag_sample(log, sample, args.json)
+    if not args.follow:
+        _print_lag_summary(log, summary, args.json)
+        return
+
+    # Keep printing the samples appended to the file
+    try:
+        with open(args.file, 'r') as f:
+            f.seek(0, os.SEEK_END)
+            partial = ''
+            while True:
+                line = f.readline()
+                if not line:
+                    time.sleep(1)
+                    continue
+                partial += line
+                if not partial.endswith('\n'):
+                    # Wait for the end of a partially written line
+                    continue
+                _print_lag_sample(log, json.loads(partial), args.json)
+                partial = ''
+    except KeyboardInterrupt:
+        pass
+
 # This subcommand is available when 'not ds_supports_new_changelog'
 def create_cl(inst, basedn, log, args):
     cl = Changelog5(inst)
@@ -596,9 +690,9 @@ def create_repl_manager(inst, basedn, log, args):
         # Prompt for password
         while 1:
             while repl_manager_password == "":
-                repl_manager_password = getpass("Enter replication manager password: ")
+                repl_manager_password = _prompt("Enter replication manager password: ", hidden=True)
             while repl_manager_password_confirm == "":
-                repl_manager_password_confirm = getpass("Confirm replication manager password: ")
+                repl_manager_password_confirm = _prompt("Confirm replication manager password: ", hidden=True)
             if repl_manager_password_confirm == repl_manager_password:
                 break
             else:
@@ -875,7 +969,7 @@ def get_agmt_status(inst, basedn, log, args):
     if args.bind_dn is not None and args.bind_passwd is None:
         args.bind_passwd = ""
         while args.bind_passwd == "":
-            args.bind_passwd = getpass("Enter password for \"{}\": ".format(args.bind_dn))
+            args.bind_passwd = _prompt("Enter password for \"{}\": ".format(args.bind_dn), hidden=True)
     status = agmt.status(use_json=args.json, binddn=args.bind_dn, bindpw=args.bind_passwd)
     log.info(status)
 
@@ -1370,6 +1464,31 @@ def create_parser(subparsers):
     repl_monitor_parser.add_argument('-a', '--aliases', nargs="*",
                                      help="Enables displaying an alias instead of host:port, if an alias is "
                                           "assigned to a host:port combination. The format: alias=host:port")
+    repl_monitor_parser.add_argument('--parallel', type=int, default=None,
+                                     help="Query up to this number of instances at the same time, instead of one "
+                                          "after the other")
+
+    repl_lag_parser = repl_subcommands.add_parser('lag-sample', help='Sample the replication lag of the agreements '
+                                                  'of a suffix at a regular interval, and display it')
+    repl_lag_parser.set_defaults(func=sample_repl_lag)
+    repl_lag_parser.add_argument('--suffix', required=True, help="Sets the DN of the replication suffix")
+    repl_lag_parser.add_argument('--interval', type=int, default=10, help="Sets the number of seconds between samples")
+    repl_lag_parser.add_argument('--count', type=int, default=None,
+                                 help="Sets the number of samples to take. By default, sample until interrupted")
+    repl_lag_parser.add_argument('--capacity', type=int, default=8640,
+                                 help="Sets the number of samples of each agreement kept for the summary")
+    repl_lag_parser.add_argument('--file', help="Appends the samples to this file, to be read with 'lag-tail'")
+    repl_lag_parser.add_argument('--bind-dn', help="Sets the DN to use to authenticate to the consumers")
+    repl_lag_parser.add_argument('--bind-passwd', help="Sets the password for the bind DN")
+
+    repl_lag_tail_parser = repl_subcommands.add_parser('lag-tail', help='Display the replication lag samples '
+                                                       'written by lag-sample')
+    repl_lag_tail_parser.set_defaults(func=tail_repl_lag)
+    repl_lag_tail_parser.add_argument('file', help="The file written by 'lag-sample --file'")
+    repl_lag_tail_parser.add_argument('-n', '--lines', type=int, default=20,
+                                      help="Sets the number of last samples to display")
+    repl_lag_tail_parser.add_argument('-f', '--follow', action='store_true', default=False,
+                                      help="Keeps displaying the samples as they are appended")
 #
     ############################################
     # Replication Agmts
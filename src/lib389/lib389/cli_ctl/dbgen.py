@@ -6,6 +6,8 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 
+import json
+import os
 from lib389.dbgen import (
     dbgen_users,
     dbgen_groups,
@@ -14,6 +16,8 @@ from lib389.dbgen import (
     dbgen_role,
     dbgen_mod_load,
     dbgen_nested_ldif,
+    dbgen_workload,
+    dbgen_workload_profile,
 )
 from lib389.utils import is_a_dn
 
@@ -192,7 +196,10 @@ def dbgen_create_users(inst, log, args):
         validate_ldif_file(args.ldif_file)
 
     display_args(log, args)
-    dbgen_users(inst, args.number, args.ldif_file, args.suffix, generic=args.generic, parent=args.parent, startIdx=args.start_idx, rdnCN=False, pseudol10n=args.localize)
+    dbgen_users(inst, args.number, args.ldif_file, args.suffix, generic=args.generic, parent=args.parent,
+                startIdx=args.start_idx, rdnCN=args.rdn_cn, pseudol10n=args.localize,
+                seed=getattr(args, 'seed', None), shards=getattr(args, 'shards', None),
+                workers=getattr(args, 'workers', 1), compress=getattr(args, 'gzip', False))
     log.info(f"Successfully created LDIF file: {args.ldif_file}")
 
 
@@ -500,6 +507,41 @@ def dbgen_create_nested(inst, log, args):
     log.info(f"Successfully created nested LDIF file ({args.ldif_file}) containing {node_count} nodes/subtrees")
 
 
+def dbgen_create_workload(inst, log, args):
+    """
+    Create a LDIF modelling a production workload, with the matching modify
+    load LDIF and search filter corpus
+    """
+    profile = {}
+    if args.profile is not None:
+        with open(args.profile, 'r') as f:
+            profile = json.load(f)
+    if args.suffix is not None:
+        profile['suffix'] = args.suffix
+    if args.seed is not None:
+        profile['seed'] = args.seed
+
+    if args.show_profile:
+        log.info(json.dumps(dbgen_workload_profile(profile), indent=4))
+        return
+
+    args.ldif_file = adjust_ldif_name(inst, args.ldif_file)
+    validate_ldif_file(args.ldif_file)
+    base = os.path.splitext(args.ldif_file)[0]
+    if args.mod_ldif_file is None:
+        args.mod_ldif_file = base + "-mods.ldif"
+    if args.filter_file is None:
+        args.filter_file = base + "-filters.txt"
+
+    display_args(log, args)
+    summary = dbgen_workload(inst, args.ldif_file, profile, mod_ldif_file=args.mod_ldif_file,
+                             filter_file=args.filter_file)
+    log.info(f"Successfully created LDIF file ({args.ldif_file}) containing {summary['users']} users and "
+             f"{summary['groups']} groups ({summary['memberships']} memberships, {summary['nestedGroups']} nested groups)")
+    log.info(f"Successfully created modify load LDIF file ({args.mod_ldif_file}) containing {summary['modOps']} operations")
+    log.info(f"Successfully created search filter file ({args.filter_file}) containing {summary['filters']} filters")
+
+
 def create_parser(subparsers):
     db_gen_parser = subparsers.add_parser('ldifgen', help="LDIF generator to make sample LDIF files for testing")
     subcommands = db_gen_parser.add_subparsers(help="action")
@@ -515,6 +557,10 @@ def create_parser(subparsers):
     dbgen_users_parser.add_argument('--rdn-cn', action='store_true', help="Use the attribute \"cn\" as the RDN attribute in the DN instead of \"uid\"")
     dbgen_users_parser.add_argument('--localize', action='store_true', help="Localize the LDIF data")
     dbgen_users_parser.add_argument('--ldif-file', default="users.ldif", help=f"The LDIF file name.  Default location is the server's LDIF directory using the name 'users.ldif'")
+    dbgen_users_parser.add_argument('--seed', type=int, help="The random seed.  The same seed and number of shards always generate the same LDIF.")
+    dbgen_users_parser.add_argument('--workers', type=int, default=1, help="The number of processes generating the LDIF.  Default is 1")
+    dbgen_users_parser.add_argument('--shards', type=int, help="The number of shards the users are split in, each one with its own seed.  Default is the number of workers")
+    dbgen_users_parser.add_argument('--gzip', action='store_true', help="Write a gzip compressed LDIF")
 
     # Create static groups
     dbgen_groups_parser = subcommands.add_parser('groups', help='Generate a LDIF containing groups and members')
@@ -585,3 +631,14 @@ def create_parser(subparsers):
     dbgen_nested_parser.add_argument('--node-limit', help="The total number of user entries to create under each node/subtree")
     dbgen_nested_parser.add_argument('--suffix', help="The suffix DN for the LDIF")
     dbgen_nested_parser.add_argument('--ldif-file', default="nested-users.ldif",  help=f"The LDIF file name.  Default location is the server's LDIF directory using the name 'users.ldif'")
+
+    # Create a workload model LDIF
+    dbgen_workload_parser = subcommands.add_parser('workload', help='Generate a LDIF modelling a production workload (skewed group sizes, nested groups, skewed attribute values), with a matching modify load LDIF and search filter corpus')
+    dbgen_workload_parser.set_defaults(func=dbgen_create_workload)
+    dbgen_workload_parser.add_argument('--profile', help="A JSON file of the workload profile.  The missing values are taken from the default profile")
+    dbgen_workload_parser.add_argument('--show-profile', action='store_true', help="Display the complete workload profile and exit")
+    dbgen_workload_parser.add_argument('--suffix', help="The suffix DN for the LDIF, overriding the profile")
+    dbgen_workload_parser.add_argument('--seed', type=int, help="The random seed, overriding the profile.  The same seed and profile always generate the same files")
+    dbgen_workload_parser.add_argument('--ldif-file', default="workload.ldif", help="The LDIF file name.  Default location is the server's LDIF directory using the name 'workload.ldif'")
+    dbgen_workload_parser.add_argument('--mod-ldif-file', help="The modify load LDIF file name.  Default is the LDIF file name ending with '-mods.ldif'")
+    dbgen_workload_parser.add_argument('--filter-file', help="The search filter file name.  Default is the LDIF file name ending with '-filters.txt'")
@@ -13,7 +13,13 @@
 import os
 import re
 import glob
+import gzip
+import json
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lib389._constants import DN_CONFIG, TaskWarning
 from lib389.dseldif import DSEldif
 import subprocess
 
@@ -27,6 +33,15 @@ MDB_INFO = "INFO.mdb"
 MDB_MAP = "data.mdb"
 MDB_LOCK = "lock.mdb"
 
+DBLIB_CHECKPOINT = f"{DBLIB_LDIF_PREFIX}bdb2mdb.json"
+DBLIB_STAGING = f"{DBLIB_LDIF_PREFIX}bdb2mdb"
+STREAM_BUFSIZE = 1024 * 1024
+SPOOL_COMPRESSLEVEL = 1
+# Expected size of the compressed spool compared to the id2entry size
+SPOOL_RATIO = 0.25
+# Seconds to wait for a stopped ns-slapd before killing it
+STOP_TIMEOUT = 30
+
 LDBM_DN = "cn=config,cn=ldbm database,cn=plugins,cn=config"
 
 _log = None
@@ -84,6 +99,7 @@ def get_backends(log, dse, tmpdir):
                 update_dse.append((dn, ecdbdir))
             dblib = dse.get(dn, "nsslapd-backend-implement", True)
             ldifname = f'{tmpdir}/{DBLIB_LDIF_PREFIX}{bename}.ldif'
+            spoolname = f'{ldifname}.gz'
             cl5name = f'{tmpdir}/{DBLIB_LDIF_PREFIX}{bename}.cl5.dbtxt'
             cl5dbname = f'{dbdir}/replication_changelog.db'
             eccl5dbname = f'{ecdbdir}/replication_changelog.db'
@@ -107,6 +123,7 @@ def get_backends(log, dse, tmpdir):
                 'dbsize': dbsize,
                 'dblib': dblib,
                 'ldifname': ldifname,
+                'spoolname': spoolname,
                 'cl5name': cl5name,
                 'cl5dbname': cl5dbname,
                 'eccl5dbname': eccl5dbname,
@@ -116,8 +133,9 @@ def get_backends(log, dse, tmpdir):
                 'dbi': dbi
             })
     # now that we finish reading the dse.ldif we may update it if needed.
-    for dn, dir in update_dse:
-        dse.replace(dn, 'nsslapd-directory', dir)
+    with dse.batch():
+        for dn, dir in update_dse:
+            dse.replace(dn, 'nsslapd-directory', dir)
     log.debug(f'lib389.cli_ctl.dblib.get_backends returns: {str(res)}')
     return res
 
@@ -194,6 +212,72 @@ def set_owner(list, uid, gid):
             pass
 
 
+def get_mdb_config(backends):
+    """
+    Compute the lmdb map size and number of dbis needed for the bdb backends
+    Returns (total_dbsize, total_entrysize, dbmap_size, nbdbis)
+    """
+    total_dbsize = 0
+    total_entrysize = 0
+    total_dbi = 3
+    for bename, be in backends.items():
+        # Keep only backend associated with a db
+        if be['dbsize'] == 0:
+            continue
+        total_dbsize += be['dbsize']
+        total_entrysize += be['entrysize']
+        total_dbi += be['dbi']
+
+    # Round up dbmap size
+    dbmap_size = DEFAULT_DBMAP_SIZE
+    while (total_dbsize * DBSIZE_MARGIN > dbmap_size):
+        dbmap_size *= 1.25
+
+    # Round up number of dbis
+    nbdbis = 1
+    while nbdbis < total_dbi + DBI_MARGIN:
+        nbdbis *= 2
+    return (total_dbsize, total_entrysize, dbmap_size, nbdbis)
+
+
+def write_mdb_info(dbmapdir, dbmap_size, nbdbis, uid, gid):
+    # Generate the info file (so dbscan could generate the map)
+    with open(f'{dbmapdir}/{MDB_INFO}', 'w') as f:
+        f.write('LIBVERSION=9025\n')
+        f.write('DATAVERSION=0\n')
+        f.write(f'MAXSIZE={dbmap_size}\n')
+        f.write('MAXREADERS=50\n')
+        f.write(f'MAXDBS={nbdbis}\n')
+    os.chown(f'{dbmapdir}/{MDB_INFO}', uid, gid)
+
+
+def switch_to_mdb(dse, backends, dbmap_size, nbdbis):
+    # switch nsslapd-backend-implement in the dse.ldif
+    cfgbe = backends['config']
+    dn = cfgbe['dn']
+    with dse.batch():
+        dse.replace(dn, 'nsslapd-backend-implement', 'mdb')
+
+        # Add the lmdb config entry
+        dn = f'cn=mdb,{dn}'
+        try:
+            dse.delete_dn(dn)
+        except Exception:
+            pass
+        dse.add_entry([
+            f"dn: {dn}\n",
+            "objectClass: extensibleobject\n",
+            "objectClass: top\n",
+            "cn: mdb\n",
+            f"nsslapd-mdb-max-size: {dbmap_size}\n",
+            "nsslapd-mdb-max-readers: 0\n",
+            f"nsslapd-mdb-max-dbs: {nbdbis}\n",
+            "nsslapd-db-durable-transaction: on\n",
+            "nsslapd-search-bypass-filter-test: on\n",
+            "nsslapd-serial-lock: on\n"
+        ])
+
+
 def dblib_bdb2mdb(inst, log, args):
     global _log
     _log = log
@@ -207,6 +291,10 @@ def dblib_bdb2mdb(inst, log, args):
         log.error(f"Failed trying to create the directory {tmpdir} needed to store the ldif files, error: {str(e)}")
         return
 
+    if getattr(args, 'stream', False) or getattr(args, 'resume', False):
+        dblib_bdb2mdb_stream(inst, log, args, tmpdir)
+        return
+
     # Cannot use Backends(inst).list() because it requires a connection.
     # lets use directlt the dse.ldif after having stopped the instance
 
@@ -224,41 +312,15 @@ def dblib_bdb2mdb(inst, log, args):
     dblib_cleanup(inst, log, args)
 
     # Compute the needed space and the lmdb map configuration
-    total_dbsize = 0
-    total_entrysize = 0
-    total_dbi = 3
-    for bename, be in backends.items():
-        # Keep only backend associated with a db
-        if be['dbsize'] == 0:
-            continue
-        total_dbsize += be['dbsize']
-        total_entrysize += be['entrysize']
-        total_dbi += be['dbi']
-
-    # Round up dbmap size
-    dbmap_size = DEFAULT_DBMAP_SIZE
-    while (total_dbsize * DBSIZE_MARGIN > dbmap_size):
-        dbmap_size *= 1.25
-
-    # Round up number of dbis
-    nbdbis = 1
-    while nbdbis < total_dbi + DBI_MARGIN:
-        nbdbis *= 2
+    total_dbsize, total_entrysize, dbmap_size, nbdbis = get_mdb_config(backends)
 
     log.info(f"Required space for LDIF files is about {size_fmt(total_entrysize)}")
     log.info(f"Required space for DBMAP files is about {size_fmt(dbmap_size)}")
     log.info(f"Required number of dbi is {nbdbis}")
 
-    # Generate the info file (so dbscan could generate the map)
     uid = inst.get_user_uid()
     gid = inst.get_group_gid()
-    with open(f'{dbmapdir}/{MDB_INFO}', 'w') as f:
-        f.write('LIBVERSION=9025\n')
-        f.write('DATAVERSION=0\n')
-        f.write(f'MAXSIZE={dbmap_size}\n')
-        f.write('MAXREADERS=50\n')
-        f.write(f'MAXDBS={nbdbis}\n')
-    os.chown(f'{dbmapdir}/{MDB_INFO}', uid, gid)
+    write_mdb_info(dbmapdir, dbmap_size, nbdbis, uid, gid)
 
     if os.stat(dbmapdir).st_dev == os.stat(tmpdir).st_dev:
         total, used, free = shutil.disk_usage(dbmapdir)
@@ -288,29 +350,7 @@ def dblib_bdb2mdb(inst, log, args):
     log.info("Backends exportation 100%")
 
     log.info("Updating dse.ldif file")
-    # switch nsslapd-backend-implement in the dse.ldif
-    cfgbe = backends['config']
-    dn = cfgbe['dn']
-    dse.replace(dn, 'nsslapd-backend-implement', 'mdb')
-
-    # Add the lmdb config entry
-    dn = f'cn=mdb,{dn}'
-    try:
-        dse.delete_dn(dn)
-    except Exception:
-        pass
-    dse.add_entry([
-        f"dn: {dn}\n",
-        "objectClass: extensibleobject\n",
-        "objectClass: top\n",
-        "cn: mdb\n",
-        f"nsslapd-mdb-max-size: {dbmap_size}\n",
-        "nsslapd-mdb-max-readers: 0\n",
-        f"nsslapd-mdb-max-dbs: {nbdbis}\n",
-        "nsslapd-db-durable-transaction: on\n",
-        "nsslapd-search-bypass-filter-test: on\n",
-        "nsslapd-serial-lock: on\n"
-    ])
+    switch_to_mdb(dse, backends, dbmap_size, nbdbis)
 
     # Reimport all exported backends and changelog
     progress = 0
@@ -333,6 +373,340 @@ def dblib_bdb2mdb(inst, log, args):
     log.info("Migration from Berkeley database to lmdb is done.")
 
 
+class Bdb2MdbCheckpoint(object):
+    """
+    The state of a streamed bdb2mdb migration. It is kept in the dbmap
+    directory so that an interrupted migration can be resumed (or rolled
+    back by the cleanup sub command) without restarting from zero.
+    The backend states are 'pending', 'exported' (its compressed spool is
+    complete) and 'done' (its entries and its changelog are imported)
+    """
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, 'r') as f:
+                return Bdb2MdbCheckpoint(path, json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self):
+        # Atomically replace the checkpoint file
+        with self._lock:
+            tmpname = f'{self.path}.tmp'
+            with open(tmpname, 'w') as f:
+                json.dump(self.state, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpname, self.path)
+
+    def get_backend(self, bename):
+        with self._lock:
+            return self.state['backends'].get(bename, 'pending')
+
+    def set_backend(self, bename, state):
+        with self._lock:
+            self.state['backends'][bename] = state
+        self.save()
+
+
+def stage_config(inst, srcdir, dstdir, dblib, uid, gid):
+    """
+    Copy a configuration directory and give it its own lock directory.
+    ns-slapd refuses to run an offline import (or a replication export)
+    while another task holds the same lock directory, so every concurrent
+    db2ldif/ldif2db of the migration runs on its own copy.
+    Returns the copied configuration directory
+    """
+    shutil.copytree(srcdir, dstdir, symlinks=True, ignore=shutil.ignore_patterns('lock'))
+    lockdir = f'{dstdir}/lock'
+    os.makedirs(lockdir, 0o750, True)
+    dse = DSEldif(inst, path=f'{dstdir}/dse.ldif')
+    with dse.batch():
+        dse.replace(DN_CONFIG, 'nsslapd-lockdir', lockdir)
+        if dblib is not None:
+            dse.replace(LDBM_DN, 'nsslapd-backend-implement', dblib)
+    # ns-slapd runs as the instance user
+    for root, dirs, files in os.walk(dstdir):
+        set_owner([root] + [os.path.join(root, f) for f in files], uid, gid)
+    return dstdir
+
+
+def unblock_fifo(path, flags):
+    # Open and close a fifo end without blocking, so that a peer stuck
+    # in open() waiting for it is released
+    try:
+        os.close(os.open(path, flags | os.O_NONBLOCK))
+    except OSError:
+        pass
+
+
+def stream_ldif(srcname, dstname, spoolname, result):
+    """
+    Copy an ldif (a fifo, or a compressed spool) to the import fifo and,
+    if spoolname is set, to a compressed spool file.
+    Runs in its own thread, the errors and the copied size are put in result
+    """
+    spool = None
+    try:
+        opener = gzip.open if srcname.endswith('.gz') else open
+        with opener(srcname, 'rb') as src, open(dstname, 'wb') as dst:
+            if spoolname is not None:
+                spool = gzip.open(spoolname, 'wb', compresslevel=SPOOL_COMPRESSLEVEL)
+            while True:
+                data = src.read(STREAM_BUFSIZE)
+                if not data:
+                    break
+                dst.write(data)
+                if spool is not None:
+                    spool.write(data)
+                result['bytes'] += len(data)
+    except OSError as e:
+        result['error'] = e
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def run_offline(cmd, outname):
+    _log.debug(f"run_offline: {' '.join(cmd)}")
+    with open(outname, 'w') as out:
+        return subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT)
+
+
+def wait_pipeline(procs, pump, result, fifos):
+    """
+    Wait until the processes and the pump thread of a backend pipeline end.
+    As soon as one of them fails the others are stopped, so that none stays
+    blocked on a fifo whose peer is gone.
+    Returns True if all of them succeeded
+    """
+    failed = False
+    stop_time = None
+    while True:
+        running = [p for (name, p) in procs if p.poll() is None]
+        for name, p in procs:
+            rc = p.returncode
+            if rc is not None and rc != 0 and not (name == 'ldif2db' and rc == TaskWarning.WARN_SKIPPED_IMPORT_ENTRY):
+                if not failed:
+                    _log.debug(f"wait_pipeline: {name} failed with return code {rc}")
+                failed = True
+        pump_alive = pump is not None and pump.is_alive()
+        if pump is not None and not pump_alive and result['error'] is not None:
+            failed = True
+        if not running and not pump_alive:
+            return not failed
+        if failed:
+            if stop_time is None:
+                stop_time = time.monotonic()
+                for p in running:
+                    p.terminate()
+            elif time.monotonic() - stop_time > STOP_TIMEOUT:
+                for p in running:
+                    p.kill()
+            if pump_alive:
+                for fifo in fifos:
+                    unblock_fifo(fifo, os.O_RDONLY)
+                    unblock_fifo(fifo, os.O_WRONLY)
+        time.sleep(0.2)
+
+
+def stream_backend(inst, be, ckpt, staging, compress, uid, gid):
+    """
+    Migrate a backend to lmdb: the bdb export is streamed into the lmdb
+    import through a fifo, then the changelog is migrated.
+    With compress, the exported ldif is also kept in a compressed spool so
+    that a failed import is resumed without exporting it again.
+    Returns True if the backend is migrated
+    """
+    bename = be['bename']
+    prog = os.path.join(inst.ds_paths.sbin_dir, 'ns-slapd')
+    workdir = f'{staging}/{bename}'
+    spoolname = be['spoolname']
+    fromspool = ckpt.get_backend(bename) == 'exported' and os.path.isfile(spoolname)
+    start = time.monotonic()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir, 0o750)
+    set_owner([workdir], uid, gid)
+    importconf = stage_config(inst, inst.get_config_dir(), f'{workdir}/import', None, uid, gid)
+    importfifo = f'{workdir}/import.ldif'
+    os.mkfifo(importfifo, 0o600)
+    set_owner([importfifo], uid, gid)
+
+    # The pipeline is: db2ldif -> fifo -> ldif2db
+    # or, when there is a spool to write or to read:
+    #     db2ldif -> fifo -> stream_ldif (-> spool) -> fifo -> ldif2db
+    procs = []
+    fifos = [importfifo]
+    srcname = None
+    tmpspoolname = None
+    if fromspool:
+        _log.info(f"Importing backend {bename} from {spoolname}")
+        srcname = spoolname
+    else:
+        exportconf = stage_config(inst, f'{staging}/bdb', f'{workdir}/export', None, uid, gid)
+        exportfifo = importfifo
+        if compress:
+            exportfifo = f'{workdir}/export.ldif'
+            os.mkfifo(exportfifo, 0o600)
+            set_owner([exportfifo], uid, gid)
+            fifos.append(exportfifo)
+            srcname = exportfifo
+            tmpspoolname = f'{spoolname}.tmp'
+        procs.append(('db2ldif', run_offline([prog, 'db2ldif', '-D', exportconf, '-n', bename, '-r', '-a', exportfifo],
+                                             f'{workdir}/db2ldif.out')))
+    procs.append(('ldif2db', run_offline([prog, 'ldif2db', '-D', importconf, '-n', bename, '-i', importfifo],
+                                         f'{workdir}/ldif2db.out')))
+    result = {'error': None, 'bytes': 0}
+    pump = None
+    if srcname is not None:
+        pump = threading.Thread(target=stream_ldif, args=(srcname, importfifo, tmpspoolname, result))
+        pump.start()
+
+    success = wait_pipeline(procs, pump, result, fifos)
+    if tmpspoolname is not None:
+        if procs[0][1].returncode == 0 and result['error'] is None:
+            # The export is complete, even if the import failed
+            os.replace(tmpspoolname, spoolname)
+            ckpt.set_backend(bename, 'exported')
+        else:
+            rm(tmpspoolname)
+    if not success:
+        error = f", error: {result['error']}" if result['error'] is not None else ""
+        _log.error(f"Failed to migrate backend {bename}{error}. The ns-slapd output is in {workdir}")
+        return False
+
+    if export_changelog(be, 'bdb') and not import_changelog(be, 'mdb'):
+        _log.error(f"Failed to import the changelog of backend {bename}")
+        return False
+    ckpt.set_backend(bename, 'done')
+    rm(spoolname)
+    rm(be['cl5name'])
+    shutil.rmtree(workdir, ignore_errors=True)
+    streamed = f" ({size_fmt(result['bytes'])} of ldif)" if pump is not None else ""
+    _log.info(f"Backend {bename} migrated in {time.monotonic() - start:.1f} seconds{streamed}")
+    return True
+
+
+def dblib_bdb2mdb_stream(inst, log, args, tmpdir):
+    """
+    Migrate the bdb backends to lmdb without writing the ldif files: each
+    backend export is streamed into its import, and up to args.jobs
+    backends are migrated at the same time.
+    """
+    resume = getattr(args, 'resume', False)
+    compress = getattr(args, 'compress', False)
+    jobs = max(1, getattr(args, 'jobs', 1) or 1)
+
+    inst.stop()
+    dse = DSEldif(inst)
+    backends = get_backends(log, dse, tmpdir)
+    dbmapdir = backends['config']['dbdir']
+    dblib = backends['config']['dblib']
+    uid = inst.get_user_uid()
+    gid = inst.get_group_gid()
+    ckpt = Bdb2MdbCheckpoint.load(f'{dbmapdir}/{DBLIB_CHECKPOINT}')
+
+    if ckpt is None:
+        if resume:
+            log.error(f"No interrupted migration to lmdb was found for instance {inst.serverid}.")
+            return
+        if dblib == "mdb":
+            log.error(f"Instance {inst.serverid} is already configured with lmdb.")
+            return
+
+        # Remove ldif files and mdb files
+        dblib_cleanup(inst, log, args)
+
+        total_dbsize, total_entrysize, dbmap_size, nbdbis = get_mdb_config(backends)
+        spool_size = total_entrysize * SPOOL_RATIO if compress else 0
+        log.info(f"Required space for DBMAP files is about {size_fmt(dbmap_size)}")
+        log.info(f"Required number of dbi is {nbdbis}")
+        if compress:
+            log.info(f"Required space for the compressed LDIF spool is about {size_fmt(spool_size)}")
+
+        # No ldif files, only the map and the optional spool need space
+        if os.stat(dbmapdir).st_dev == os.stat(tmpdir).st_dev:
+            checks = [(dbmapdir, dbmap_size + spool_size)]
+        else:
+            checks = [(dbmapdir, dbmap_size), (tmpdir, spool_size)]
+        for path, need in checks:
+            total, used, free = shutil.disk_usage(path)
+            if free < need:
+                log.error(f"Not enough space on {path} to migrate to lmdb (Need {size_fmt(need)}, Have {size_fmt(free)})")
+                return
+
+        write_mdb_info(dbmapdir, dbmap_size, nbdbis, uid, gid)
+        ckpt = Bdb2MdbCheckpoint(f'{dbmapdir}/{DBLIB_CHECKPOINT}', {
+            'tmpdir': tmpdir,
+            'dbmap_size': dbmap_size,
+            'nbdbis': nbdbis,
+            'switched': False,
+            'backends': {}
+        })
+        ckpt.save()
+    elif not resume:
+        log.error(f"An interrupted migration to lmdb was found ({ckpt.path}). "
+                  "Use --resume to continue it, or the cleanup sub command to roll it back.")
+        return
+    elif ckpt.state['tmpdir'] != tmpdir:
+        # The spool files are in the directory of the interrupted migration
+        tmpdir = ckpt.state['tmpdir']
+        backends = get_backends(log, dse, tmpdir)
+
+    # The exports use a copy of the bdb configuration, so the instance one
+    # can be switched to lmdb before the backends are imported
+    staging = f'{tmpdir}/{DBLIB_STAGING}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging, 0o750)
+    set_owner([staging], uid, gid)
+    stage_config(inst, inst.get_config_dir(), f'{staging}/bdb', 'bdb', uid, gid)
+
+    if not ckpt.state['switched']:
+        log.info("Updating dse.ldif file")
+        switch_to_mdb(dse, backends, ckpt.state['dbmap_size'], ckpt.state['nbdbis'])
+        ckpt.state['switched'] = True
+        ckpt.save()
+
+    dbbackends = [be for be in backends.values() if be['dbsize'] > 0]
+    pending = [be for be in dbbackends if ckpt.get_backend(be['bename']) != 'done']
+    done = len(dbbackends) - len(pending)
+    failed = []
+    log.info(f"Migrating {len(pending)} backends, {jobs} at a time")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(stream_backend, inst, be, ckpt, staging, compress, uid, gid): be['bename']
+                   for be in pending}
+        for future in as_completed(futures):
+            bename = futures[future]
+            try:
+                success = future.result()
+            except Exception as e:
+                log.error(f"Failed to migrate backend {bename}, error: {str(e)}")
+                success = False
+            if success:
+                done += 1
+                log.info(f"Backends migration {done*100/len(dbbackends):2f}% ({bename})")
+            else:
+                failed.append(bename)
+
+    if failed:
+        log.error(f"Failed to migrate backends {', '.join(failed)}. The instance is left stopped: "
+                  f"once the issue is fixed, run 'dsctl {inst.serverid} dblib bdb2mdb --resume' to finish the migration.")
+        return
+
+    set_owner(glob.glob(f'{dbmapdir}/*.mdb'), uid, gid)
+    shutil.rmtree(staging, ignore_errors=True)
+    rm(ckpt.path)
+    log.info("Backends migration 100%")
+    inst.start()
+    log.info("Migration from Berkeley database to lmdb is done.")
+
+
 def dblib_mdb2bdb(inst, log, args):
     global _log
     _log = log
@@ -355,6 +729,10 @@ def dblib_mdb2bdb(inst, log, args):
     dbmapdir = backends['config']['dbdir']
     dbhome = inst.ds_paths.db_home_dir
     dblib = backends['config']['dblib']
+    if os.path.exists(f'{dbmapdir}/{DBLIB_CHECKPOINT}'):
+        log.error(f"The migration of instance {inst.serverid} to lmdb was interrupted. "
+                  "Use 'bdb2mdb --resume' to finish it, or the cleanup sub command to roll it back.")
+        return
     dbis = get_mdb_dbis(dbmapdir)
 
     if dblib == "bdb":
@@ -470,6 +848,24 @@ def dblib_cleanup(inst, log, args):
     dblib = backends['config']['dblib']
     log.info(f"cleanup dbmapdir={dbmapdir} dbhome={dbhome} dblib={dblib}")
 
+    ckpt = Bdb2MdbCheckpoint.load(f'{dbmapdir}/{DBLIB_CHECKPOINT}')
+    if ckpt is not None:
+        # The bdb databases of an interrupted bdb2mdb migration are still
+        # complete: switch back to them and remove the partial lmdb ones
+        log.info("Rolling back the interrupted migration to lmdb")
+        backends = get_backends(log, dse, ckpt.state['tmpdir'])
+        dse.replace(backends['config']['dn'], 'nsslapd-backend-implement', 'bdb')
+        for bename, be in backends.items():
+            rm(be['spoolname'])
+            rm(f"{be['spoolname']}.tmp")
+            rm(be['cl5name'])
+        rm(f'{dbmapdir}/{MDB_INFO}')
+        rm(f'{dbmapdir}/{MDB_MAP}')
+        rm(f'{dbmapdir}/{MDB_LOCK}')
+        shutil.rmtree(f"{ckpt.state['tmpdir']}/{DBLIB_STAGING}", ignore_errors=True)
+        rm(ckpt.path)
+        return
+
     # Remove all ldif and changelog file
     for bename, be in backends.items():
         # Keep only backend associated with a db
@@ -511,10 +907,20 @@ def create_parser(subparsers):
     dblib_bdb2mdb_parser = subcommands.add_parser('bdb2mdb', help='Migrate bdb databases to lmdb')
     dblib_bdb2mdb_parser.set_defaults(func=dblib_bdb2mdb)
     dblib_bdb2mdb_parser.add_argument('--tmpdir', help="ldif migration files directory path.")
+    dblib_bdb2mdb_parser.add_argument('--stream', action='store_true',
+                                      help="Stream each backend export into its import through a fifo instead of writing ldif files.")
+    dblib_bdb2mdb_parser.add_argument('--jobs', type=int, default=1,
+                                      help="With --stream, the number of backends migrated at the same time (default is 1).")
+    dblib_bdb2mdb_parser.add_argument('--compress', action='store_true',
+                                      help="With --stream, also keep each exported backend in a compressed ldif spool, "
+                                           "so that a failed import is resumed without exporting the backend again.")
+    dblib_bdb2mdb_parser.add_argument('--resume', action='store_true',
+                                      help="Resume an interrupted --stream migration, skipping the backends that are already migrated.")
 
     dblib_mdb2bdb_parser = subcommands.add_parser('mdb2bdb', help='Migrate lmdb databases to bdb')
     dblib_mdb2bdb_parser.set_defaults(func=dblib_mdb2bdb)
     dblib_mdb2bdb_parser.add_argument('--tmpdir', help="ldif migration files directory path.")
 
-    dblib_cleanup_parser = subcommands.add_parser('cleanup', help='Remove migration ldif file and old database')
+    dblib_cleanup_parser = subcommands.add_parser('cleanup', help='Remove migration ldif file and old database, '
+                                                                  'or roll back an interrupted --stream migration')
     dblib_cleanup_parser.set_defaults(func=dblib_cleanup)
@@ -11,18 +11,29 @@ from lib389._constants import TaskWarning
 
 def dbtasks_db2index(inst, log, args):
     rtn = False
+    progress = None
+    if getattr(args, 'progress', False):
+        last_entries = None
+
+        def progress(task_progress):
+            nonlocal last_entries
+            for line in task_progress.lines:
+                log.info(line)
+            if task_progress.entries != last_entries or task_progress.complete:
+                last_entries = task_progress.entries
+                log.info("Progress: {}".format(task_progress))
     if not args.backend:
-        if not inst.db2index():
+        if not inst.db2index(progress=progress):
             rtn = False
         else:
             rtn = True
     elif args.backend and not args.attr:
-        if not inst.db2index(bename=args.backend):
+        if not inst.db2index(bename=args.backend, progress=progress):
             rtn = False
         else:
             rtn = True
     else:
-        if not inst.db2index(bename=args.backend, attrs=args.attr):
+        if not inst.db2index(bename=args.backend, attrs=args.attr, progress=progress):
             rtn = False
         else:
             rtn = True
@@ -115,6 +126,8 @@ def create_parser(subcommands):
     # db2index_parser.add_argument('suffix', help="The suffix to reindex. IE dc=example,dc=com.")
     db2index_parser.add_argument('backend', nargs="?", help="The backend to reindex. IE userRoot", default=False)
     db2index_parser.add_argument('--attr', nargs="*", help="The attribute's to reindex. IE --attr aci cn givenname", default=False)
+    db2index_parser.add_argument('--progress', action='store_true',
+                                 help="Displays the reindex output, the throughput and the estimated time to completion")
     db2index_parser.set_defaults(func=dbtasks_db2index)
 
     db2bak_parser = subcommands.add_parser('db2bak', help="Initialise a BDB backup of the database. The server must be stopped for this to proceed.")
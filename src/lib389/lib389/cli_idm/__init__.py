@@ -8,8 +8,8 @@
 # --- END COPYRIGHT BLOCK ---
 
 import ldap
-from getpass import getpass
 import json
+from lib389.cli_base import _is_batch_mode, _prompt
 
 
 def _get_arg(args, msg=None):
@@ -19,7 +19,7 @@ def _get_arg(args, msg=None):
         else:
             return args
     else:
-        return input("%s : " % msg)
+        return _prompt("%s : " % msg)
 
 
 def _get_args(args, kws):
@@ -31,9 +31,9 @@ def _get_args(args, kws):
             kwargs[kw] = args.pop(0)
         else:
             if priv:
-                kwargs[kw] = getpass("%s : " % msg)
+                kwargs[kw] = _prompt("%s : " % msg, hidden=True)
             else:
-                kwargs[kw] = input("%s : " % msg)
+                kwargs[kw] = _prompt("%s : " % msg)
     return kwargs
 
 
@@ -48,40 +48,43 @@ def _get_attributes(args, attrs):
             kwargs[attr] = getattr(args, attr_normal)
         else:
             if attr.lower() == 'userpassword':
-                kwargs[attr] = getpass("Enter value for %s : " % attr)
+                kwargs[attr] = _prompt("Enter value for %s : " % attr, hidden=True)
             else:
-                kwargs[attr] = input("Enter value for %s : " % attr)
+                kwargs[attr] = _prompt("Enter value for %s : " % attr)
     return kwargs
 
 
 def _warn(data, msg=None):
+    if _is_batch_mode():
+        # The command of the batch file is the confirmation
+        return data
     if msg is not None:
         print("%s :" % msg)
-    if 'Yes I am sure' != input("Type 'Yes I am sure' to continue: "):
+    if 'Yes I am sure' != _prompt("Type 'Yes I am sure' to continue: "):
         raise Exception("Not sure if want")
     return data
 
 
 def _generic_list(inst, basedn, log, manager_class, args=None):
     mc = manager_class(inst, basedn)
-    ol = mc.list()
-    if len(ol) == 0:
+    # Stream the objects as they are received rather than listing them all first
+    found = False
+    if args and args.json:
+        json_result = {"type": "list", "items": []}
+    for o in mc.iter_list():
+        found = True
+        o_str = o.__unicode__()
+        if args and args.json:
+            json_result['items'].append(o_str)
+        else:
+            log.info(o_str)
+    if not found:
         if args and args.json:
             log.info(json.dumps({"type": "list", "items": []}, indent=4))
         else:
             log.info("No objects to display")
-    elif len(ol) > 0:
-        # We might sort this in the future
-        if args and args.json:
-            json_result = {"type": "list", "items": []}
-        for o in ol:
-            o_str = o.__unicode__()
-            if args and args.json:
-                json_result['items'].append(o_str)
-            else:
-                log.info(o_str)
-        if args and args.json:
-            log.info(json.dumps(json_result, indent=4))
+    elif args and args.json:
+        log.info(json.dumps(json_result, indent=4))
 
 
 # Display these entries better!
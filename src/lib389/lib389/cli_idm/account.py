@@ -7,6 +7,7 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 
+import json
 import ldap
 import math
 from datetime import datetime
@@ -63,6 +64,58 @@ def _print_entry_status(status, dn, log):
     log.info(f'Entry State: {status["state"].describe(status["role_dn"])}\n')
 
 
+def _status_to_json(status, dn):
+    params = {}
+    for name, value in status["params"].items():
+        if "Time" in name and value is not None:
+            value = int(math.fabs(value))
+        elif "Date" in name and value is not None:
+            value = value.strftime('%Y%m%d%H%M%SZ')
+        params[name] = value
+    return {"dn": dn,
+            "state": status["state"].name.lower(),
+            "description": status["state"].describe(status["role_dn"]),
+            "role_dn": status["role_dn"],
+            "calc_time": status["calc_time"],
+            "params": params}
+
+
+def _get_inactive_time(args):
+    if args.become_inactive_on:
+        datetime_inactive_time = datetime.strptime(args.become_inactive_on, '%Y-%m-%dT%H:%M:%S')
+        return datetime.timestamp(datetime_inactive_time)
+    return None
+
+
+def _status_is_displayed(status, args, epoch_inactive_time):
+    params = status["params"]
+    if args.inactive_only and status["state"] == AccountState.ACTIVATED:
+        return False
+    if args.become_inactive_on:
+        if epoch_inactive_time is None or params["Time Until Inactive"] is None or \
+           epoch_inactive_time <= (params["Time Until Inactive"] + status["calc_time"]):
+            return False
+    return True
+
+
+def _bulk_status(inst, basedn, log, args, filter, scope):
+    epoch_inactive_time = _get_inactive_time(args)
+    found = False
+    json_result = {"type": "status", "items": []}
+    for (entry, status) in Accounts(inst, basedn).iter_status(filter, scope, paged_search=args.page_size):
+        found = True
+        if not _status_is_displayed(status, args, epoch_inactive_time):
+            continue
+        if args.json:
+            json_result["items"].append(_status_to_json(status, entry.dn))
+        else:
+            _print_entry_status(status, entry.dn, log)
+    if not found:
+        raise ValueError(f"No entries were found under {basedn}")
+    if args.json:
+        log.info(json.dumps(json_result, indent=4))
+
+
 def entry_status(inst, basedn, log, args):
     dn = _get_dn_arg(args.dn, msg="Enter dn to check")
     accounts = Accounts(inst, basedn)
@@ -73,32 +126,29 @@ def entry_status(inst, basedn, log, args):
 
 def subtree_status(inst, basedn, log, args):
     basedn = _get_dn_arg(args.basedn, msg="Enter basedn to check")
-    filter = ""
     scope = ldap.SCOPE_SUBTREE
-    epoch_inactive_time = None
     if args.scope == "one":
         scope = ldap.SCOPE_ONELEVEL
-    if args.filter:
-        filter = args.filter
-    if args.become_inactive_on:
-        datetime_inactive_time = datetime.strptime(args.become_inactive_on, '%Y-%m-%dT%H:%M:%S')
-        epoch_inactive_time = datetime.timestamp(datetime_inactive_time)
-
-    account_list = Accounts(inst, basedn).filter(filter, scope)
-    if not account_list:
-        raise ValueError(f"No entries were found under {basedn}")
-
-    for entry in account_list:
-        status = entry.status()
-        state = status["state"]
-        params = status["params"]
-        if args.inactive_only and state == AccountState.ACTIVATED:
-            continue
-        if args.become_inactive_on:
-            if epoch_inactive_time is None or params["Time Until Inactive"] is None or \
-               epoch_inactive_time <= (params["Time Until Inactive"] + status["calc_time"]):
-                continue
-        _print_entry_status(status, entry.dn, log)
+    _bulk_status(inst, basedn, log, args, args.filter, scope)
+
+
+def status(inst, basedn, log, args):
+    if args.all or args.filter:
+        if args.dn:
+            raise ValueError("An entry DN can not be used with --all or --filter")
+        scope = ldap.SCOPE_SUBTREE
+        if args.scope == "one":
+            scope = ldap.SCOPE_ONELEVEL
+        _bulk_status(inst, basedn, log, args, args.filter, scope)
+    elif args.dn:
+        acct = Accounts(inst, basedn).get(dn=args.dn)
+        acct_status = acct.status()
+        if args.json:
+            log.info(json.dumps({"type": "status", "items": [_status_to_json(acct_status, acct.dn)]}, indent=4))
+        else:
+            _print_entry_status(acct_status, acct.dn, log)
+    else:
+        raise ValueError("An entry DN, --all or --filter is required")
 
 
 def lock(inst, basedn, log, args):
@@ -186,6 +236,19 @@ like modify, locking and unlocking. To create an account, see "user" subcommand
     status_parser.add_argument('-i', '--inactive-only', action='store_true', help="Only display inactivated entries")
     status_parser.add_argument('-o', '--become-inactive-on',
                                help="Only display entries that will become inactive before specified date (in a format 2007-04-25T14:30)")
+    status_parser.add_argument('--page-size', type=int, default=500, help="The page size of the search of the entries (default is 500)")
+
+    status_parser = subcommands.add_parser('status', help='status of an entry, or of all the entries (matching a filter) under the base DN. '
+                                                         'The policy settings are read only once, and the entries with a single paged search')
+    status_parser.set_defaults(func=status)
+    status_parser.add_argument('dn', nargs='?', help='The single entry dn to check')
+    status_parser.add_argument('-a', '--all', action='store_true', help="Check all the entries under the base DN")
+    status_parser.add_argument('-f', '--filter', help="Check the entries matching this search filter under the base DN")
+    status_parser.add_argument('-s', '--scope', choices=['one', 'sub'], help="Search scope (one, sub - default is sub")
+    status_parser.add_argument('-i', '--inactive-only', action='store_true', help="Only display inactivated entries")
+    status_parser.add_argument('-o', '--become-inactive-on',
+                               help="Only display entries that will become inactive before specified date (in a format 2007-04-25T14:30:00)")
+    status_parser.add_argument('--page-size', type=int, default=500, help="The page size of the search of the entries (default is 500)")
 
     reset_pw_parser = subcommands.add_parser('reset_password', help='Reset the password of an account. This should be performed by a directory admin.')
     reset_pw_parser.set_defaults(func=reset_password)
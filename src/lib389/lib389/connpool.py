@@ -0,0 +1,266 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+
+"""A thread-safe pool of bound DirSrv connections to remote servers.
+
+Helpers that contact other servers of a topology (i.e. the consumers of the
+replication agreements) used to open and bind a new connection on every call.
+The pool keeps these connections open and hands them out again to the next
+caller with the same server, bind identity and TLS settings.
+"""
+
+import atexit
+import hashlib
+import logging
+import threading
+import time
+import ldap
+from lib389._constants import (args_instance, SER_HOST, SER_PORT, SER_SECURE_PORT,
+                               SER_ROOT_DN, SER_ROOT_PW)
+
+log = logging.getLogger(__name__)
+
+
+class _PooledConnection(object):
+    """A connection of the pool, and when it was last used"""
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.last_used = time.monotonic()
+
+
+class DirSrvPool(object):
+    """A pool of bound DirSrv connections, keyed by the server URL, the bind
+    identity and the TLS settings.
+
+    Connections are used by one thread at a time: connection() blocks when
+    max_size connections to the same server are already in use.
+
+    :param max_size: The maximum number of connections for each key
+    :type max_size: int
+    :param max_idle: The number of seconds after which an unused connection is closed
+    :type max_idle: int
+    :param check_interval: The number of seconds after which an unused connection
+                           is checked with a "Who am I?" operation before reuse
+    :type check_interval: int
+    :param timeout: The number of seconds to wait for a free connection
+    :type timeout: int
+    :param verbose: Verbose logging of the DirSrv connections
+    :type verbose: bool
+    """
+
+    def __init__(self, max_size=4, max_idle=300, check_interval=30, timeout=60, verbose=False):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.verbose = verbose
+        self._lock = threading.Condition()
+        # key -> list of idle _PooledConnection
+        self._idle = {}
+        # key -> number of connections, idle or in use
+        self._count = {}
+        self.stats = {'created': 0, 'reused': 0, 'failed_checks': 0, 'evicted': 0}
+
+    @staticmethod
+    def _key(host, port, binddn, bindpw, secure, open_args):
+        # Don't keep the password itself in the key
+        pw_hash = hashlib.sha256((bindpw or '').encode()).hexdigest()
+        return (host.lower(), int(port), bool(secure), binddn.lower() if binddn else None,
+                pw_hash, tuple(sorted(open_args.items())))
+
+    def _connect(self, host, port, binddn, bindpw, secure, open_args):
+        # Import here, lib389 imports this module
+        from lib389 import DirSrv
+        inst = DirSrv(verbose=self.verbose)
+        args = args_instance.copy()
+        args[SER_HOST] = host
+        if secure:
+            args[SER_SECURE_PORT] = int(port)
+        else:
+            args[SER_PORT] = int(port)
+        args[SER_ROOT_DN] = binddn
+        args[SER_ROOT_PW] = bindpw
+        inst.allocate(args)
+        inst.open(**open_args)
+        return inst
+
+    def _stat(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.check_interval:
+            return True
+        try:
+            conn.inst.whoami_s()
+            return True
+        except ldap.LDAPError as e:
+            log.debug("Dropping the connection to %s:%s, error: %s", conn.inst.host, conn.inst.port, e)
+            self._stat('failed_checks')
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.inst.close()
+        except ldap.LDAPError:
+            pass
+
+    def acquire(self, host, port, binddn, bindpw, secure=False, **open_args):
+        """Get a bound connection to a server, an idle one from the pool or
+        a new one. It must be given back with release().
+
+        :param host: The server host name
+        :type host: str
+        :param port: The server port
+        :type port: int
+        :param binddn: The bind DN
+        :type binddn: str
+        :param bindpw: The bind password
+        :type bindpw: str
+        :param secure: Use LDAPS
+        :type secure: bool
+        :param open_args: Other arguments of DirSrv.open(), i.e. the TLS settings
+        :returns: A DirSrv
+        :raises: ldap.LDAPError - if the connection fails
+                 ldap.TIMEOUT - if no connection is free after timeout seconds
+        """
+
+        key = self._key(host, port, binddn, bindpw, secure, open_args)
+        deadline = time.monotonic() + self.timeout
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key, [])
+                conn = idle.pop() if idle else None
+                if conn is None:
+                    if self._count.get(key, 0) < self.max_size:
+                        # Reserve the slot, the connection is opened unlocked
+                        self._count[key] = self._count.get(key, 0) + 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise ldap.TIMEOUT("No free connection to %s:%s" % (host, port))
+                        self._lock.wait(remaining)
+                        continue
+            if conn is not None:
+                if self._healthy(conn):
+                    self._stat('reused')
+                    return conn.inst
+                self._close(conn)
+                with self._lock:
+                    self._count[key] -= 1
+                continue
+            try:
+                inst = self._connect(host, port, binddn, bindpw, secure, open_args)
+            except Exception:
+                with self._lock:
+                    self._count[key] -= 1
+                    self._lock.notify()
+                raise
+            inst._pool_key = key
+            self._stat('created')
+            return inst
+
+    def release(self, inst, discard=False):
+        """Give a connection back to the pool
+
+        :param inst: A DirSrv returned by acquire()
+        :type inst: lib389.DirSrv
+        :param discard: Close the connection instead, i.e. after an error
+        :type discard: bool
+        """
+
+        key = inst._pool_key
+        conn = _PooledConnection(inst)
+        if discard:
+            self._close(conn)
+        with self._lock:
+            if discard:
+                self._count[key] -= 1
+            else:
+                self._idle.setdefault(key, []).append(conn)
+            self._lock.notify()
+
+    def connection(self, host, port, binddn, bindpw, secure=False, **open_args):
+        """A context manager for acquire() and release(). The connection is
+        closed instead of being reused if an LDAP error is raised, i.e.:
+
+            with pool.connection(host, port, binddn, bindpw) as inst:
+                inst.search_s(...)
+
+        :returns: A context manager giving a DirSrv
+        """
+
+        return _PoolConnection(self, host, port, binddn, bindpw, secure, open_args)
+
+    def evict_idle(self):
+        """Close the connections that were not used for max_idle seconds"""
+
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            for key, idle in self._idle.items():
+                for conn in [c for c in idle if now - c.last_used > self.max_idle]:
+                    idle.remove(conn)
+                    self._count[key] -= 1
+                    expired.append(conn)
+            if expired:
+                self._lock.notify_all()
+        for conn in expired:
+            self._stat('evicted')
+            self._close(conn)
+
+    def close(self):
+        """Close all the idle connections of the pool"""
+
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+            for key, conns in idle.items():
+                self._count[key] -= len(conns)
+        for conns in idle.values():
+            for conn in conns:
+                self._close(conn)
+
+
+class _PoolConnection(object):
+    """The context manager returned by DirSrvPool.connection()"""
+
+    def __init__(self, pool, host, port, binddn, bindpw, secure, open_args):
+        self._pool = pool
+        self._args = (host, port, binddn, bindpw, secure)
+        self._open_args = open_args
+        self._inst = None
+
+    def __enter__(self):
+        self._inst = self._pool.acquire(*self._args, **self._open_args)
+        return self._inst
+
+    def __exit__(self, type, value, tb):
+        discard = type is not None and issubclass(type, ldap.LDAPError)
+        self._pool.release(self._inst, discard=discard)
+        return False
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the pool shared by the lib389 helpers
+
+    :returns: DirSrvPool
+    """
+
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DirSrvPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
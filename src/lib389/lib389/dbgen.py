@@ -9,8 +9,12 @@
 # Replacement of the dbgen.pl utility
 
 from lib389.utils import (ensure_str, pseudolocalize)
+import gzip
+import multiprocessing
 import random
 import os
+import shutil
+import tempfile
 import pwd
 import grp
 
@@ -124,6 +128,11 @@ ou: {OU}
 
 """
 
+# Number of entries formatted before each write
+DBGEN_WRITE_BATCH = 1000
+DBGEN_COPY_BUFSIZE = 1024 * 1024
+DBGEN_GZIP_LEVEL = 6
+
 RANDOM_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqurstuvwxyz0123456789_#@%&()?~$^`~*-=+{}|"\'.,<>'
 
 
@@ -216,82 +225,181 @@ def write_generic_user(LDIF, index, number, parent, name="user", changetype="",
     ))
     return dn
 
-def dbgen_users(instance, number, ldif_file, suffix, generic=False, entry_name="user", parent=None, startIdx=0, rdnCN=False, pseudol10n=False):
-    """
-    Generate an LDIF of randomly named entries
-    """
-    # Lets insure that integer parameters are not string
-    number=int(number)
-    startIdx=int(startIdx)
+def _dbgen_names(instance):
+    # Get the given names and the family names used to build the users
     familyname_file = os.path.join(instance.ds_paths.data_dir, 'dirsrv/data/dbgen-FamilyNames')
     givename_file = os.path.join(instance.ds_paths.data_dir, 'dirsrv/data/dbgen-GivenNames')
-    familynames = []
-    givennames = []
     with open(familyname_file, 'r') as f:
         familynames = [n.strip() for n in f]
     with open(givename_file, 'r') as f:
         givennames = [n.strip() for n in f]
+    return givennames, familynames
+
+
+def _dbgen_user_entry(rng, i, number, suffix, parent, generic, entry_name, startIdx, rdnCN, pseudol10n,
+                      givennames, familynames):
+    # Build one user entry, the rng calls must stay in the same order to
+    # keep the generated LDIF reproducible for a given seed
+    ou = rng.choice(DBGEN_OUS)
+    first = rng.choice(givennames)
+    last = rng.choice(familynames)
+    if generic:
+        i += startIdx
+        name = entry_name + get_index(i, number)
+        uid = name
+        cn = name
+    else:
+        first = rng.choice(givennames)
+        last = rng.choice(familynames)
+        uid = "%s%s%s" % (first[0], last, i)
+        cn = f"{first} {last}"
+    initials = "%s. %s" % (first[0], last[0])
+    l = rng.choice(DBGEN_LOCATIONS)
+    title = "%s %s" % (rng.choice(DBGEN_TITLE_LEVELS), rng.choice(DBGEN_POSITIONS))
+    if pseudol10n:
+        ou = pseudolocalize(ou)
+        first = pseudolocalize(first)
+        last = pseudolocalize(last)
+        initials = pseudolocalize(initials)
+        l = pseudolocalize(l)
+        title = pseudolocalize(title)
 
-    with open(ldif_file, 'w') as LDIF:
-        LDIF.write(get_node(suffix))
+    if parent is None:
+        parent = f"ou={ou},{suffix}"
+
+    if rdnCN:
+        # Not using "uid" so use "cn" instead
+        dn = f"cn={cn},{parent}"
+    else:
+        dn = f"uid={uid},{parent}"
+
+    return DBGEN_TEMPLATE.format(
+        DN=dn,
+        CHANGETYPE="",
+        UID=uid,
+        UIDNUMBER=i,
+        FIRST=first,
+        LAST=last,
+        CN=cn,
+        INITIALS=initials,
+        OU=ou,
+        LOCATION=l,
+        TITLE=title,
+    )
+
+
+def _dbgen_shard_ranges(number, shards):
+    # Split the 1..number index range in contiguous ranges, one per shard
+    shards = max(1, min(shards, number)) if number > 0 else 1
+    size, extra = divmod(number, shards)
+    ranges = []
+    first = 1
+    for shard in range(shards):
+        last = first + size + (1 if shard < extra else 0)
+        ranges.append((shard, first, last))
+        first = last
+    return ranges
+
+
+def _dbgen_open(fileobj, compress):
+    # Each shard is written as its own gzip member, the concatenated members
+    # are a valid gzip file.  The name and mtime are not stored in the header
+    # so the output only depends on the data.
+    if compress:
+        return gzip.GzipFile(filename='', mode='wb', fileobj=fileobj,
+                             compresslevel=DBGEN_GZIP_LEVEL, mtime=0)
+    return fileobj
+
+
+def _dbgen_write_users_shard(out, task):
+    (shard, first, last, seed, number, suffix, parent, generic, entry_name,
+     startIdx, rdnCN, pseudol10n, givennames, familynames, compress) = task
+    rng = random.Random(None if seed is None else f"{seed}:{shard}")
+    dest = _dbgen_open(out, compress)
+    buf = []
+    for i in range(first, last):
+        buf.append(_dbgen_user_entry(rng, i, number, suffix, parent, generic, entry_name, startIdx,
+                                     rdnCN, pseudol10n, givennames, familynames))
+        if len(buf) >= DBGEN_WRITE_BATCH:
+            dest.write("".join(buf).encode())
+            buf = []
+    if buf:
+        dest.write("".join(buf).encode())
+    if dest is not out:
+        dest.close()
+
+
+def _dbgen_users_shard_file(task):
+    # Worker process: write a shard to a file of the temporary directory
+    shard_dir = task[-1]
+    shard_file = os.path.join(shard_dir, "shard-%d" % task[0])
+    with open(shard_file, 'wb') as out:
+        _dbgen_write_users_shard(out, task[:-1])
+    return shard_file
+
+
+def dbgen_users(instance, number, ldif_file, suffix, generic=False, entry_name="user", parent=None, startIdx=0,
+                rdnCN=False, pseudol10n=False, seed=None, shards=None, workers=1, compress=False):
+    """
+    Generate an LDIF of randomly named entries
+
+    The index range can be split in shards, each one generated with its own
+    random seed derived from seed.  The shards are generated by a pool of
+    worker processes and concatenated in order, so for a given seed and
+    number of shards the LDIF is the same whatever the number of workers.
+
+    :param seed: The random seed, None for a random LDIF
+    :type seed: int
+    :param shards: The number of shards, the number of workers by default
+    :type shards: int
+    :param workers: The number of worker processes
+    :type workers: int
+    :param compress: Write a gzip compressed LDIF
+    :type compress: bool
+    """
+    # Lets insure that integer parameters are not string
+    number=int(number)
+    startIdx=int(startIdx)
+    workers = max(1, int(workers or 1))
+    shards = workers if shards is None else max(1, int(shards))
+    givennames, familynames = _dbgen_names(instance)
+
+    tasks = [(shard, first, last, seed, number, suffix, parent, generic, entry_name, startIdx, rdnCN,
+              pseudol10n, givennames, familynames, compress)
+             for shard, first, last in _dbgen_shard_ranges(number, shards)]
+
+    with open(ldif_file, 'wb') as LDIF:
+        header = [get_node(suffix)]
         for ou in DBGEN_OUS:
             ou = pseudolocalize(ou) if pseudol10n else ou
-            LDIF.write(DBGEN_OU_TEMPLATE.format(SUFFIX=suffix, OU=ou))
+            header.append(DBGEN_OU_TEMPLATE.format(SUFFIX=suffix, OU=ou))
 
         if parent is not None:
             parent_rdn = parent.split(',')[0].split('=')[1]
             if parent_rdn.lower() not in DBGEN_OUS:
-                LDIF.write(get_node(parent))
+                header.append(get_node(parent))
 
-        for i in range(1, int(number) + 1):
-            # Pick a random ou
-            ou = random.choice(DBGEN_OUS)
-            first = random.choice(givennames)
-            last = random.choice(familynames)
-            if generic:
-                i += startIdx
-                name = entry_name + get_index(i, number)
-                uid = name
-                cn = name
-            else:
-                first = random.choice(givennames)
-                last = random.choice(familynames)
-                uid = "%s%s%s" % (first[0], last, i)
-                cn = f"{first} {last}"
-            # How do we subscript from a generator?
-            initials = "%s. %s" % (first[0], last[0])
-            l = random.choice(DBGEN_LOCATIONS)
-            title = "%s %s" % (random.choice(DBGEN_TITLE_LEVELS), random.choice(DBGEN_POSITIONS))
-            if pseudol10n:
-                ou = pseudolocalize(ou)
-                first = pseudolocalize(first)
-                last = pseudolocalize(last)
-                initials = pseudolocalize(initials)
-                l = pseudolocalize(l)
-                title = pseudolocalize(title)
-
-            if parent is None:
-                parent = f"ou={ou},{suffix}"
-
-            if rdnCN:
-                # Not using "uid" so use "cn" instead
-                dn = f"cn={cn},{parent}"
-            else:
-                dn = f"uid={uid},{parent}"
-
-            LDIF.write(DBGEN_TEMPLATE.format(
-                DN=dn,
-                CHANGETYPE="",
-                UID=uid,
-                UIDNUMBER=i,
-                FIRST=first,
-                LAST=last,
-                CN=cn,
-                INITIALS=initials,
-                OU=ou,
-                LOCATION=l,
-                TITLE=title,
-            ))
+        dest = _dbgen_open(LDIF, compress)
+        dest.write("".join(header).encode())
+        if dest is not LDIF:
+            dest.close()
+
+        if workers == 1 or len(tasks) == 1:
+            for task in tasks:
+                _dbgen_write_users_shard(LDIF, task)
+        else:
+            # Append each shard as soon as it and the previous ones are done
+            shard_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(ldif_file)),
+                                         prefix=".%s." % os.path.basename(ldif_file))
+            try:
+                with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                    for shard_file in pool.imap(_dbgen_users_shard_file,
+                                                [task + (shard_dir,) for task in tasks]):
+                        with open(shard_file, 'rb') as f:
+                            shutil.copyfileobj(f, LDIF, DBGEN_COPY_BUFSIZE)
+                        os.remove(shard_file)
+            finally:
+                shutil.rmtree(shard_dir, ignore_errors=True)
 
     finalize_ldif_file(instance, ldif_file)
 
@@ -734,3 +842,429 @@ def dbgen_nested_ldif(instance, ldif_file, props):
     finalize_ldif_file(instance, ldif_file)
 
     return node_count
+
+
+# The default workload profile, see dbgen_workload()
+DBGEN_WORKLOAD_PROFILE = {
+    "seed": None,
+    "suffix": "dc=example,dc=com",
+    "users": {
+        "number": 10000,
+        "parent": None,
+    },
+    "attributes": {
+        "departmentNumber": {"cardinality": 100, "exponent": 1.0},
+        "l": {"cardinality": 50, "exponent": 1.2},
+        "title": {"cardinality": 200, "exponent": 0.8},
+        "employeeType": {"cardinality": 5, "exponent": 2.0},
+    },
+    "groups": {
+        "number": 100,
+        "parent": None,
+        "membershipAttr": "member",
+        "memberDensity": 0.8,
+        "size": {"min": 1, "max": 5000, "exponent": 1.0},
+        "large": {"number": 0, "size": 100000},
+        "nesting": {"depth": 3, "fraction": 0.1},
+    },
+    "modLoad": {
+        "number": 1000,
+        "exponent": 1.0,
+        "mix": {"modify": 60, "add": 10, "delete": 5, "modrdn": 5, "addMember": 15, "deleteMember": 5},
+    },
+    "searches": {
+        "number": 1000,
+        "exponent": 1.0,
+        "mix": {"uid": 50, "attribute": 30, "memberOf": 10, "member": 10},
+    },
+}
+
+DBGEN_WORKLOAD_USER_TEMPLATE = """dn: {DN}{CHANGETYPE}
+objectClass: top
+objectClass: person
+objectClass: organizationalPerson
+objectClass: inetOrgPerson
+uid: {UID}
+cn: {FIRST} {LAST}
+sn: {LAST}
+givenName: {FIRST}
+mail: {UID}@example.com
+userPassword: {UID}
+"""
+
+DBGEN_WORKLOAD_MOD_OPS = ('modify', 'add', 'delete', 'modrdn', 'addMember', 'deleteMember')
+DBGEN_WORKLOAD_FILTERS = ('uid', 'attribute', 'memberOf', 'member')
+# The number of times in a row an operation can't be generated before it is dropped
+DBGEN_WORKLOAD_MAX_FAILURES = 100
+
+# The profile keys whose value replaces the default one instead of being merged
+DBGEN_WORKLOAD_REPLACED_KEYS = ('attributes', 'mix')
+
+
+def dbgen_workload_profile(profile=None):
+    """
+    Get a complete workload profile: the values of profile merged into the
+    default profile DBGEN_WORKLOAD_PROFILE
+
+    :param profile: A (partial) workload profile
+    :type profile: dict
+    :returns: dict
+    """
+    def merge(default, values):
+        result = dict(default)
+        for key, val in (values or {}).items():
+            if isinstance(val, dict) and isinstance(result.get(key), dict) and \
+                    key not in DBGEN_WORKLOAD_REPLACED_KEYS:
+                result[key] = merge(result[key], val)
+            else:
+                result[key] = val
+        return result
+
+    return merge(DBGEN_WORKLOAD_PROFILE, profile)
+
+
+def _zipf_index(rng, n, exponent):
+    # Pick an index in [0, n) with a Zipf like distribution: index 0 is the
+    # most likely.  This inverts the continuous approximation of the CDF, so
+    # no table of n weights is needed.  An exponent of 0 is a uniform pick.
+    u = rng.random()
+    if exponent == 1:
+        k = (n + 1) ** u
+    else:
+        k = (((n + 1) ** (1 - exponent) - 1) * u + 1) ** (1 / (1 - exponent))
+    return min(n, max(1, int(k))) - 1
+
+
+class _WorkloadModel(object):
+    """The state of the entries generated by dbgen_workload(), kept so that
+    the modifications and the searches only use existing entries
+    """
+
+    def __init__(self, profile, givennames, familynames):
+        self.profile = profile
+        self.rng = random.Random(profile['seed'])
+        self.suffix = profile['suffix']
+        self.givennames = givennames
+        self.familynames = familynames
+        self.num_users = int(profile['users']['number'])
+        self.user_parent = profile['users']['parent'] or f"ou=people,{self.suffix}"
+        groups = profile['groups']
+        self.num_groups = int(groups['number'])
+        self.group_parent = groups['parent'] or f"ou=groups,{self.suffix}"
+        self.member_attr = groups['membershipAttr']
+        self.attributes = sorted(profile['attributes'].items())
+        # The number of users having each value of the attributes
+        self.attr_counts = {attr: {} for attr, spec in self.attributes}
+        # The live users: a list for random picks and their position in it
+        self.live = list(range(1, self.num_users + 1))
+        self.live_pos = {idx: idx - 1 for idx in self.live}
+        # The uid of the users that were renamed, and the next user to add
+        self.renamed = {}
+        self.next_user = self.num_users + 1
+        self.next_rename = 1
+        # The user members of each group, as a list and a set
+        self.members = []
+        self.member_sets = []
+        # The group members of each group
+        self.group_members = []
+
+    def user_uid(self, idx):
+        return self.renamed.get(idx, "user" + get_index(idx, self.num_users))
+
+    def user_dn(self, idx):
+        return f"uid={self.user_uid(idx)},{self.user_parent}"
+
+    def group_dn(self, gidx):
+        return f"cn=group{get_index(gidx + 1, self.num_groups)},{self.group_parent}"
+
+    def attr_value(self, attr, spec):
+        return f"{attr}-{_zipf_index(self.rng, int(spec['cardinality']), float(spec['exponent'])) + 1}"
+
+    def user_entry(self, idx, changetype=""):
+        uid = self.user_uid(idx)
+        lines = [DBGEN_WORKLOAD_USER_TEMPLATE.format(
+            DN=f"uid={uid},{self.user_parent}",
+            CHANGETYPE=changetype,
+            UID=uid,
+            FIRST=self.rng.choice(self.givennames),
+            LAST=self.rng.choice(self.familynames),
+        )]
+        for attr, spec in self.attributes:
+            val = self.attr_value(attr, spec)
+            counts = self.attr_counts[attr]
+            counts[val] = counts.get(val, 0) + 1
+            lines.append(f"{attr}: {val}\n")
+        lines.append("\n")
+        return "".join(lines)
+
+    def group_sizes(self, pool_size):
+        # The large groups first, then sizes decreasing with the group rank
+        groups = self.profile['groups']
+        size = groups['size']
+        num_large = min(int(groups['large']['number']), self.num_groups)
+        sizes = [int(groups['large']['size'])] * num_large
+        for rank in range(1, self.num_groups - num_large + 1):
+            sizes.append(max(int(size['min']), int(int(size['max']) / rank ** float(size['exponent']))))
+        return [min(s, pool_size) for s in sizes]
+
+    def build_groups(self):
+        # Pick the user members from the pool of users belonging to groups
+        pool_size = int(self.num_users * float(self.profile['groups']['memberDensity']))
+        pool = self.rng.sample(range(1, self.num_users + 1), pool_size)
+        for size in self.group_sizes(pool_size):
+            members = self.rng.sample(pool, size)
+            self.members.append(members)
+            self.member_sets.append(set(members))
+            self.group_members.append([])
+
+        # Chain some of the groups: each one is a member of the previous one
+        nesting = self.profile['groups']['nesting']
+        depth = int(nesting['depth'])
+        num_nested = int(self.num_groups * float(nesting['fraction']))
+        if depth > 0 and num_nested > 1:
+            nested = self.rng.sample(range(self.num_groups), num_nested)
+            for start in range(0, num_nested, depth + 1):
+                chain = nested[start:start + depth + 1]
+                for parent, child in zip(chain, chain[1:]):
+                    self.group_members[parent].append(child)
+        return num_nested
+
+    def write_groups(self, LDIF):
+        oc = 'groupOfNames' if self.member_attr.lower() == 'member' else 'groupOfUniqueNames'
+        for gidx in range(self.num_groups):
+            buf = [f"dn: {self.group_dn(gidx)}\n",
+                   "objectClass: top\n",
+                   f"objectClass: {oc}\n",
+                   f"cn: group{get_index(gidx + 1, self.num_groups)}\n"]
+            for child in self.group_members[gidx]:
+                buf.append(f"{self.member_attr}: {self.group_dn(child)}\n")
+            for idx in self.members[gidx]:
+                buf.append(f"{self.member_attr}: {self.user_dn(idx)}\n")
+                if len(buf) >= DBGEN_WRITE_BATCH:
+                    LDIF.write("".join(buf))
+                    buf = []
+            buf.append("\n")
+            LDIF.write("".join(buf))
+
+    def pick_group(self, exponent):
+        return _zipf_index(self.rng, self.num_groups, exponent)
+
+    def pick_user(self, exponent):
+        return self.live[_zipf_index(self.rng, len(self.live), exponent)]
+
+    def remove_live(self, idx):
+        pos = self.live_pos.pop(idx)
+        last = self.live.pop()
+        if last != idx:
+            self.live[pos] = last
+            self.live_pos[last] = pos
+
+    def mod_op(self, op, exponent):
+        # Return the LDIF of an operation, or None if it can't be done with
+        # the current entries
+        if op == 'add':
+            idx = self.next_user
+            self.next_user += 1
+            self.live_pos[idx] = len(self.live)
+            self.live.append(idx)
+            return self.user_entry(idx, changetype="\nchangetype: add")
+        if not self.live:
+            return None
+        if op == 'modify':
+            idx = self.pick_user(exponent)
+            if self.attributes:
+                attr, spec = self.rng.choice(self.attributes)
+                val = self.attr_value(attr, spec)
+            else:
+                attr = 'description'
+                val = ''.join(self.rng.choice(RANDOM_CHARS) for i in range(self.rng.randint(10, 30)))
+            return f"dn: {self.user_dn(idx)}\nchangetype: modify\nreplace: {attr}\n{attr}: {val}\n\n"
+        if op == 'delete':
+            idx = self.pick_user(exponent)
+            self.remove_live(idx)
+            return f"dn: {self.user_dn(idx)}\nchangetype: delete\n\n"
+        if op == 'modrdn':
+            idx = self.pick_user(exponent)
+            dn = self.user_dn(idx)
+            self.renamed[idx] = f"renamed{self.next_rename}-{self.user_uid(idx)}"
+            self.next_rename += 1
+            lines = [f"dn: {dn}\nchangetype: modrdn\nnewrdn: uid={self.user_uid(idx)}\ndeleteoldrdn: 1\n\n"]
+            # Rename the user in its groups too, the load doesn't rely on
+            # the referential integrity plugin
+            for gidx in range(self.num_groups):
+                if idx in self.member_sets[gidx]:
+                    lines.append(f"dn: {self.group_dn(gidx)}\nchangetype: modify\n"
+                                 f"delete: {self.member_attr}\n{self.member_attr}: {dn}\n-\n"
+                                 f"add: {self.member_attr}\n{self.member_attr}: {self.user_dn(idx)}\n\n")
+            return "".join(lines)
+        if self.num_groups == 0:
+            return None
+        gidx = self.pick_group(exponent)
+        if op == 'addMember':
+            for attempt in range(10):
+                idx = self.rng.choice(self.live)
+                if idx not in self.member_sets[gidx]:
+                    break
+            else:
+                return None
+            self.members[gidx].append(idx)
+            self.member_sets[gidx].add(idx)
+            change = 'add'
+        else:
+            # The deleted users are skipped, their values are left in the groups
+            members = self.members[gidx]
+            while members:
+                pos = self.rng.randrange(len(members))
+                idx = members[pos]
+                members[pos] = members[-1]
+                members.pop()
+                self.member_sets[gidx].discard(idx)
+                if idx in self.live_pos:
+                    break
+            else:
+                return None
+            change = 'delete'
+        return (f"dn: {self.group_dn(gidx)}\nchangetype: modify\n{change}: {self.member_attr}\n"
+                f"{self.member_attr}: {self.user_dn(idx)}\n\n")
+
+    def search_filter(self, kind, exponent):
+        if kind == 'uid':
+            return f"(uid={self.user_uid(self.pick_user(exponent))})"
+        if kind == 'attribute' and self.attributes:
+            # A value given to some users, as often as it was given
+            attr, spec = self.rng.choice(self.attributes)
+            counts = self.attr_counts[attr]
+            if counts:
+                val = self.rng.choices(list(counts), weights=list(counts.values()))[0]
+                return f"({attr}={val})"
+        if kind == 'memberOf' and self.num_groups:
+            return f"(memberOf={self.group_dn(self.pick_group(exponent))})"
+        if kind == 'member' and self.num_groups:
+            members = self.members[self.pick_group(exponent)]
+            if members:
+                return f"({self.member_attr}={self.user_dn(self.rng.choice(members))})"
+        return None
+
+
+def _dbgen_weighted(rng, mix, number, make):
+    # Yield number results of make(choice), the choices being picked with the
+    # weights of mix.  A choice is dropped once it can't be made anymore, i.e.
+    # when no group has members left to delete.
+    choices = sorted(mix.items())
+    failures = {}
+    while choices and number > 0:
+        choice = rng.choices([c for c, w in choices], weights=[w for c, w in choices])[0]
+        result = make(choice)
+        if result is None:
+            failures[choice] = failures.get(choice, 0) + 1
+            if failures[choice] >= DBGEN_WORKLOAD_MAX_FAILURES:
+                choices = [(c, w) for c, w in choices if c != choice]
+            continue
+        failures[choice] = 0
+        number -= 1
+        yield result
+
+
+def dbgen_workload(instance, ldif_file, profile=None, mod_ldif_file=None, filter_file=None):
+    """
+    Generate a LDIF modelling a production workload: group sizes following a
+    Zipf distribution, a few very large groups, nested groups and attribute
+    values with a skewed cardinality.  A modify load LDIF consumable by
+    ldapmodify and a corpus of search filters matching the generated
+    entries are written too.
+
+        profile = {
+            "seed": INT,  --> the same seed and profile give the same files
+            "suffix": DN,
+            "users": {"number": ###, "parent": DN},
+            "attributes": {
+                ATTR: {"cardinality": ###, "exponent": FLOAT}, ...  --> ATTR gets one of cardinality values
+            },
+            "groups": {
+                "number": ###,
+                "parent": DN,
+                "membershipAttr": ATTR,  --> member (groupOfNames) or uniqueMember (groupOfUniqueNames)
+                "memberDensity": FLOAT,  --> the fraction of the users that are member of groups
+                "size": {"min": ###, "max": ###, "exponent": FLOAT},  --> max/rank^exponent members
+                "large": {"number": ###, "size": ###},
+                "nesting": {"depth": ###, "fraction": FLOAT},  --> fraction of the groups in nested chains
+            },
+            "modLoad": {"number": ###, "exponent": FLOAT, "mix": {OPERATION: WEIGHT, ...}},
+            "searches": {"number": ###, "exponent": FLOAT, "mix": {FILTER_TYPE: WEIGHT, ...}},
+        }
+
+    The missing values are taken from DBGEN_WORKLOAD_PROFILE.  The operations
+    are "modify", "add", "delete", "modrdn", "addMember" and "deleteMember",
+    the filter types "uid", "attribute", "memberOf" and "member".  The modLoad
+    and searches exponents skew the entries that are modified or searched.
+    A "modrdn" also updates the groups of the renamed user, so the modify load
+    is meant for a server without the referential integrity plugin: the
+    values of the deleted users are left in their groups.
+
+    :param ldif_file: The LDIF of the entries
+    :type ldif_file: str
+    :param profile: The workload profile
+    :type profile: dict
+    :param mod_ldif_file: The LDIF of the modify load, applied after the import of ldif_file
+    :type mod_ldif_file: str
+    :param filter_file: The search filter corpus, one filter per line
+    :type filter_file: str
+    :returns: A dict of the number of generated users, groups, memberships,
+              nested groups, modify operations and search filters
+    """
+    profile = dbgen_workload_profile(profile)
+    if profile['groups']['membershipAttr'].lower() not in ('member', 'uniquemember'):
+        raise ValueError(f"Unsupported groups membershipAttr {profile['groups']['membershipAttr']}, "
+                         "supported values are: member, uniqueMember")
+    for name, valid in (('modLoad', DBGEN_WORKLOAD_MOD_OPS), ('searches', DBGEN_WORKLOAD_FILTERS)):
+        unknown = set(profile[name]['mix']) - set(valid)
+        if unknown:
+            raise ValueError(f"Unknown {name} mix value(s) {', '.join(sorted(unknown))}, "
+                             f"supported values are: {', '.join(valid)}")
+    givennames, familynames = _dbgen_names(instance)
+    model = _WorkloadModel(profile, givennames, familynames)
+    summary = {"users": model.num_users, "groups": model.num_groups}
+
+    with open(ldif_file, 'w') as LDIF:
+        LDIF.write(get_node(model.suffix))
+        for parent in (model.user_parent, model.group_parent):
+            if parent.lower() != model.suffix.lower():
+                LDIF.write(get_node(parent))
+
+        buf = []
+        for idx in range(1, model.num_users + 1):
+            buf.append(model.user_entry(idx))
+            if len(buf) >= DBGEN_WRITE_BATCH:
+                LDIF.write("".join(buf))
+                buf = []
+        LDIF.write("".join(buf))
+
+        summary["nestedGroups"] = model.build_groups()
+        summary["memberships"] = sum(len(m) for m in model.members)
+        model.write_groups(LDIF)
+    finalize_ldif_file(instance, ldif_file)
+
+    # The searches match the imported entries, build them first.  Each phase
+    # has its own seed so the files don't depend on the other ones.
+    seed = profile['seed']
+    searches = profile['searches']
+    summary["filters"] = 0
+    if filter_file is not None:
+        model.rng = random.Random(None if seed is None else f"{seed}:searches")
+        with open(filter_file, 'w') as f:
+            for filt in _dbgen_weighted(model.rng, searches['mix'], int(searches['number']),
+                                        lambda kind: model.search_filter(kind, float(searches['exponent']))):
+                f.write(f"{filt}\n")
+                summary["filters"] += 1
+
+    mod_load = profile['modLoad']
+    summary["modOps"] = 0
+    if mod_ldif_file is not None:
+        model.rng = random.Random(None if seed is None else f"{seed}:modload")
+        with open(mod_ldif_file, 'w') as LDIF:
+            for ldif in _dbgen_weighted(model.rng, mod_load['mix'], int(mod_load['number']),
+                                        lambda op: model.mod_op(op, float(mod_load['exponent']))):
+                LDIF.write(ldif)
+                summary["modOps"] += 1
+
+    return summary
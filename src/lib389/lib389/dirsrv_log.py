@@ -9,12 +9,22 @@
 """Helpers for managing the directory server internal logs.
 """
 
+import bisect
 import copy
+import json
+import os
 import re
 import gzip
-from dateutil.parser import parse as dt_parse
+import heapq
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter, deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from operator import itemgetter
 from glob import glob
-from lib389.utils import ensure_bytes
+from lib389.utils import ensure_bytes, Histogram
 from lib389._mapped_object_lint import DSLint
 from lib389.lint import (
     DSLOGNOTES0001,  # Unindexed search
@@ -33,19 +43,512 @@ MONTH_LOOKUP = {
     'Jun': 6,
     'Jul': 7,
     'Aug': 8,
-    'Oct': 9,
-    'Sep': 10,
+    'Sep': 9,
+    'Oct': 10,
     'Nov': 11,
     'Dec': 12,
 }
 
 
+@lru_cache(maxsize=1024)
+def _log_timestamp_second(prefix, tz):
+    """Decode the per-second part of a log timestamp. Thousands of lines
+    share the same second, so the results are memoized.
+
+    :param prefix: The 'dd/Mon/yyyy:hh:mm:ss' part of the timestamp
+    :type prefix: str
+    :param tz: The '+hhmm' timezone of the timestamp
+    :type tz: str
+    :returns: A "datetime" object
+    """
+    offset = int(tz[1:3]) * 3600 + int(tz[3:5]) * 60
+    if tz[0] == '-':
+        offset = -offset
+    return datetime(int(prefix[7:11]), MONTH_LOOKUP[prefix[3:6]], int(prefix[0:2]),
+                    int(prefix[12:14]), int(prefix[15:17]), int(prefix[18:20]),
+                    tzinfo=timezone(timedelta(seconds=offset)))
+
+
+def parse_log_timestamp(ts):
+    """Decode a Directory Server log timestamp. This is a fixed format
+    decoder, much faster than a generic date parser:
+
+        [27/Apr/2016:12:49:49.726093186 +1000]
+
+    The brackets are optional, as is the sub-second part.
+
+    :param ts: The timestamp string from a log
+    :type ts: str
+    :returns: A "datetime" object
+    """
+    try:
+        start = 1 if ts[0] == '[' else 0
+        end = ts.index(' ', start)
+        prefix = ts[start:start + 20]
+        dt = _log_timestamp_second(prefix, ts[end + 1:end + 6])
+        if ts[start + 20] == '.':
+            # Nanoseconds, datetime only handles microseconds
+            dt = dt.replace(microsecond=int(ts[start + 21:end][:6].ljust(6, '0')))
+    except (IndexError, KeyError, ValueError):
+        raise ValueError("Invalid log timestamp: %s" % ts)
+    return dt
+
+
+# Sorts before any log timestamp
+_LOG_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+# Compact record describing a single operation of the access log, as yielded
+# by DirsrvAccessLog.iter_operations(). The request (SRCH, MOD, BIND, ...) is
+# correlated with its RESULT line so that one record is produced per operation.
+AccessLogOperation = namedtuple('AccessLogOperation', [
+    'timestamp', 'conn', 'op', 'action', 'dn', 'base', 'scope', 'filter',
+    'err', 'nentries', 'etime', 'notes', 'client'])
+
+# Operations that never get a RESULT line
+NO_RESULT_ACTIONS = ('UNBIND', 'ABANDON')
+
+# Fast line classifiers for the streaming parser
+_ACCESS_OP_LINE = re.compile(r'^(\[[^\]]+\]) conn=(\d+) op=(-?\d+) ([A-Z]+)\s?(.*)$')
+_ACCESS_CONNECT_LINE = re.compile(r'^(\[[^\]]+\]) conn=(\d+) fd=\d+ slot=\d+ (?:\w+ )?connection from (\S+)')
+_ACCESS_CLOSE_LINE = re.compile(r'^(\[[^\]]+\]) conn=(\d+) op=-?\d+ fd=\d+ closed')
+_INDEX_CONN_OP = re.compile(rb'^\[[^\]]+\] conn=(\d+) (?:op=-?\d+ ([A-Z]+))?')
+_INDEX_ERR = re.compile(rb' err=(-?\d+)')
+_ACCESS_KEY_VALUE = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S+)')
+
+
+def _parse_access_key_values(rem):
+    """Break the remainder of an access log line into its key=value pairs
+
+    :param rem: The text following the operation name
+    :type rem: str
+    :returns: A dictionary of the values, with the quotes removed
+    """
+    values = {}
+    for (key, value) in _ACCESS_KEY_VALUE.findall(rem):
+        if value.startswith('"'):
+            value = value[1:-1]
+        values[key] = value
+    return values
+
+
+def iter_access_operations(lines, max_pending=100000):
+    """Stream access log lines as one compact record per operation.
+    See DirsrvAccessLog.iter_operations().
+
+    :param lines: An iterable of access log lines
+    :type lines: iterable of str
+    :param max_pending: The maximum number of requests waiting for a result
+    :type max_pending: int
+    :returns: A generator of AccessLogOperation
+    """
+    # conn -> {op -> (timestamp, action, values)}, in connection order
+    pending = {}
+    npending = 0
+    for line in lines:
+        mres = _ACCESS_OP_LINE.match(line)
+        if mres is None:
+            mres = _ACCESS_CONNECT_LINE.match(line)
+            if mres is not None:
+                (timestamp, conn, client) = mres.groups()
+                yield AccessLogOperation(timestamp, conn, None, 'CONNECT', None, None, None,
+                                         None, None, None, None, None, client)
+                continue
+            mres = _ACCESS_CLOSE_LINE.match(line)
+            if mres is not None:
+                (timestamp, conn) = mres.groups()
+                npending -= len(pending.pop(conn, ()))
+                yield AccessLogOperation(timestamp, conn, None, 'DISCONNECT', None, None, None,
+                                         None, None, None, None, None, None)
+            continue
+
+        (timestamp, conn, op, action, rem) = mres.groups()
+        if action == 'RESULT':
+            ops = pending.get(conn)
+            request = ops.pop(op, None) if ops else None
+            if request is None:
+                # The request was in an older log, or was an internal op
+                (action, req) = ('UNKNOWN', {})
+            else:
+                npending -= 1
+                (_, action, req) = request
+            res = _parse_access_key_values(rem)
+            try:
+                etime = float(res.get('etime', 0))
+            except ValueError:
+                etime = None
+            yield AccessLogOperation(timestamp, conn, op, action, req.get('dn'),
+                                     req.get('base'), req.get('scope'), req.get('filter'),
+                                     res.get('err'), res.get('nentries'), etime,
+                                     res.get('notes'), None)
+        elif action in NO_RESULT_ACTIONS:
+            yield AccessLogOperation(timestamp, conn, op, action, None, None, None,
+                                     None, None, None, None, None, None)
+        else:
+            pending.setdefault(conn, {})[op] = (timestamp, action, _parse_access_key_values(rem))
+            npending += 1
+            while npending > max_pending and pending:
+                oldest = next(iter(pending))
+                npending -= len(pending.pop(oldest))
+
+
+def _open_log_file(path):
+    """Open a log file for reading as text, transparently handling
+    gzip compressed rotated logs.
+
+    :param path: The path of the log to open
+    :type path: str
+    :returns: A file object
+    """
+    if ensure_bytes(path).endswith(b'.gz'):
+        return gzip.open(path, 'rt', errors='replace')
+    return open(path, 'r', errors='replace')
+
+
+def _log_time_key(timestamp):
+    """Sort key of a log timestamp, the raw strings don't sort across days"""
+    try:
+        return parse_log_timestamp(timestamp)
+    except ValueError:
+        return _LOG_EPOCH
+
+
+def _log_line_key(line):
+    """Sort key to merge log lines in timestamp order"""
+    try:
+        return parse_log_timestamp(line[:line.index(']') + 1])
+    except ValueError:
+        return _LOG_EPOCH
+
+
+def _scan_log_match(path, pattern, spooldir):
+    """Process pool worker: write the lines of one log file matching pattern
+    to a spool file in spooldir, so that neither the worker nor the parent
+    holds the matches in memory.
+    Each record is the JSON [key, line], where key is the epoch time of the
+    line. Lines without a timestamp (continuations) take the time of the
+    previous timestamped line, or of the first one for the lines leading the
+    file, so they stay in place when merged.
+
+    :param path: The log file to scan
+    :type path: str
+    :param pattern: A regex pattern
+    :type pattern: str
+    :param spooldir: The directory of the spool file
+    :type spooldir: str
+    :returns: The path of the spool file
+    """
+    prog = re.compile(pattern)
+    key = float('-inf')
+    with _open_log_file(path) as lf:
+        for line in lf:
+            if line.startswith('['):
+                dt = _log_line_key(line)
+                if dt is not _LOG_EPOCH:
+                    key = dt.timestamp()
+                    break
+    (fd, spool) = tempfile.mkstemp(dir=spooldir)
+    with open(fd, 'w') as out, _open_log_file(path) as lf:
+        for line in lf:
+            if line.startswith('['):
+                dt = _log_line_key(line)
+                if dt is not _LOG_EPOCH:
+                    key = dt.timestamp()
+            if prog.match(line):
+                out.write(json.dumps([key, line]))
+                out.write('\n')
+    return spool
+
+
+def _read_spool(path):
+    """Generator of the [key, line] records of a _scan_log_match spool file"""
+    with open(path, 'r') as spool:
+        for record in spool:
+            yield json.loads(record)
+
+
+def _scan_log_analyse(path, max_pending, kwargs):
+    """Process pool worker: return the AccessLogAnalyser of one log file"""
+    with _open_log_file(path) as lf:
+        return AccessLogAnalyser(**kwargs).feed(iter_access_operations(lf, max_pending))
+
+
+def _scan_logs(paths, worker, args, parallel):
+    """Run worker(path, *args) for every path, in a process pool when
+    parallel is set, and yield the results in the order of paths.
+
+    :param paths: The log files, oldest first
+    :type paths: list of str
+    :param worker: A module level function (it must be picklable)
+    :type worker: function
+    :param args: Extra arguments for the worker
+    :type args: tuple
+    :param parallel: True to use one process per CPU, or a number of processes
+    :type parallel: bool or int
+    :returns: A generator of the worker results
+    """
+    if not parallel or len(paths) < 2:
+        for path in paths:
+            yield worker(path, *args)
+        return
+    workers = os.cpu_count() if parallel is True else int(parallel)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        # Keep a bounded window of files in flight, so that the results
+        # waiting to be consumed don't pile up.
+        futures = deque()
+        for path in paths:
+            if len(futures) >= 2 * workers:
+                yield futures.popleft().result()
+            futures.append(executor.submit(worker, path, *args))
+        while futures:
+            yield futures.popleft().result()
+
+
+class DirsrvLogIndex(object):
+    """Sidecar index of a rotated log file.
+
+    Rotated logs never change, so the index is built once, saved next to
+    the log as a hidden ".<log name>.idx" JSON file, and reused. It holds the
+    time range of the log, the byte offset of the first line of every
+    minute, the connection ids seen in each block of the log (as a range and
+    a bloom filter), and the number of operations per type and result code.
+    Time range and connection queries then only read the relevant parts of
+    the log.
+
+    For gzip compressed logs the offsets are in the uncompressed stream, so
+    seeking still decompresses the skipped data but does not parse it.
+
+    :param path: The path of the rotated log
+    :type path: str
+    :param block_size: The approximate size in bytes of the blocks used for
+                       connection id lookups
+    :type block_size: int
+    """
+
+    VERSION = 1
+    BLOOM_BITS = 8192
+    BLOOM_HASHES = 3
+
+    def __init__(self, path, block_size=4 * 1024 * 1024):
+        self.path = path
+        self.index_path = os.path.join(os.path.dirname(path), '.%s.idx' % os.path.basename(path))
+        self.block_size = block_size
+        self.data = None
+
+    def _bloom_bits(self, conn):
+        conn = int(conn)
+        return [((conn + i * 0x9E3779B9) * 2654435761 & 0xFFFFFFFF) % self.BLOOM_BITS
+                for i in range(self.BLOOM_HASHES)]
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return [st.st_size, int(st.st_mtime)]
+
+    def _open(self):
+        if ensure_bytes(self.path).endswith(b'.gz'):
+            return gzip.open(self.path, 'rb')
+        return open(self.path, 'rb')
+
+    def load(self):
+        """Load the index, building and saving it when it is missing or
+        stale
+
+        :returns: self
+        """
+        try:
+            stamp = self._file_stamp()
+        except FileNotFoundError:
+            # The log was removed or compressed, its index is useless
+            self.remove()
+            raise
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION and data.get('stamp') == stamp:
+                self.data = data
+                return self
+        except (OSError, ValueError):
+            pass
+        self.build()
+        self.save()
+        return self
+
+    def build(self):
+        """Scan the log and build the index in memory
+
+        :returns: self
+        """
+        checkpoints = []
+        blocks = []
+        operations = Counter()
+        results = Counter()
+        (first, last) = (None, None)
+        (block_start, conns, bloom) = (0, None, None)
+        minute = None
+        offset = 0
+        with self._open() as lf:
+            for line in lf:
+                if line.startswith(b'['):
+                    # "[dd/Mon/yyyy:hh:mm" only changes once a minute
+                    if line[:18] != minute:
+                        minute = line[:18]
+                        try:
+                            ts = parse_log_timestamp(line[:line.index(b']') + 1].decode())
+                        except ValueError:
+                            ts = None
+                        if ts is not None:
+                            epoch = int(ts.timestamp())
+                            checkpoints.append([epoch - epoch % 60, offset])
+                            if first is None:
+                                first = epoch
+                            last = epoch - epoch % 60 + 59
+                    mres = _INDEX_CONN_OP.match(line)
+                    if mres is not None:
+                        conn = int(mres.group(1))
+                        if conns is None:
+                            (conns, bloom) = ([conn, conn], bytearray(self.BLOOM_BITS // 8))
+                        else:
+                            conns[0] = min(conns[0], conn)
+                            conns[1] = max(conns[1], conn)
+                        for bit in self._bloom_bits(conn):
+                            bloom[bit // 8] |= 1 << (bit % 8)
+                        action = mres.group(2)
+                        if action == b'RESULT':
+                            err = _INDEX_ERR.search(line, mres.end())
+                            if err is not None:
+                                results[err.group(1).decode()] += 1
+                        elif action:
+                            operations[action.decode()] += 1
+                offset += len(line)
+                if offset - block_start >= self.block_size:
+                    if conns is not None:
+                        blocks.append([block_start, offset, conns[0], conns[1], bloom.hex()])
+                    (block_start, conns, bloom) = (offset, None, None)
+        if conns is not None:
+            blocks.append([block_start, offset, conns[0], conns[1], bloom.hex()])
+        self.data = {
+            'version': self.VERSION,
+            'stamp': self._file_stamp(),
+            'start': first,
+            'end': last,
+            'size': offset,
+            'checkpoints': checkpoints,
+            'blocks': blocks,
+            'operations': dict(operations),
+            'results': dict(results),
+        }
+        return self
+
+    def save(self):
+        """Save the index next to the log. The index is only kept in
+        memory if the log directory is not writable.
+        """
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f)
+            os.rename(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+    def remove(self):
+        """Remove the index file of the log"""
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+
+    def _time_range(self, start, end):
+        """Return the (first, last) byte offsets to read for a time range"""
+        checkpoints = self.data['checkpoints']
+        first = 0
+        last = self.data['size']
+        if start is not None:
+            i = bisect.bisect_right([c[0] for c in checkpoints], start) - 1
+            if i > 0:
+                first = checkpoints[i][1]
+        if end is not None:
+            i = bisect.bisect_right([c[0] for c in checkpoints], end)
+            if i < len(checkpoints):
+                last = checkpoints[i][1]
+        return (first, last)
+
+    def may_contain(self, start=None, end=None, conn=None):
+        """Check from the index alone if the log may have lines matching
+        the query
+
+        :param start: Epoch time of the start of the range
+        :type start: float
+        :param end: Epoch time of the end of the range
+        :type end: float
+        :param conn: A connection id
+        :type conn: int
+        :returns: bool
+        """
+        if self.data['start'] is None:
+            return False
+        if start is not None and self.data['end'] < start:
+            return False
+        if end is not None and self.data['start'] > end:
+            return False
+        if conn is not None:
+            return any(self._block_has_conn(block, conn) for block in self.data['blocks'])
+        return True
+
+    def _block_has_conn(self, block, conn):
+        conn = int(conn)
+        if conn < block[2] or conn > block[3]:
+            return False
+        bloom = bytes.fromhex(block[4])
+        return all(bloom[bit // 8] & (1 << (bit % 8)) for bit in self._bloom_bits(conn))
+
+    def iter_lines(self, start=None, end=None, conn=None):
+        """Generator of the lines of the log matching the query, reading
+        only the parts of the log the index points to
+
+        :param start: Epoch time of the start of the range
+        :type start: float
+        :param end: Epoch time of the end of the range
+        :type end: float
+        :param conn: Only return the lines of this connection id
+        :type conn: int
+        :returns: A generator of str
+        """
+        if not self.may_contain(start, end, conn):
+            return
+        (first, last) = self._time_range(start, end)
+        if conn is None:
+            ranges = [(first, last)]
+        else:
+            ranges = [(max(b[0], first), min(b[1], last)) for b in self.data['blocks']
+                      if b[1] > first and b[0] < last and self._block_has_conn(b, conn)]
+            conn_tag = (' conn=%d ' % int(conn)).encode()
+        with self._open() as lf:
+            for (offset, stop) in ranges:
+                lf.seek(offset)
+                while offset < stop:
+                    line = lf.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    if conn is not None and conn_tag not in line:
+                        continue
+                    text = line.decode(errors='replace')
+                    if start is not None or end is not None:
+                        ts = _log_line_key(text).timestamp() if text.startswith('[') else None
+                        if ts is not None and ((start is not None and ts < start) or
+                                               (end is not None and ts > end)):
+                            continue
+                    yield text
+
+
 class DirsrvLog(DSLint):
     """Class of functions to working with the various DIrectory Server logs
     """
     def __init__(self, dirsrv):
         """Initial class
-        @param dirsrv - DirSrv object
+
+        :param dirsrv: DirSrv object
+        :type dirsrv: lib389.DirSrv
         """
         self.dirsrv = dirsrv
         self.log = self.dirsrv.log
@@ -57,33 +560,109 @@ class DirsrvLog(DSLint):
         raise Exception("Log type not defined.")
 
     def _get_all_log_paths(self):
-        """Return all the log paths"""
-        return glob("%s.*-*" % self._get_log_path()) + [self._get_log_path()]
+        """Return all the log paths, oldest first"""
+        # Rotated logs carry a YYYYMMDD-HHMMSS suffix, so sorting them by name
+        # also sorts them by time.
+        return sorted(glob("%s.*-*" % self._get_log_path())) + [self._get_log_path()]
+
+    def iter_lines_archive(self, start=None, end=None, conn=None):
+        """Generator of all the lines in all logs, including rotated logs
+        and compressed logs. (gzip)
+        Lines are read lazily, oldest log first, so memory usage does not
+        depend on the size of the logs.
+
+        When a time range or a connection is given, the rotated logs are
+        read through their DirsrvLogIndex, which is built on first use.
+
+        :param start: Only return lines logged at or after this time
+                      (a datetime or epoch seconds)
+        :type start: datetime or float
+        :param end: Only return lines logged at or before this time
+                    (a datetime or epoch seconds)
+        :type end: datetime or float
+        :param conn: Only return lines of this connection id
+        :type conn: int
+        :returns: A generator of lines
+        """
+        if start is None and end is None and conn is None:
+            for log in self._get_all_log_paths():
+                with _open_log_file(log) as lf:
+                    for line in lf:
+                        yield line
+            return
+
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        if isinstance(end, datetime):
+            end = end.timestamp()
+        paths = self._prune_log_indexes()
+        for log in paths[:-1]:
+            for line in self.get_log_index(log).iter_lines(start, end, conn):
+                yield line
+        # The current log changes all the time, so it is not indexed
+        conn_tag = None if conn is None else ' conn=%d ' % int(conn)
+        with _open_log_file(paths[-1]) as lf:
+            for line in lf:
+                if conn_tag is not None and conn_tag not in line:
+                    continue
+                if (start is not None or end is not None) and line.startswith('['):
+                    ts = _log_line_key(line).timestamp()
+                    if (start is not None and ts < start) or (end is not None and ts > end):
+                        continue
+                yield line
+
+    def _prune_log_indexes(self):
+        """Remove the indexes left behind by the logs that are no longer
+        rotated logs: expired and deleted, compressed, or the current log
+        (which is never indexed)
+
+        :returns: All the log paths, oldest first
+        """
+        paths = self._get_all_log_paths()
+        rotated = set(paths[:-1])
+        (logdir, name) = os.path.split(self._get_log_path())
+        for index_path in glob(os.path.join(logdir, '.%s.idx' % name)) + \
+                glob(os.path.join(logdir, '.%s.*.idx' % name)):
+            if os.path.join(logdir, os.path.basename(index_path)[1:-4]) not in rotated:
+                try:
+                    os.remove(index_path)
+                except FileNotFoundError:
+                    pass
+        return paths
+
+    def get_log_index(self, path):
+        """Return the index of a rotated log, building it if needed
+
+        :param path: The path of a rotated log
+        :type path: str
+        :returns: A DirsrvLogIndex
+        """
+        return DirsrvLogIndex(path).load()
+
+    def index_archive(self):
+        """Build the missing or stale indexes of all the rotated logs, and
+        remove the indexes of the logs that are gone
+
+        :returns: A list of DirsrvLogIndex
+        """
+        return [self.get_log_index(log) for log in self._prune_log_indexes()[:-1]]
 
     def readlines_archive(self):
         """
         Returns an array of all the lines in all logs, included rotated logs
         and compressed logs. (gzip)
-        Will likely be very slow. Try using match instead.
+        Will likely be very slow. Try using match or iter_lines_archive
+        instead.
 
-        @return - an array of all the lines in all logs
+        :returns: An array of all the lines in all logs
         """
-        lines = []
-        for log in self._get_all_log_paths():
-            # Open the log
-            if log.endswith(ensure_bytes('.gz')):
-                with gzip.open(log, 'r') as lf:
-                    lines += lf.readlines()
-            else:
-                with open(log, 'r') as lf:
-                    lines += lf.readlines()
-        return lines
+        return list(self.iter_lines_archive())
 
     def readlines(self):
         """Returns an array of all the lines in the log.
         Will likely be very slow. Try using match instead.
 
-        @return - an array of all the lines in the log.
+        :returns: An array of all the lines in the log.
         """
         lines = []
         self.lpath = self._get_log_path()
@@ -93,32 +672,52 @@ class DirsrvLog(DSLint):
                 lines = lf.readlines()
         return lines
 
-    def match_archive(self, pattern):
+    def iter_match_archive(self, pattern, parallel=None):
+        """Generator of the lines of all the log files, including "zipped"
+        logs, matching the pattern
+
+        :param pattern: A regex pattern
+        :type pattern: str
+        :param parallel: True to scan the files in one process per CPU, or
+                         a number of processes. The matches are spooled to
+                         temporary files and merged in timestamp order
+        :type parallel: bool or int
+        :returns: A generator of the matching lines
+        """
+        if not parallel:
+            prog = re.compile(pattern)
+            for line in self.iter_lines_archive():
+                if prog.match(line):
+                    yield line
+            return
+        spooldir = tempfile.mkdtemp(prefix='lib389-match-')
+        try:
+            spools = list(_scan_logs(self._get_all_log_paths(), _scan_log_match,
+                                     (pattern, spooldir), parallel))
+            for (_, line) in heapq.merge(*map(_read_spool, spools), key=itemgetter(0)):
+                yield line
+        finally:
+            shutil.rmtree(spooldir, ignore_errors=True)
+
+    def match_archive(self, pattern, parallel=None):
         """Search all the log files, including "zipped" logs
-        @param pattern - a regex pattern
-        @return - results of the pattern matching
+
+        :param pattern: A regex pattern
+        :type pattern: str
+        :param parallel: True to scan the files in one process per CPU, or
+                         a number of processes. The results are merged in
+                         timestamp order
+        :type parallel: bool or int
+        :returns: Results of the pattern matching
         """
-        results = []
-        prog = re.compile(pattern)
-        for log in self._get_all_log_paths():
-            if log.endswith(ensure_bytes('.gz')):
-                with gzip.open(log, 'r') as lf:
-                    for line in lf:
-                        mres = prog.match(line)
-                        if mres:
-                            results.append(line)
-            else:
-                with open(log, 'r') as lf:
-                    for line in lf:
-                        mres = prog.match(line)
-                        if mres:
-                            results.append(line)
-        return results
+        return list(self.iter_match_archive(pattern, parallel))
 
     def match(self, pattern):
         """Search the current log file for the pattern
-        @param pattern - a regex pattern
-        @return - results of the pattern matching
+
+        :param pattern: A regex pattern
+        :type pattern: str
+        :returns: Results of the pattern matching
         """
         results = []
         prog = re.compile(pattern)
@@ -133,24 +732,12 @@ class DirsrvLog(DSLint):
 
     def parse_timestamp(self, ts):
         """Parse a logs timestamps and break it down into its individual parts
-        @param ts - The timestamp string from a log
-        @return - a "datetime" object
-        """
-        timedata = self.prog_timestamp.match(ts).groupdict()
-        # Now, have to convert month to an int.
-        dt_str = '{YEAR}-{MONTH}-{DAY} {HOUR}-{MINUTE}-{SECOND} {TZ}'.format(
-            YEAR=timedata['year'],
-            MONTH=MONTH_LOOKUP[timedata['month']],
-            DAY=timedata['day'],
-            HOUR=timedata['hour'],
-            MINUTE=timedata['minute'],
-            SECOND=timedata['second'],
-            TZ=timedata['tz'],
-            )
-        dt = dt_parse(dt_str)
-        if timedata['nanosecond']:
-            dt = dt.replace(microsecond=int(int(timedata['nanosecond']) / 1000))
-        return dt
+
+        :param ts: The timestamp string from a log
+        :type ts: str
+        :returns: A "datetime" object
+        """
+        return parse_log_timestamp(ts)
 
     def get_time_in_secs(self, log_line):
         """Take the timestamp (not the date) from a DS log and convert it
@@ -158,8 +745,9 @@ class DirsrvLog(DSLint):
 
               [25/May/2016:15:24:27.289341875 -0400]...
 
-            @param log_line - A line of txt from a DS error/access log
-            @return - time in seconds
+        :param log_line: A line of txt from a DS error/access log
+        :type log_line: str
+        :returns: Time in seconds
         """
 
         total = 0
@@ -179,7 +767,9 @@ class DirsrvAccessLog(DirsrvLog):
     """Class for process access logs"""
     def __init__(self, dirsrv):
         """Init the class
-        @param dirsrv - A DirSrv object
+
+        :param dirsrv: A DirSrv object
+        :type dirsrv: lib389.DirSrv
         """
         super(DirsrvAccessLog, self).__init__(dirsrv)
         ## We precompile our regex for parse_line to make it faster.
@@ -207,7 +797,7 @@ class DirsrvAccessLog(DirsrvLog):
         return {
             'base': quoted_vals[0],
             'filter': quoted_vals[1],
-            'timestamp': re.findall('[(.*)]', lines[0])[0],
+            'timestamp': lines[0][:lines[0].index(']') + 1],
             'scope': lines[0].split(' scope=', 1)[1].split(' ',1)[0]
         }
 
@@ -264,8 +854,10 @@ class DirsrvAccessLog(DirsrvLog):
     def parse_line(self, line):
         """
         This knows how to break up an access log line into the specific fields.
-        @param line - A text line from an access log
-        @return - A dictionary of the log parts
+
+        :param line: A text line from an access log
+        :type line: str
+        :returns: A dictionary of the log parts
         """
         line = line.strip()
         action = {
@@ -296,10 +888,64 @@ class DirsrvAccessLog(DirsrvLog):
             self.log.info(action)
         return action
 
+    def iter_operations(self, lines=None, max_pending=100000):
+        """Stream the access log as one compact record per operation.
+
+        Request lines (SRCH, MOD, BIND, ...) are held until the matching
+        RESULT line is seen, and then yielded as a single AccessLogOperation.
+        Connection events are yielded as CONNECT and DISCONNECT records.
+        Requests still waiting for their result are dropped when their
+        connection is closed, and the oldest connections are dropped if more
+        than max_pending requests are waiting, so memory usage is bounded
+        regardless of the size of the logs.
+
+        :param lines: An iterable of lines, defaults to all the lines of the
+                      current and rotated logs
+        :type lines: iterable of str
+        :param max_pending: The maximum number of requests waiting for a result
+        :type max_pending: int
+        :returns: A generator of AccessLogOperation
+        """
+        if lines is None:
+            lines = self.iter_lines_archive()
+        return iter_access_operations(lines, max_pending)
+
+    def analyse(self, lines=None, parallel=None, max_pending=100000, **kwargs):
+        """Compute aggregate statistics over the access logs in a single
+        streaming pass.
+
+        With parallel, each log file (current and rotated) is analysed in
+        its own worker process and the results are merged. Operations
+        whose request and result are in different files are then counted
+        as UNKNOWN.
+
+        :param lines: An iterable of lines, defaults to all the lines of the
+                      current and rotated logs
+        :type lines: iterable of str
+        :param parallel: True to use one process per CPU, or a number of
+                         processes. Ignored when lines is given
+        :type parallel: bool or int
+        :param max_pending: The maximum number of requests waiting for a result
+        :type max_pending: int
+        :param kwargs: Options passed to AccessLogAnalyser
+        :type kwargs: dict
+        :returns: An AccessLogAnalyser holding the results
+        """
+        analyser = AccessLogAnalyser(**kwargs)
+        if lines is not None or not parallel:
+            analyser.feed(self.iter_operations(lines, max_pending))
+            return analyser
+        for result in _scan_logs(self._get_all_log_paths(), _scan_log_analyse,
+                                 (max_pending, kwargs), parallel):
+            analyser.merge(result)
+        return analyser
+
     def parse_lines(self, lines):
         """Parse multiple log lines
-        @param lines - a list of log lines
-        @return - A dictionary of the log parts for each line
+
+        :param lines: A list of log lines
+        :type lines: list of str
+        :returns: A dictionary of the log parts for each line
         """
         return map(self.parse_line, lines)
 
@@ -308,7 +954,9 @@ class DirsrvErrorLog(DirsrvLog):
     """Directory Server Error log class"""
     def __init__(self, dirsrv):
         """Init the Error log class
-        @param diursrv - A DirSrv object
+
+        :param dirsrv: A DirSrv object
+        :type dirsrv: lib389.DirSrv
         """
         super(DirsrvErrorLog, self).__init__(dirsrv)
         self.prog_m1 = re.compile(r'^(?P<timestamp>\[.*\])\s(?P<message>.*)')
@@ -319,8 +967,10 @@ class DirsrvErrorLog(DirsrvLog):
 
     def parse_line(self, line):
         """Parse an errors log line
-        @line - a text string from an errors log
-        @return - A dictionary of the log parts
+
+        :param line: A text string from an errors log
+        :type line: str
+        :returns: A dictionary of the log parts
         """
         line = line.strip()
         action = self.prog_m1.match(line).groupdict()
@@ -330,7 +980,154 @@ class DirsrvErrorLog(DirsrvLog):
 
     def parse_lines(self, lines):
         """Parse multiple lines from an errors log
-        @param lines - a lits of strings/lines from an errors log
-        @return - A dictionary of the log parts for each line
+
+        :param lines: A list of strings/lines from an errors log
+        :type lines: list of str
+        :returns: A dictionary of the log parts for each line
         """
         return map(self.parse_line, lines)
+
+
+class AccessLogAnalyser(object):
+    """Incremental aggregates over the records of
+    DirsrvAccessLog.iter_operations(), similar to what logconv.pl reports.
+
+    Every counter is bounded, so the analyser can be fed an unlimited number
+    of records. Analysers can be merged, which allows logs to be processed
+    in separate chunks.
+
+    :param top: The number of entries reported in the "top" lists
+    :type top: int
+    :param max_keys: The maximum number of distinct filters/clients tracked
+    :type max_keys: int
+    :param max_samples: The number of unindexed searches kept as examples
+    :type max_samples: int
+    """
+
+    def __init__(self, top=20, max_keys=10000, max_samples=50):
+        self.top = top
+        self.max_keys = max_keys
+        self.first = None
+        self.last = None
+        self.connections = 0
+        self.operations = Counter()
+        self.results = Counter()
+        self.etimes = Histogram()
+        self.etimes_by_action = {}
+        self.unindexed = 0
+        self.partially_unindexed = 0
+        self.unindexed_samples = deque(maxlen=max_samples)
+        self.filters = Counter()
+        self.unindexed_filters = Counter()
+        self.clients = Counter()
+
+    def _count(self, counter, key):
+        counter[key] += 1
+        if len(counter) > self.max_keys:
+            # Keep the heaviest hitters only, this is approximate but bounded
+            kept = counter.most_common(self.max_keys // 2)
+            counter.clear()
+            counter.update(dict(kept))
+
+    def update(self, record):
+        """Account for one AccessLogOperation
+
+        :param record: The operation to account for
+        :type record: AccessLogOperation
+        """
+        if self.first is None:
+            self.first = record.timestamp
+        self.last = record.timestamp
+        action = record.action
+        if action == 'CONNECT':
+            self.connections += 1
+            self._count(self.clients, record.client)
+            return
+        if action == 'DISCONNECT':
+            return
+        self.operations[action] += 1
+        if record.err is not None:
+            self.results[record.err] += 1
+        if record.etime is not None:
+            self.etimes.record(record.etime)
+            if action not in self.etimes_by_action:
+                self.etimes_by_action[action] = Histogram()
+            self.etimes_by_action[action].record(record.etime)
+        if record.filter is not None:
+            self._count(self.filters, record.filter)
+        if record.notes:
+            if 'A' in record.notes:
+                self.unindexed += 1
+            elif 'U' in record.notes:
+                self.partially_unindexed += 1
+            else:
+                return
+            self._count(self.unindexed_filters, record.filter)
+            self.unindexed_samples.append(record)
+
+    def feed(self, records):
+        """Account for all the records of an iterable
+
+        :param records: An iterable of AccessLogOperation
+        :type records: iterable
+        :returns: self
+        """
+        for record in records:
+            self.update(record)
+        return self
+
+    def merge(self, other):
+        """Merge the results of another analyser into this one
+
+        :param other: The analyser to merge
+        :type other: AccessLogAnalyser
+        :returns: self
+        """
+        if other.first is not None and (self.first is None or
+                                        _log_time_key(self.first) > _log_time_key(other.first)):
+            self.first = other.first
+        if other.last is not None and (self.last is None or
+                                       _log_time_key(self.last) < _log_time_key(other.last)):
+            self.last = other.last
+        self.connections += other.connections
+        self.operations.update(other.operations)
+        self.results.update(other.results)
+        self.etimes.merge(other.etimes)
+        for action, hist in other.etimes_by_action.items():
+            if action not in self.etimes_by_action:
+                self.etimes_by_action[action] = Histogram()
+            self.etimes_by_action[action].merge(hist)
+        self.unindexed += other.unindexed
+        self.partially_unindexed += other.partially_unindexed
+        self.unindexed_samples.extend(other.unindexed_samples)
+        for (mine, theirs) in ((self.filters, other.filters),
+                               (self.unindexed_filters, other.unindexed_filters),
+                               (self.clients, other.clients)):
+            mine.update(theirs)
+            if len(mine) > self.max_keys:
+                kept = mine.most_common(self.max_keys // 2)
+                mine.clear()
+                mine.update(dict(kept))
+        return self
+
+    def summary(self):
+        """Return the aggregates as a dict suitable for json output
+
+        :returns: dict
+        """
+        return {
+            'start': self.first,
+            'end': self.last,
+            'connections': self.connections,
+            'operations': dict(self.operations),
+            'results': dict(self.results),
+            'etime': self.etimes.summary(),
+            'etime_by_operation': {action: hist.summary()
+                                   for action, hist in self.etimes_by_action.items()},
+            'unindexed_searches': self.unindexed,
+            'partially_unindexed_searches': self.partially_unindexed,
+            'unindexed_samples': [record._asdict() for record in self.unindexed_samples],
+            'top_filters': self.filters.most_common(self.top),
+            'top_unindexed_filters': self.unindexed_filters.most_common(self.top),
+            'top_clients': self.clients.most_common(self.top),
+        }
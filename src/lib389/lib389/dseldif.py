@@ -12,9 +12,10 @@ import os
 import base64
 import time
 import fnmatch
+import tempfile
 from struct import pack, unpack
 from datetime import timedelta
-from stat import ST_MODE
+from stat import ST_MODE, S_IMODE
 # from lib389.utils import print_nice_time
 from lib389.paths import Paths
 from lib389._mapped_object_lint import DSLint
@@ -27,18 +28,89 @@ from lib389.lint import (
 )
 
 
+class _DSEEntry(object):
+    """An entry of dse.ldif: its unfolded lines, the DN line first, and the
+    lines that follow it up to the next entry (the empty separator line).
+
+    The attribute positions are only indexed when the entry is first
+    accessed by attribute.
+    """
+
+    def __init__(self, dn_line):
+        self.lines = [dn_line]
+        self.trailer = []
+        self._attrs = None
+
+    def positions(self, attr):
+        """Return the positions of the lines of an attribute in self.lines"""
+
+        if self._attrs is None:
+            self._attrs = {}
+            for (i, line) in enumerate(self.lines[1:], 1):
+                name = line.split(':', 1)[0].lower()
+                self._attrs.setdefault(name, []).append(i)
+        return self._attrs.get(attr.lower(), [])
+
+    def changed(self):
+        """Drop the attribute index after the lines were modified"""
+
+        self._attrs = None
+
+
+class _DSEldifBatch(object):
+    """The context manager returned by DSEldif.batch()"""
+
+    def __init__(self, dse_ldif):
+        self._dse_ldif = dse_ldif
+
+    def __enter__(self):
+        self._dse_ldif._batch_depth += 1
+        return self._dse_ldif
+
+    def __exit__(self, type, value, tb):
+        dse_ldif = self._dse_ldif
+        dse_ldif._batch_depth -= 1
+        if dse_ldif._batch_depth == 0 and dse_ldif._dirty:
+            dse_ldif._dirty = False
+            if type is None:
+                dse_ldif._write()
+            else:
+                # Drop the edits of the batch
+                dse_ldif._read()
+        return False
+
+
 class DSEldif(DSLint):
     """A class for working with dse.ldif file
 
+    The entries are indexed by DN. Every edit rewrites the file atomically,
+    or once at the end of a batch(), i.e.:
+
+        dse_ldif = DSEldif(inst)
+        with dse_ldif.batch():
+            dse_ldif.replace(DN_CONFIG, 'nsslapd-port', '390')
+            dse_ldif.replace(DN_CONFIG, 'nsslapd-secureport', '637')
+
     :param instance: An instance
     :type instance: lib389.DirSrv
+    :param path: The path of another dse.ldif file than the instance one,
+                 i.e. a copy of its configuration directory
+    :type path: str
     """
 
-    def __init__(self, instance, serverid=None):
+    def __init__(self, instance, serverid=None, path=None):
         self._instance = instance
-        self._contents = []
-
-        if serverid:
+        # The lines before the first entry
+        self._header = []
+        # The _DSEEntry list, in the file order, and by "dn: <lowercase dn>\n"
+        self._entries = []
+        self._index = {}
+        self._batch_depth = 0
+        self._dirty = False
+
+        if path:
+            self.path = path
+        elif serverid:
             # Get the dse.ldif from the instance name
             prefix = os.environ.get('PREFIX', ""),
             if serverid.startswith("slapd-"):
@@ -48,18 +120,57 @@ class DSEldif(DSLint):
             ds_paths = Paths(self._instance.serverid, self._instance)
             self.path = os.path.join(ds_paths.config_dir, 'dse.ldif')
 
+        self._read()
+
+    def _read(self):
+        """Read and index the dse.ldif entries"""
+
+        self._header = []
+        self._entries = []
+        self._index = {}
         with open(self.path, 'r') as file_dse:
             processed_line = ""
-            for line in file_dse.readlines():
+            for line in file_dse:
                 if not line.startswith(' '):
                     if processed_line:
-                        self._contents.append(processed_line)
+                        self._add_line(processed_line)
                     if line.startswith('dn:'):
                         processed_line = line.lower()
                     else:
                         processed_line = line
                 else:
                     processed_line = processed_line[:-1] + line[1:]
+            if processed_line:
+                self._add_line(processed_line)
+
+    def _add_line(self, line):
+        """Add an unfolded line at the end of the contents"""
+
+        if line.startswith('dn:'):
+            entry = _DSEEntry(line)
+            self._entries.append(entry)
+            # If a DN is duplicated, the first entry is the one used
+            self._index.setdefault(self._dn_key(line[3:]), entry)
+        elif not self._entries:
+            self._header.append(line)
+        elif line == "\n" or self._entries[-1].trailer:
+            self._entries[-1].trailer.append(line)
+        else:
+            self._entries[-1].lines.append(line)
+
+    @staticmethod
+    def _dn_key(entry_dn):
+        return "dn: {}\n".format(entry_dn.strip().lower())
+
+    @property
+    def _contents(self):
+        """The unfolded lines of dse.ldif"""
+
+        contents = list(self._header)
+        for entry in self._entries:
+            contents += entry.lines
+            contents += entry.trailer
+        return contents
 
     @classmethod
     def lint_uid(cls):
@@ -88,41 +199,89 @@ class DSEldif(DSLint):
                 report['check'] = f'dseldif:nsstate'
                 yield report
 
+    def batch(self):
+        """Group several edits in a single write of the dse.ldif. If an
+        exception is raised in the batch, its edits are dropped.
+
+        :returns: A context manager giving the DSEldif
+        """
+
+        return _DSEldifBatch(self)
+
     def _update(self):
         """Update the dse.ldif with a new contents"""
 
-        with open(self.path, "w") as file_dse:
-            file_dse.write("".join(self._contents))
+        if self._batch_depth > 0:
+            self._dirty = True
+            return
+        self._write()
 
-    def _find_attr(self, entry_dn, attr):
-        """Find all attribute values and indexes under a given entry
-
-        Returns entry dn index and attribute data dict:
-        relative attribute indexes and the attribute value
+    def _write(self):
+        """Write the dse.ldif with a temporary file renamed over it, so it is
+        never seen partially written, even after a crash.
         """
 
-        entry_dn_i = self._contents.index("dn: {}\n".format(entry_dn.lower()))
-        attr_data = {}
+        contents = "".join(self._contents)
+        dirname = os.path.dirname(self.path)
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(prefix='.dse.ldif.', dir=dirname)
+        except PermissionError:
+            # The directory is not writable, only the file may be
+            with open(self.path, "w") as file_dse:
+                file_dse.write(contents)
+            return
 
-        # Find where the entry ends
         try:
-            dn_end_i = self._contents[entry_dn_i:].index("\n")
-        except ValueError:
-            # We are in the end of the list
-            dn_end_i = len(self._contents)
+            with os.fdopen(fd, "w") as file_dse:
+                file_dse.write(contents)
+                file_dse.flush()
+                os.fsync(file_dse.fileno())
+            # Keep the mode and the owner of the file, the server must be
+            # able to write it
+            st = os.stat(self.path)
+            os.chmod(tmp_path, S_IMODE(st.st_mode))
+            try:
+                os.chown(tmp_path, st.st_uid, st.st_gid)
+            except PermissionError:
+                pass
+            os.rename(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
-        entry_slice = self._contents[entry_dn_i:entry_dn_i + dn_end_i]
+        dir_fd = os.open(dirname, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _get_entry(self, entry_dn):
+        """Return the _DSEEntry of a DN
+
+        :raises: ValueError - if the entry doesn't exist
+        """
 
-        # Find the attribute
-        for line in entry_slice:
-            if line.startswith("{}:".format(attr)):
-                attr_value = line.split(" ", 1)[1][:-1]
-                attr_data.update({entry_slice.index(line): attr_value})
+        try:
+            return self._index[self._dn_key(entry_dn)]
+        except KeyError:
+            raise ValueError("Entry dn: {} wasn't found".format(entry_dn.lower()))
+
+    def _find_attr(self, entry_dn, attr):
+        """Find all attribute values and positions under a given entry
+
+        Returns the entry and the attribute data dict:
+        positions of the attribute lines in the entry and the attribute value
+        """
+
+        entry = self._get_entry(entry_dn)
+        attr_data = {}
+        for attr_i in entry.positions(attr):
+            attr_data[attr_i] = entry.lines[attr_i].split(" ", 1)[1][:-1]
 
         if not attr_data:
             raise ValueError("Attribute {} wasn't found under dn: {}".format(attr, entry_dn.lower()))
 
-        return entry_dn_i, attr_data
+        return entry, attr_data
 
     def get(self, entry_dn, attr, single=False):
         """Return attribute values under a given entry
@@ -151,11 +310,12 @@ class DSEldif(DSLint):
         :param backend: a backend to get the indexes of
         """
         indexes = []
-        for entry in self._contents:
-            if fnmatch.fnmatch(entry, "*,cn=index,cn={}*".format(backend.lower())):
-                start = entry.find("cn=")
-                end = entry.find(",")
-                indexes.append(entry[start+len('cn='):end])
+        for entry in self._entries:
+            dn_line = entry.lines[0]
+            if fnmatch.fnmatch(dn_line, "*,cn=index,cn={}*".format(backend.lower())):
+                start = dn_line.find("cn=")
+                end = dn_line.find(",")
+                indexes.append(dn_line[start+len('cn='):end])
 
         return indexes
 
@@ -167,9 +327,12 @@ class DSEldif(DSLint):
         :type value: str list
         """
 
-        if self._contents[-1] != "\n":
-            self._contents.append("\n")
-        self._contents.extend(entry)
+        if self._entries and self._entries[-1].trailer[-1:] != ["\n"]:
+            self._entries[-1].trailer.append("\n")
+        elif not self._entries and self._header[-1:] != ["\n"]:
+            self._header.append("\n")
+        for line in entry:
+            self._add_line(line)
         self._update()
 
 
@@ -184,8 +347,9 @@ class DSEldif(DSLint):
         :type value: str
         """
 
-        entry_dn_i = self._contents.index("dn: {}\n".format(entry_dn.lower()))
-        self._contents.insert(entry_dn_i+1, "{}: {}\n".format(attr, value))
+        entry = self._get_entry(entry_dn)
+        entry.lines.insert(1, "{}: {}\n".format(attr, value))
+        entry.changed()
         self._update()
 
     def rename(self, entry_dn, new_dn, del_old_rdn=True):
@@ -207,15 +371,17 @@ class DSEldif(DSLint):
         new_rdn_attr = new_rdn.split('=')[0]
         new_rdn_val = new_rdn.split('=')[1]
 
-        # Handle the rdn attribute
-        if del_old_rdn:
-           self.delete(entry_dn, rdn_attr)
-        self.add(entry_dn, new_rdn_attr, new_rdn_val)
+        with self.batch():
+            # Handle the rdn attribute
+            if del_old_rdn:
+                self.delete(entry_dn, rdn_attr)
+            self.add(entry_dn, new_rdn_attr, new_rdn_val)
 
-        # Rename the entry
-        entry_dn_i = self._contents.index("dn: {}\n".format(entry_dn.lower()))
-        self._contents[entry_dn_i] = f"dn: {new_dn}\n"
-        self._update()
+            # Rename the entry
+            entry = self._index.pop(self._dn_key(entry_dn))
+            entry.lines[0] = f"dn: {new_dn}\n"
+            self._index[self._dn_key(new_dn)] = entry
+            self._update()
 
     def delete_dn(self, entry_dn):
         """Delete the whole entry by DN
@@ -224,16 +390,9 @@ class DSEldif(DSLint):
         :type entry_dn: str
         """
 
-        entry_dn_i = self._contents.index("dn: {}\n".format(entry_dn.lower()))
-
-        # Find where the entry ends
-        try:
-            dn_end_i = self._contents[entry_dn_i:].index("\n")
-        except ValueError:
-            # We are in the end of the list
-            dn_end_i = len(self._contents)
-
-        del self._contents[entry_dn_i:entry_dn_i+dn_end_i+1]
+        entry = self._get_entry(entry_dn)
+        del self._index[self._dn_key(entry_dn)]
+        self._entries.remove(entry)
         self._update()
 
     def delete(self, entry_dn, attr, value=None):
@@ -247,15 +406,12 @@ class DSEldif(DSLint):
         :type value: str
         """
 
-        entry_dn_i, attr_data = self._find_attr(entry_dn, attr)
+        entry, attr_data = self._find_attr(entry_dn, attr)
 
-        if value is not None:
-            for attr_i, attr_value in attr_data.items():
-                if attr_value == value:
-                    del self._contents[entry_dn_i + attr_i]
-        else:
-            for attr_i in sorted(attr_data.keys(), reverse=True):
-                del self._contents[entry_dn_i + attr_i]
+        for attr_i in sorted(attr_data.keys(), reverse=True):
+            if value is None or attr_data[attr_i] == value:
+                del entry.lines[attr_i]
+        entry.changed()
         self._update()
 
     def replace(self, entry_dn, attr, value):
@@ -269,12 +425,12 @@ class DSEldif(DSLint):
         :type value: str
         """
 
-        try:
-            self.delete(entry_dn, attr)
-        except ValueError as e:
-            self._instance.log.debug("During replace operation: {}".format(e))
-        self.add(entry_dn, attr, value)
-        self._update()
+        with self.batch():
+            try:
+                self.delete(entry_dn, attr)
+            except ValueError as e:
+                self._instance.log.debug("During replace operation: {}".format(e))
+            self.add(entry_dn, attr, value)
 
     # Read NsState helper functions
     def _flipend(self, end):
@@ -425,9 +581,10 @@ class DSEldif(DSLint):
         newNsState = newNsState.decode('utf-8')
         self._instance.log.debug(f'newNsState is {newNsState}')
         # Lets replace the value.
-        (entry_dn_i, attr_data) = self._find_attr(nsState['dn'], 'nsState')
+        (entry, attr_data) = self._find_attr(nsState['dn'], 'nsState')
         attr_i = next(iter(attr_data))
-        self._contents[entry_dn_i + attr_i] = f"nsState:: {newNsState}"
+        entry.lines[attr_i] = f"nsState:: {newNsState}\n"
+        entry.changed()
         self._update()
 
 
@@ -9,9 +9,11 @@
 
 import os
 import time
+import logging
 import subprocess
 from enum import Enum
 import ldap
+from ldap.dn import str2dn, dn2str
 from lib389._mapped_object import DSLdapObject, DSLdapObjects, _gen_or, _gen_filter, _term_gen
 from lib389._constants import SER_ROOT_DN, SER_ROOT_PW
 from lib389.utils import gentime_to_posix_time, gentime_to_datetime
@@ -22,6 +24,13 @@ from lib389.idm.role import Roles
 from lib389.extended_operations import LdapSSOTokenRequest, LdapSSOTokenResponse
 
 
+def _first_value(attrs, attr):
+    try:
+        return attrs[attr][0]
+    except (IndexError, KeyError):
+        return ""
+
+
 class AccountState(Enum):
     ACTIVATED = "activated"
     DIRECTLY_LOCKED = "directly locked through nsAccountLock"
@@ -48,34 +57,6 @@ class Account(DSLdapObject):
         super(Account, self).__init__(instance, dn)
         self._protected = False
 
-    def _format_status_message(self, message, create_time, modify_time, last_login_time, limit, role_dn=None):
-        params = {}
-        now = time.mktime(time.gmtime())
-        params["Creation Date"] = gentime_to_datetime(create_time)
-        params["Modification Date"] = gentime_to_datetime(modify_time)
-        params["Last Login Date"] = None
-        params["Time Until Inactive"] = None
-        params["Time Since Inactive"] = None
-        if last_login_time:
-            params["Last Login Date"] = gentime_to_datetime(last_login_time)
-            if limit:
-                remaining_time = float(limit) + gentime_to_posix_time(last_login_time) - now
-                if remaining_time <= 0:
-                    if message == AccountState.INACTIVITY_LIMIT_EXCEEDED:
-                        params["Time Since Inactive"] = remaining_time
-                else:
-                    params["Time Until Inactive"] = remaining_time
-        result = {"state": message, "params": params, "calc_time": now, "role_dn": None}
-        if role_dn is not None:
-            result["role_dn"] = role_dn
-        return result
-
-    def _dict_get_with_ignore_indexerror(self, dict, attr):
-        try:
-            return dict[attr][0]
-        except IndexError:
-            return ""
-
     def status(self):
         """Check if account is locked by Account Policy plugin or
         nsAccountLock (directly or indirectly)
@@ -84,92 +65,9 @@ class Account(DSLdapObject):
                   {"status": status, "params": activity_data, "calc_time": epoch_time}
         """
 
-        inst = self._instance
-
-        # Fetch Account Policy data if its enabled
-        plugin = AccountPolicyPlugin(inst)
-        config_dn = plugin.get_attr_val_utf8("nsslapd-pluginarg0")
-        state_attr = ""
-        alt_state_attr = ""
-        limit = ""
-        spec_attr = ""
-        limit_attr = ""
-        process_account_policy = False
-        try:
-            process_account_policy = plugin.status()
-        except IndexError:
-            self._log.debug("The bound user doesn't have rights to access Account Policy settings. Not checking.")
-
-        if process_account_policy and config_dn is not None:
-            config = AccountPolicyConfig(inst, config_dn)
-            config_settings = config.get_attrs_vals_utf8(["stateattrname", "altstateattrname",
-                                                          "specattrname", "limitattrname"])
-            state_attr = self._dict_get_with_ignore_indexerror(config_settings, "stateattrname")
-            alt_state_attr = self._dict_get_with_ignore_indexerror(config_settings, "altstateattrname")
-            spec_attr = self._dict_get_with_ignore_indexerror(config_settings, "specattrname")
-            limit_attr = self._dict_get_with_ignore_indexerror(config_settings, "limitattrname")
-
-            mapping_trees = MappingTrees(inst)
-            root_suffix = mapping_trees.get_root_suffix_by_entry(self.dn)
-            cos_entries = CosTemplates(inst, root_suffix)
-            accpol_entry_dn = ""
-            for cos in cos_entries.list():
-                if cos.present(spec_attr):
-                    accpol_entry_dn = cos.get_attr_val_utf8_l(spec_attr)
-            if accpol_entry_dn:
-                accpol_entry = AccountPolicyEntry(inst, accpol_entry_dn)
-            else:
-                accpol_entry = config
-            limit = accpol_entry.get_attr_val_utf8_l(limit_attr)
-
-        # Fetch account data
-        account_data = self.get_attrs_vals_utf8(["createTimestamp", "modifyTimeStamp",
-                                                 "nsAccountLock", state_attr])
-
-        last_login_time = self._dict_get_with_ignore_indexerror(account_data, state_attr)
-        if not last_login_time:
-            last_login_time = self._dict_get_with_ignore_indexerror(account_data, alt_state_attr)
-
-        create_time = self._dict_get_with_ignore_indexerror(account_data, "createTimestamp")
-        modify_time = self._dict_get_with_ignore_indexerror(account_data, "modifyTimeStamp")
-
-        acct_roles = self.get_attr_vals_utf8_l("nsRole")
-        mapping_trees = MappingTrees(inst)
-        root_suffix = ""
-        try:
-            root_suffix = mapping_trees.get_root_suffix_by_entry(self.dn)
-        except ldap.NO_SUCH_OBJECT:
-            self._log.debug("The bound user doesn't have rights to access disabled roles settings. Not checking.")
-        if root_suffix:
-            roles = Roles(inst, root_suffix)
-            try:
-                disabled_roles = roles.get_disabled_roles()
-
-                # Locked indirectly through a role
-                locked_indirectly_role_dn = ""
-                for role in acct_roles:
-                    if str.lower(role) in [str.lower(role.dn) for role in disabled_roles.keys()]:
-                        locked_indirectly_role_dn = role
-                if locked_indirectly_role_dn:
-                    return self._format_status_message(AccountState.INDIRECTLY_LOCKED, create_time, modify_time,
-                                                       last_login_time, limit, locked_indirectly_role_dn)
-            except ldap.NO_SUCH_OBJECT:
-                pass
-
-        # Locked directly
-        if self._dict_get_with_ignore_indexerror(account_data, "nsAccountLock") == "true":
-            return self._format_status_message(AccountState.DIRECTLY_LOCKED,
-                                               create_time, modify_time, last_login_time, limit)
-
-        # Locked indirectly through Account Policy plugin
-        if process_account_policy and last_login_time:
-            # Now check the Account Policy Plugin inactivity limits
-            remaining_time = float(limit) - (time.mktime(time.gmtime()) - gentime_to_posix_time(last_login_time))
-            if remaining_time <= 0:
-                return self._format_status_message(AccountState.INACTIVITY_LIMIT_EXCEEDED,
-                                                   create_time, modify_time, last_login_time, limit)
-        # All checks are passed - we are active
-        return self._format_status_message(AccountState.ACTIVATED, create_time, modify_time, last_login_time, limit)
+        account_status = AccountStatus(self._instance)
+        account_data = self.get_attrs_vals_utf8(account_status.attrlist)
+        return account_status.evaluate(self.dn, account_data)
 
     def ensure_lock(self):
         """Ensure nsAccountLock is set to 'true'"""
@@ -327,6 +225,186 @@ class Account(DSLdapObject):
         return self.bind(token, *args, **kwargs)
 
 
+class AccountStatus(object):
+    """Evaluate the lock and inactivity state of accounts.
+
+    The Account Policy plugin configuration is read once, and the inactivity
+    limit and the disabled roles are read once per root suffix, so checking
+    many accounts only needs their own attributes (see attrlist).
+
+    :param instance: An instance
+    :type instance: lib389.DirSrv
+    """
+
+    def __init__(self, instance):
+        self._instance = instance
+        self._log = logging.getLogger(type(self).__name__)
+        self._process_account_policy = False
+        self._config = None
+        self._state_attr = ""
+        self._alt_state_attr = ""
+        self._spec_attr = ""
+        self._limit_attr = ""
+        # Lowercased root suffix -> root suffix
+        self._suffixes = None
+        # Lowercased root suffix -> (limit, lowercased disabled role DNs)
+        self._contexts = {}
+        self._load_policy()
+
+    def _load_policy(self):
+        # Fetch Account Policy data if its enabled
+        plugin = AccountPolicyPlugin(self._instance)
+        config_dn = plugin.get_attr_val_utf8("nsslapd-pluginarg0")
+        try:
+            self._process_account_policy = plugin.status()
+        except IndexError:
+            self._log.debug("The bound user doesn't have rights to access Account Policy settings. Not checking.")
+
+        if self._process_account_policy and config_dn is not None:
+            self._config = AccountPolicyConfig(self._instance, config_dn)
+            config_settings = self._config.get_attrs_vals_utf8(["stateattrname", "altstateattrname",
+                                                                "specattrname", "limitattrname"])
+            self._state_attr = _first_value(config_settings, "stateattrname")
+            self._alt_state_attr = _first_value(config_settings, "altstateattrname")
+            self._spec_attr = _first_value(config_settings, "specattrname")
+            self._limit_attr = _first_value(config_settings, "limitattrname")
+        else:
+            self._process_account_policy = False
+
+    @property
+    def attrlist(self):
+        """The attributes of an account needed by evaluate()"""
+
+        attrlist = ["createTimestamp", "modifyTimestamp", "nsAccountLock", "nsRole"]
+        for attr in (self._state_attr, self._alt_state_attr):
+            if attr and attr.lower() not in [a.lower() for a in attrlist]:
+                attrlist.append(attr)
+        return attrlist
+
+    def _get_root_suffix(self, dn):
+        if self._suffixes is None:
+            self._suffixes = {mt.rdn.lower(): mt.rdn for mt in MappingTrees(self._instance).list()}
+        dn_parts = str2dn(dn)
+        while dn_parts:
+            root_suffix = self._suffixes.get(dn2str(dn_parts).lower())
+            if root_suffix is not None:
+                return root_suffix
+            dn_parts.pop(0)
+        raise ldap.NO_SUCH_OBJECT(f"{dn} doesn't belong to any suffix")
+
+    def _get_limit(self, root_suffix):
+        accpol_entry_dn = ""
+        if self._spec_attr:
+            # Read the templates with a single search
+            cos_entries = CosTemplates(self._instance, root_suffix)
+            cos_entries.enable_cache([self._spec_attr])
+            for cos in cos_entries.list():
+                if cos.present(self._spec_attr):
+                    accpol_entry_dn = cos.get_attr_val_utf8_l(self._spec_attr)
+        if accpol_entry_dn:
+            accpol_entry = AccountPolicyEntry(self._instance, accpol_entry_dn)
+        else:
+            accpol_entry = self._config
+        return accpol_entry.get_attr_val_utf8_l(self._limit_attr)
+
+    def _get_disabled_roles(self, root_suffix):
+        try:
+            disabled_roles = Roles(self._instance, root_suffix).get_disabled_roles()
+        except ldap.NO_SUCH_OBJECT:
+            return set()
+        return {role.dn.lower() for role in disabled_roles.keys()}
+
+    def _get_context(self, dn):
+        """Get the inactivity limit and the disabled roles of the root suffix
+        of an entry, they are read from the server only once per suffix.
+
+        :param dn: An account DN
+        :type dn: str
+        :returns: A tuple (limit, set of lowercased disabled role DNs)
+        """
+
+        try:
+            root_suffix = self._get_root_suffix(dn)
+        except ldap.NO_SUCH_OBJECT:
+            if self._process_account_policy:
+                raise
+            self._log.debug("The bound user doesn't have rights to access disabled roles settings. Not checking.")
+            return ("", set())
+        key = root_suffix.lower()
+        if key not in self._contexts:
+            limit = ""
+            if self._process_account_policy:
+                limit = self._get_limit(root_suffix)
+            self._contexts[key] = (limit, self._get_disabled_roles(root_suffix))
+        return self._contexts[key]
+
+    def _format_status_message(self, message, create_time, modify_time, last_login_time, limit, role_dn=None):
+        params = {}
+        now = time.mktime(time.gmtime())
+        params["Creation Date"] = gentime_to_datetime(create_time)
+        params["Modification Date"] = gentime_to_datetime(modify_time)
+        params["Last Login Date"] = None
+        params["Time Until Inactive"] = None
+        params["Time Since Inactive"] = None
+        if last_login_time:
+            params["Last Login Date"] = gentime_to_datetime(last_login_time)
+            if limit:
+                remaining_time = float(limit) + gentime_to_posix_time(last_login_time) - now
+                if remaining_time <= 0:
+                    if message == AccountState.INACTIVITY_LIMIT_EXCEEDED:
+                        params["Time Since Inactive"] = remaining_time
+                else:
+                    params["Time Until Inactive"] = remaining_time
+        result = {"state": message, "params": params, "calc_time": now, "role_dn": None}
+        if role_dn is not None:
+            result["role_dn"] = role_dn
+        return result
+
+    def evaluate(self, dn, account_data):
+        """Evaluate the status of an account from its attributes
+
+        :param dn: The account DN
+        :type dn: str
+        :param account_data: The values of the attributes of attrlist
+        :type account_data: dict of str to list of str
+        :returns: a dict in a format -
+                  {"status": status, "params": activity_data, "calc_time": epoch_time}
+        """
+
+        account_data = {attr.lower(): values for (attr, values) in account_data.items()}
+        (limit, disabled_roles) = self._get_context(dn)
+
+        last_login_time = _first_value(account_data, self._state_attr.lower())
+        if not last_login_time:
+            last_login_time = _first_value(account_data, self._alt_state_attr.lower())
+        create_time = _first_value(account_data, "createtimestamp")
+        modify_time = _first_value(account_data, "modifytimestamp")
+
+        # Locked indirectly through a role
+        locked_indirectly_role_dn = ""
+        for role in account_data.get("nsrole", []):
+            if role.lower() in disabled_roles:
+                locked_indirectly_role_dn = role.lower()
+        if locked_indirectly_role_dn:
+            return self._format_status_message(AccountState.INDIRECTLY_LOCKED, create_time, modify_time,
+                                               last_login_time, limit, locked_indirectly_role_dn)
+
+        # Locked directly
+        if _first_value(account_data, "nsaccountlock") == "true":
+            return self._format_status_message(AccountState.DIRECTLY_LOCKED,
+                                               create_time, modify_time, last_login_time, limit)
+
+        # Locked indirectly through Account Policy plugin
+        if self._process_account_policy and last_login_time and limit:
+            # Now check the Account Policy Plugin inactivity limits
+            remaining_time = float(limit) - (time.mktime(time.gmtime()) - gentime_to_posix_time(last_login_time))
+            if remaining_time <= 0:
+                return self._format_status_message(AccountState.INACTIVITY_LIMIT_EXCEEDED,
+                                                   create_time, modify_time, last_login_time, limit)
+        # All checks are passed - we are active
+        return self._format_status_message(AccountState.ACTIVATED, create_time, modify_time, last_login_time, limit)
+
+
 class Accounts(DSLdapObjects):
     """DSLdapObjects that represents Account entry
 
@@ -359,6 +437,31 @@ class Accounts(DSLdapObjects):
         self._childobject = Account
         self._basedn = basedn
 
+    def iter_status(self, search=None, scope=None, paged_search=500):
+        """Iterate over the accounts matching a filter with their status.
+        The accounts are read with a single (paged) search fetching only the
+        attributes needed to evaluate their status, and the policy settings
+        are read once per root suffix.
+
+        :param search: An additional search filter, or None
+        :type search: str
+        :param scope: The search scope, ldap.SCOPE_SUBTREE if None
+        :type scope: int
+        :param paged_search: None for no paged search, or an int of page size to use.
+        :type paged_search: int
+        :returns: A generator of (Account, status) tuples, see Account.status()
+        """
+
+        account_status = AccountStatus(self._instance)
+        attrlist = account_status.attrlist
+        cache_attrlist = self._cache_attrlist
+        self.enable_cache(attrlist)
+        try:
+            for account in self.iter_filter(search, scope=scope, paged_search=paged_search):
+                yield (account, account_status.evaluate(account.dn, account.get_attrs_vals_utf8(attrlist)))
+        finally:
+            self._cache_attrlist = cache_attrlist
+
     #### This is copied from DSLdapObjects, but change _gen_and to _gen_or!!!
 
     def _get_objectclass_filter(self):
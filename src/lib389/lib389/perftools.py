@@ -10,13 +10,15 @@
 
 #import os
 #import os.path
-#import ldap
+import ldap
+import selectors
 import sys
 import re
 import string
 import logging
 import subprocess
 import multiprocessing
+import random
 import time
 import json
 import statistics
@@ -27,9 +29,13 @@ from lib389.idm.user import UserAccounts
 from lib389.topologies import create_topology
 from lib389 import DirSrv
 from lib389.config import LMDB_LDBMConfig
-from lib389.utils import get_default_db_lib
+from lib389.utils import get_default_db_lib, Histogram
 from pathlib import Path, PosixPath
 
+# Delays between the attempts of a load client to reconnect, in seconds
+LOAD_RECONNECT_DELAY = 0.1
+LOAD_RECONNECT_MAX_DELAY = 5
+
 class IdGenerator:
     # Generates up to nbids unique identifiers
 
@@ -146,6 +152,241 @@ class CsvFile:
         colid = self.pos + dpl - 1
         return f"{self.n(int(colid/26))}{self.n(colid%26+1)}{self.lineid}"
 
+def _loadWorker(params):
+    # Run the load of one LoadGenerator process: nbClients asynchronous
+    # connections, each one with one operation in progress.
+    rnd = random.Random(params['seed'])
+    ops = list(params['mix'].keys())
+    weights = list(params['mix'].values())
+    nbUsers = params['nbUsers']
+    filters = params['filters']
+    start = params['start']
+    interval = params['interval']
+    stop = start + interval * params['nbIntervals']
+    counts = [0] * params['nbIntervals']
+    hists = { op : Histogram() for op in ops }
+    errors = { op : 0 for op in ops }
+    connectErrors = 0
+    added = []   # The entries added by this worker, that can be deleted
+    reconnects = []   # [ time of the next attempt, delay ] of the disconnected clients
+    addIdx = 0
+    sel = selectors.DefaultSelector()
+
+    def connect():
+        conn = ldap.initialize(params['uri'])
+        conn.simple_bind_s(params['binddn'], params['bindpw'])
+        return conn
+
+    def randomUserDn():
+        uid = IdGeneratorWithNumbers.formatId(rnd.randint(0, nbUsers-1))
+        return f"uid={uid},{params['base']}"
+
+    def submit(conn):
+        # Returns (op, msgid, start time, dn of the added entry)
+        nonlocal addIdx
+        dn = None
+        op = rnd.choices(ops, weights)[0]
+        if op == 'delete' and not added:
+            op = 'add'
+        if op == 'bind':
+            msgid = conn.simple_bind(params['binddn'], params['bindpw'])
+        elif op == 'search':
+            filt = rnd.choice(filters) if filters else f"(uid={IdGeneratorWithNumbers.formatId(rnd.randint(0, nbUsers-1))})"
+            msgid = conn.search_ext(params['base'], ldap.SCOPE_SUBTREE, filt, ['dn'])
+        elif op == 'modify':
+            val = f"random modify {rnd.randint(0, 99999):05d}".encode()
+            msgid = conn.modify_ext(randomUserDn(), [(ldap.MOD_REPLACE, 'sn', [val])])
+        elif op == 'add':
+            addIdx += 1
+            uid = f"load-{params['id']}-{addIdx}"
+            dn = f"uid={uid},{params['base']}"
+            msgid = conn.add_ext(dn, [('objectClass', [b'top', b'person', b'organizationalPerson', b'inetOrgPerson']),
+                                      ('uid', [uid.encode()]), ('cn', [uid.encode()]), ('sn', [uid.encode()])])
+        elif op == 'delete':
+            msgid = conn.delete_ext(added.pop(rnd.randrange(len(added))))
+        else:
+            raise ValueError(f"Unknown operation {op}")
+        return (op, msgid, time.monotonic(), dn)
+
+    def disconnect(fd, retry):
+        # Drop the connection of a client and schedule its reconnection
+        conn = conns.pop(fd)[0]
+        sel.unregister(fd)
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+        reconnects.append(retry)
+
+    def reconnect():
+        # Connect the clients waiting for it, backing off after a failure
+        nonlocal connectErrors
+        now = time.monotonic()
+        for retry in list(reconnects):
+            if retry[0] > now:
+                continue
+            try:
+                conn = connect()
+            except ldap.LDAPError:
+                connectErrors += 1
+                retry[1] = min(retry[1] * 2, LOAD_RECONNECT_MAX_DELAY)
+                retry[0] = now + retry[1]
+                continue
+            reconnects.remove(retry)
+            fd = conn.get_option(ldap.OPT_DESC)
+            conns[fd] = [conn, None]
+            sel.register(fd, selectors.EVENT_READ)
+            try:
+                conns[fd][1] = submit(conn)
+            except ldap.LDAPError:
+                connectErrors += 1
+                delay = min(retry[1] * 2, LOAD_RECONNECT_MAX_DELAY)
+                disconnect(fd, [now + delay, delay])
+
+    def account(op, started, failed):
+        # Only the operations ending while measuring are accounted
+        now = time.monotonic()
+        t = time.time()
+        if t < start or t >= stop:
+            return
+        if failed:
+            errors[op] += 1
+        else:
+            counts[int((t - start) / interval)] += 1
+            hists[op].record(now - started)
+
+    conns = {}
+    for i in range(params['nbClients']):
+        conn = connect()
+        conns[conn.get_option(ldap.OPT_DESC)] = [conn, None]
+    while time.time() < start:
+        time.sleep(min(0.1, start - time.time()))
+    for fd in list(conns.keys()):
+        sel.register(fd, selectors.EVENT_READ)
+        try:
+            conns[fd][1] = submit(conns[fd][0])
+        except ldap.LDAPError:
+            disconnect(fd, [0, LOAD_RECONNECT_DELAY])
+    while time.time() < stop:
+        # Poll all the clients anyway, libldap may have already read the
+        # response of a client whose socket is not ready
+        if conns:
+            sel.select(timeout=0.05)
+        else:
+            time.sleep(0.05)
+        reconnect()
+        for fd in list(conns.keys()):
+            conn, pending = conns[fd]
+            if pending is None:
+                continue
+            op, msgid, started, dn = pending
+            failed = False
+            try:
+                rtype, rdata, rmsgid, rctrls = conn.result3(msgid, all=1, timeout=0)
+                if rtype is None:
+                    continue
+            except ldap.SERVER_DOWN:
+                # Reconnect the client, at the next loop
+                account(op, started, True)
+                disconnect(fd, [0, LOAD_RECONNECT_DELAY])
+                continue
+            except ldap.LDAPError:
+                failed = True
+            if op == 'add' and not failed:
+                added.append(dn)
+            account(op, started, failed)
+            try:
+                conns[fd][1] = submit(conn)
+            except ldap.LDAPError:
+                # The operation could not be sent, the connection is unusable
+                disconnect(fd, [0, LOAD_RECONNECT_DELAY])
+    for conn, pending in conns.values():
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+    sel.close()
+    return { 'counts' : counts, 'hists' : hists, 'errors' : errors, 'connectErrors' : connectErrors }
+
+
+class LoadGenerator:
+    # Replay a weighted mix of operations against an instance, from several
+    # processes each running asynchronous LDAP clients, and measure the
+    # throughput and the latency of each operation type.
+    #
+    # mix is a { operation : weight } dict, the operations are:
+    #  bind:   bind again as binddn on the client connection
+    #  search: subtree search of a random uid (or of a filter of filters)
+    #  modify: replace the sn of a random user
+    #  add:    add a new user
+    #  delete: delete a user added by the load, requires add in the mix
+    # The users are the ones of PerformanceTools: uid=<10 digits>,base
+    # nbClients connections are spread over nbProcesses processes.
+
+    OPERATIONS = ( 'bind', 'search', 'modify', 'add', 'delete' )
+    PERCENTILES = ( 50, 99, 99.9 )
+
+    def __init__(self, uri, binddn, bindpw, base, nbUsers, mix, nbProcesses=1, nbClients=1,
+                 interval=10, nbIntervals=10, filters=None, seed=None):
+        unknown = set(mix.keys()) - set(LoadGenerator.OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operation(s) {sorted(unknown)}, supported operations are {LoadGenerator.OPERATIONS}")
+        if 'delete' in mix and 'add' not in mix:
+            raise ValueError("The delete operation only deletes the entries added by the load, the mix must include add")
+        self._params = { 'uri' : uri, 'binddn' : binddn, 'bindpw' : bindpw, 'base' : base,
+                         'nbUsers' : nbUsers, 'mix' : mix, 'filters' : filters or [],
+                         'nbClients' : nbClients, 'interval' : interval, 'nbIntervals' : nbIntervals }
+        self._nbProcesses = max(1, min(nbProcesses, nbClients))
+        self._seed = seed
+
+    @staticmethod
+    def parseMix(mix):
+        # Convert a "search=80,modify=20" string into a mix dict
+        res = {}
+        for item in mix.split(','):
+            op, weight = item.split('=')
+            res[op.strip()] = float(weight)
+        return res
+
+    def run(self):
+        # Returns a dict with the number of operations per second of each
+        # interval, the latency summary and error rate of each operation
+        # and the number of failed reconnections
+        # Start measuring once all the clients are connected
+        start = time.time() + 2 + 0.05 * self._params['nbClients']
+        nbClients = self._params['nbClients']
+        params = [ { **self._params, 'id' : f"{os.getpid()}-{i}", 'start' : start,
+                     'nbClients' : nbClients // self._nbProcesses + (1 if i < nbClients % self._nbProcesses else 0),
+                     'seed' : None if self._seed is None else f"{self._seed}-{i}" }
+                   for i in range(self._nbProcesses) ]
+        with multiprocessing.Pool(self._nbProcesses) as pool:
+            results = pool.map(_loadWorker, params)
+        interval = self._params['interval']
+        counts = [ sum(c) for c in zip(*[ r['counts'] for r in results ]) ]
+        total = Histogram()
+        latency = {}
+        errors = {}
+        for op in self._params['mix'].keys():
+            hist = Histogram()
+            for r in results:
+                hist.merge(r['hists'][op])
+            total.merge(hist)
+            nberrors = sum(r['errors'][op] for r in results)
+            latency[op] = hist.summary(LoadGenerator.PERCENTILES)
+            errors[op] = nberrors
+            latency[op]['error_rate'] = nberrors / (hist.count + nberrors) if hist.count + nberrors else 0
+        nberrors = sum(errors.values())
+        summary = total.summary(LoadGenerator.PERCENTILES)
+        return { "rates" : [ c / interval for c in counts ],
+                 "latency" : latency,
+                 "errors" : errors,
+                 "p50" : summary['p50'],
+                 "p99" : summary['p99'],
+                 "p999" : summary['p999'],
+                 "error_rate" : nberrors / (total.count + nberrors) if total.count + nberrors else 0,
+                 "connect_errors" : sum(r['connectErrors'] for r in results) }
+
+
 class PerformanceTools:
 
     def __init__(self, options = {}):
@@ -242,6 +483,35 @@ class PerformanceTools:
                     csv.nf(f"=({csv.ref(-1)}-{csv.ref(-2)})/{csv.ref(-2)}")
                 csv.nl();
 
+    @staticmethod
+    def measureCliStartup(cmd, nbMes=10):
+        # Measure the cold start of a python command line tool (i.e. dsconf):
+        # the wall time of nbMes runs and the modules it imports
+        rawres = []
+        for m in range(nbMes+1):
+            start_time = time.monotonic()
+            subprocess.run([sys.executable, *cmd], capture_output=True)
+            rawres.append(time.monotonic() - start_time)
+        # First run warms up the file system cache, discard it
+        rawres = rawres[1:]
+        result = subprocess.run([sys.executable, '-X', 'importtime', *cmd], capture_output=True)
+        modules = []
+        import_time = 0
+        for line in result.stderr.decode(errors='replace').splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line[len('import time:'):].split('|')
+            if not line.startswith('import time:') or not fields[0].strip().isdigit():
+                continue
+            import_time += int(fields[0])
+            modules.append(fields[2].strip())
+        return { "cmd" : cmd,
+                 "rawresults" : rawres,
+                 "mean" : statistics.mean(rawres),
+                 "min" : min(rawres),
+                 "import_time" : import_time / 1000000,
+                 "nb_modules" : len(modules),
+                 "nb_lib389_modules" : len([ m for m in modules if m.startswith('lib389') ]) }
+
     def getFilePath(self, filename):
         return os.path.join(self._options['resultDir'], filename)   
 
@@ -361,7 +631,8 @@ class PerformanceTools:
             res["rawmean"] = statistics.mean(rawres)
             res["saferesults"] = self.safeMeasures(rawres) # discard first measure result
             res["safemean"] = statistics.mean(res["saferesults"])
-            pretty_res_keys = [ 'start_time', 'stop_time', 'measure_name', 'safemean', 'db_lib', 'nbUsers', 'nb_threads' ]
+            pretty_res_keys = [ 'start_time', 'stop_time', 'measure_name', 'safemean', 'db_lib', 'nbUsers', 'nb_threads',
+                                'p50', 'p99', 'p999', 'error_rate' ]
             pretty_res = dict(filter(lambda elem: elem[0] in pretty_res_keys, res.items()))
         except statistics.StatisticsError as e:
             print(e)
@@ -452,6 +723,44 @@ class PerformanceTools:
                   "-e" : f"rdn=uid:[RNDN(0;{nb_users-1};10)],object={self._ldclt_template},attreplace=sn: random modify XXXXX" }
         return self.ldclt(name, args, nbThreads=nb_threads)
 
+    def measure_load(self, name, nb_threads = 1, mix = None, nbMes=10, interval=10):
+        # Run a mix of operations with the native load generator: nb_threads
+        # clients spread over up to one process per cpu
+        mix = mix or self._options.get('mix') or { 'search' : 80, 'modify' : 10, 'bind' : 5, 'add' : 3, 'delete' : 2 }
+        nb_processes = self._options.get('nbProcesses') or multiprocessing.cpu_count()
+        nb_processes = max(1, min(nb_processes, nb_threads))
+        filters = None
+        if self._options.get('filterFile'):
+            with open(self._options['filterFile']) as f:
+                filters = [ line.strip() for line in f if line.strip() ]
+        # First measure is discarded as for ldclt
+        loadgen = LoadGenerator(f"ldap://{self._instance.host}:{self._instance.port}",
+                                self._instance.binddn, self._instance.bindpw,
+                                self._users_parents_dn, self._options['nbUsers'], mix,
+                                nbProcesses=nb_processes, nbClients=nb_threads, interval=interval, nbIntervals=nbMes+1, filters=filters,
+                                seed=self._options['seed'])
+        start_time = time.time()
+        print (f"Running the load generator for {(nbMes+1)*interval} seconds ...\r")
+        loadres = loadgen.run()
+        print (" Done.")
+        stop_time = time.time()
+        res = { "measure_name" : name,
+                "start_time" : start_time,
+                "stop_time" : stop_time,
+                "nb_threads" : nb_threads,
+                "nb_processes" : nb_processes,
+                "mix" : mix,
+                "latency" : loadres['latency'],
+                "errors" : loadres['errors'],
+                "p50" : loadres['p50'],
+                "p99" : loadres['p99'],
+                "p999" : loadres['p999'],
+                "error_rate" : loadres['error_rate'],
+                **self.getEnvInfo() }
+        res["measure0"] = loadres['rates'][0]
+        res["rawresults"] = loadres['rates'][1:]   # Discard first measure
+        return self.finalizeResult(res)
+
     def offline_export(self):
         start_time = time.time()
         assert (self._instance.db2ldif(DEFAULT_BENAME, (self._options['suffix'],), None, None, None, self._ldif))
@@ -550,6 +859,7 @@ class PerformanceTools:
             PerformanceTools.Tester("search_uid", "Measure number of searches per seconds using filter with random existing uid.", "measure_search_by_uid"),
             PerformanceTools.Tester("search_uid_in_dn", "Measure number of searches per seconds using filter with random existing uid in dn (i.e: (uid:dn:uid_value)).", "measure_search_by_filtering_the_dn"),
             PerformanceTools.Tester("modify_sn", "Measure number of modify per seconds replacing sn by random value on random entries.", "measure_modify"),
+            PerformanceTools.Tester("mixed_load", "Measure number of operations per seconds and their latency percentiles running a weighted mix of bind, search, modify, add and delete operations with the native load generator.", "measure_load"),
             PerformanceTools.TesterImportExport(),
         ] }
 
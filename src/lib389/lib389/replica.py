@@ -16,15 +16,19 @@ import logging
 import uuid
 import json
 import copy
+import re
+from collections import deque
 from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from itertools import permutations
 from lib389._constants import *
 from lib389.properties import *
 from lib389.utils import (normalizeDN, escapeDNValue, ensure_bytes, ensure_str,
                           ensure_list_str, ds_is_older, copy_with_permissions,
-                          ds_supports_new_changelog)
+                          ds_supports_new_changelog, Histogram)
 from lib389 import DirSrv, Entry, NoSuchEntryError, InvalidArgumentError
 from lib389._mapped_object import DSLdapObjects, DSLdapObject
+from lib389.connpool import get_pool
 from lib389.passwd import password_generate
 from lib389.mappingTree import MappingTrees
 from lib389.agreement import Agreements
@@ -2618,7 +2622,78 @@ class ReplicationMonitor(object):
                                     "agmts_status": agmts_status})
         return replicas_status
 
-    def generate_report(self, get_credentials, use_json=False):
+    def _get_host_status(self, supplier, credentials, use_json):
+        """Connect to a host found in an agreement and get its status
+
+        :param supplier: The 'host:port:protocol' of the host
+        :type supplier: str
+        :param credentials: A dictionary with binddn and bindpw keys
+        :type credentials: dict
+        :returns: A tuple of the replicas status, and the dict of the
+                  'host:port:protocol' of the consumers of its agreements, or
+                  None if the host could not be queried
+        """
+        supplier_hostname, supplier_port, supplier_protocol = supplier.split(":")[:3]
+        if not credentials["binddn"]:
+            return ([{"replica_status": "Unavailable - Bind DN was not specified"}], None)
+
+        # Get a connection to the consumer
+        pool = get_pool()
+        try:
+            supplier_inst = pool.acquire(supplier_hostname, supplier_port, credentials["binddn"],
+                                         credentials["bindpw"],
+                                         secure=(supplier_protocol == "ssl" or supplier_protocol == "ldaps"))
+        except ldap.LDAPError as e:
+            self._log.debug(f"Connection to consumer ({supplier_hostname}:{supplier_port}) failed, error: {e}")
+            return ([{"replica_status": f"Unreachable - {e.args[0]['desc']}"}], None)
+
+        discovered = {}
+        try:
+            status = self._get_replica_status(supplier_inst, discovered, use_json)
+        except ldap.LDAPError:
+            pool.release(supplier_inst, discard=True)
+            raise
+        pool.release(supplier_inst)
+        return (status, discovered)
+
+    def _get_hosts_status(self, report_data, get_credentials, use_json, parallel):
+        """Query the hosts to process, and the consumers of their agreements as
+        soon as they are found, with a bounded number of threads
+
+        :param report_data: The report with the hosts to process
+        :type report_data: dict
+        :param parallel: The number of hosts to query at the same time
+        :type parallel: int
+        :returns: A dict of 'host:port:protocol' to the Future of _get_host_status()
+        """
+        known = set(host_port for host_port, processed_data in report_data.items() if processed_data is not None)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            def submit(supplier):
+                if supplier in futures or ":".join(supplier.split(":")[:2]) in known:
+                    return
+                s_splitted = supplier.split(":")
+                # Get the credentials here, the callback may prompt for them
+                credentials = get_credentials(s_splitted[0], s_splitted[1])
+                futures[supplier] = executor.submit(self._get_host_status, supplier, credentials, use_json)
+                pending.add(futures[supplier])
+
+            pending = set()
+            for host_port, processed_data in report_data.items():
+                if processed_data is None:
+                    submit(host_port)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        # Raised again when the report reaches this host
+                        continue
+                    status, discovered = future.result()
+                    for consumer in discovered or []:
+                        submit(consumer)
+        return futures
+
+    def generate_report(self, get_credentials, use_json=False, parallel=None):
         """Generate a replication report for each supplier or hub and the instances
         that are connected with it by agreements.
 
@@ -2626,6 +2701,10 @@ class ReplicationMonitor(object):
                                 a dictionary with binddn and bindpw keys -
                                 example values "cn=Directory Manager" and "password"
         :type get_credentials: function
+        :param parallel: None to query the hosts one after the other, or the number of
+                         hosts to query at the same time. The hosts are queried as soon
+                         as they are found in an agreement, and the report is the same.
+        :type parallel: int
         :returns: dict
         """
         report_data = {}
@@ -2634,9 +2713,14 @@ class ReplicationMonitor(object):
         try:
             report_data[initial_inst_key] = self._get_replica_status(self._instance, report_data, use_json, get_credentials)
         except ldap.LDAPError as e:
-            self._log.debug(f"Connection to consumer ({supplier_hostname}:{supplier_port}) failed, error: {e}")
+            self._log.debug(f"Connection to consumer ({initial_inst_key}) failed, error: {e}")
             report_data[initial_inst_key] = [{"replica_status": f"Unreachable - {e.args[0]['desc']}"}]
 
+        if parallel:
+            host_status = self._get_hosts_status(report_data, get_credentials, use_json, parallel)
+        else:
+            host_status = None
+
         # Check if at least some replica report on other instances was generated
         repl_exists = False
 
@@ -2649,38 +2733,27 @@ class ReplicationMonitor(object):
 
             del report_data[supplier]
             s_splitted = supplier.split(":")
-            supplier_hostname = s_splitted[0]
-            supplier_port = s_splitted[1]
-            supplier_protocol = s_splitted[2]
             supplier_hostport_only = ":".join(s_splitted[:2])
 
-            # The function should be defined outside and
-            # it should have all the logic for figuring out the credentials.
-            # It is done for flexibility purpuses between CLI, WebUI and lib389 API applications
-            credentials = get_credentials(supplier_hostname, supplier_port)
-            if not credentials["binddn"]:
-                report_data[supplier_hostport_only] = [{"replica_status": "Unavailable - Bind DN was not specified"}]
-                continue
-
-            # Open a connection to the consumer
-            supplier_inst = DirSrv(verbose=self._instance.verbose)
-            args_instance[SER_HOST] = supplier_hostname
-            if supplier_protocol == "ssl" or supplier_protocol == "ldaps":
-                args_instance[SER_SECURE_PORT] = int(supplier_port)
+            if host_status is not None:
+                # Already queried, replay it in the same order as the serial walk
+                future = host_status[supplier]
+                status, discovered = future.result()
             else:
-                args_instance[SER_PORT] = int(supplier_port)
-            args_instance[SER_ROOT_DN] = credentials["binddn"]
-            args_instance[SER_ROOT_PW] = credentials["bindpw"]
-            args_standalone = args_instance.copy()
-            supplier_inst.allocate(args_standalone)
-            try:
-                supplier_inst.open()
-            except ldap.LDAPError as e:
-                self._log.debug(f"Connection to consumer ({supplier_hostname}:{supplier_port}) failed, error: {e}")
-                report_data[supplier_hostport_only] = [{"replica_status": f"Unreachable - {e.args[0]['desc']}"}]
+                # The function should be defined outside and
+                # it should have all the logic for figuring out the credentials.
+                # It is done for flexibility purpuses between CLI, WebUI and lib389 API applications
+                credentials = get_credentials(s_splitted[0], s_splitted[1])
+                status, discovered = self._get_host_status(supplier, credentials, use_json)
+
+            if discovered is None:
+                # The host could not be queried
+                report_data[supplier_hostport_only] = status
                 continue
-
-            report_data[supplier_hostport_only] = self._get_replica_status(supplier_inst, report_data, use_json)
+            for consumer in discovered:
+                if ":".join(consumer.split(":")[:2]) not in report_data:
+                    report_data[consumer] = None
+            report_data[supplier_hostport_only] = status
             repl_exists = True
 
         # Get rid of the repeated items
@@ -2704,3 +2777,245 @@ class ReplicationMonitor(object):
                 report_data_final[key] = value
 
         return report_data_final
+
+
+# The size of the blocks read from the end of a lag samples file
+LAG_SAMPLES_READ_SIZE = 64 * 1024
+
+
+class ReplicationLagSampler(object):
+    """Poll the agreements of a replica at a fixed interval, and keep a time
+    series of the replication lag of each consumer.
+
+    The lag is the age of the supplier's max CSN that the consumer did not
+    receive yet: the difference between the timestamps of the supplier's own
+    max CSN and of the consumer's max CSN for the supplier's replica ID.
+
+    The last capacity samples of each agreement are kept in memory, and every
+    sample is appended to a file as a JSON line if a path is given, i.e.:
+
+        {"time": 1617000000.0, "agmt": "to-m2", "consumer": "m2.example.com:389",
+         "lag": 3, "supplier_csn": "...", "consumer_csn": "...", "status": "Error (0)"}
+
+    The lag is null when the consumer's max CSN could not be read.
+
+    :param instance: The supplier or hub
+    :type instance: lib389.DirSrv
+    :param suffix: The replicated suffix
+    :type suffix: str
+    :param interval: The number of seconds between two samples
+    :type interval: int
+    :param capacity: The number of samples of each agreement kept in memory
+    :type capacity: int
+    :param path: A file to append the samples to, or None
+    :type path: str
+    :param get_credentials: A callback with parameters (host, port) which returns a
+                            dictionary with binddn and bindpw keys, to read the
+                            consumers max CSN. By default the instance credentials
+                            are used.
+    :type get_credentials: function
+    :param logger: A logging interface
+    :type logger: python logging
+    """
+
+    def __init__(self, instance, suffix, interval=10, capacity=8640, path=None, get_credentials=None, logger=None):
+        self._instance = instance
+        self._suffix = suffix
+        self.interval = interval
+        self.capacity = capacity
+        self.path = path
+        self._get_credentials = get_credentials
+        if logger is not None:
+            self._log = logger
+        else:
+            self._log = logging.getLogger(__name__)
+        # agreement name -> deque of samples
+        self.samples = {}
+
+    @staticmethod
+    def _csn_time(csn):
+        if csn is None or not re.match(r'^[0-9a-fA-F]{8}', csn):
+            return None
+        return int(csn[:8], 16)
+
+    def sample(self):
+        """Take a sample of every agreement of the replica, record and return them
+
+        :returns: A list of sample dicts
+        """
+        now = time.time()
+        replica = Replicas(self._instance).get(self._suffix)
+        supplier_csn = replica.get_maxcsn()
+        supplier_time = self._csn_time(supplier_csn)
+        records = []
+        for agmt in replica.get_agreements().list():
+            attrs = agmt.get_attrs_vals_utf8(['cn', 'nsds5replicahost', 'nsds5replicaport',
+                                              'nsds5replicaLastUpdateStatus'])
+            name = attrs['cn'][0]
+            host = attrs['nsds5replicahost'][0]
+            port = attrs['nsds5replicaport'][0]
+            if self._get_credentials is not None:
+                credentials = self._get_credentials(host, port)
+            else:
+                credentials = {"binddn": self._instance.binddn, "bindpw": self._instance.bindpw}
+            try:
+                consumer_csn = agmt.get_consumer_maxcsn(binddn=credentials["binddn"], bindpw=credentials["bindpw"])
+            except ldap.LDAPError as e:
+                self._log.debug(f"Failed to get the max CSN of {host}:{port}: {e}")
+                consumer_csn = None
+            consumer_time = self._csn_time(consumer_csn)
+            lag = None
+            if supplier_time is not None and consumer_time is not None:
+                lag = max(supplier_time - consumer_time, 0)
+            status = None
+            if attrs['nsds5replicaLastUpdateStatus']:
+                status = attrs['nsds5replicaLastUpdateStatus'][0]
+                match = re.match(r'^(Error \(-?\d+\))', status)
+                if match:
+                    status = match.group(1)
+            records.append({"time": now,
+                            "agmt": name,
+                            "consumer": f"{host}:{port}",
+                            "lag": lag,
+                            "supplier_csn": supplier_csn,
+                            "consumer_csn": consumer_csn if consumer_time is not None else None,
+                            "status": status})
+        self.record(records)
+        return records
+
+    def record(self, records):
+        """Add samples to the in memory time series, and to the file
+
+        :param records: A list of sample dicts
+        :type records: list
+        """
+        for record in records:
+            series = self.samples.get(record["agmt"])
+            if series is None:
+                series = self.samples[record["agmt"]] = deque(maxlen=self.capacity)
+            series.append(record)
+        if self.path is not None and records:
+            with open(self.path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def run(self, count=None, callback=None):
+        """Take a sample every interval seconds
+
+        :param count: The number of samples to take, or None to run until interrupted
+        :type count: int
+        :param callback: A function called with the list of samples of every interval
+        :type callback: function
+        """
+        taken = 0
+        next_time = time.monotonic()
+        while count is None or taken < count:
+            records = self.sample()
+            taken += 1
+            if callback is not None:
+                callback(records)
+            if count is not None and taken >= count:
+                break
+            next_time += self.interval
+            time.sleep(max(next_time - time.monotonic(), 0))
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Summarise the samples kept in memory
+
+        :param percentiles: The percentiles of the lag to include
+        :type percentiles: tuple
+        :returns: A dict of agreement name to a summary dict
+        """
+        return summarize_lag_samples((r for series in self.samples.values() for r in series), percentiles)
+
+    @staticmethod
+    def _parse_sample(line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            # A partially written last line
+            return None
+
+    @staticmethod
+    def iter_samples(path):
+        """Stream the samples appended to a file
+
+        :param path: The file written by a sampler
+        :type path: str
+        :returns: A generator of sample dicts
+        """
+        with open(path, 'r') as f:
+            for line in f:
+                sample = ReplicationLagSampler._parse_sample(line)
+                if sample is not None:
+                    yield sample
+
+    @staticmethod
+    def read_samples(path, last=None):
+        """Read the samples appended to a file. When only the last samples
+        are wanted, the file is read backwards from its end.
+
+        :param path: The file written by a sampler
+        :type path: str
+        :param last: Only return the last samples
+        :type last: int
+        :returns: A list of sample dicts
+        """
+        if last is None:
+            return list(ReplicationLagSampler.iter_samples(path))
+        samples = []
+        with open(path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            partial = b''
+            while len(samples) < last and pos > 0:
+                size = min(pos, LAG_SAMPLES_READ_SIZE)
+                pos -= size
+                f.seek(pos)
+                lines = (f.read(size) + partial).split(b'\n')
+                # The first line may start in the previous block
+                partial = lines.pop(0) if pos > 0 else b''
+                for line in reversed(lines):
+                    sample = ReplicationLagSampler._parse_sample(line.decode('utf-8', errors='replace'))
+                    if sample is not None:
+                        samples.append(sample)
+                        if len(samples) >= last:
+                            break
+        samples.reverse()
+        return samples
+
+
+def summarize_lag_samples(samples, percentiles=(50, 90, 99)):
+    """Summarise replication lag samples by agreement
+
+    :param samples: An iterable of sample dicts, see ReplicationLagSampler
+    :type samples: iterable
+    :param percentiles: The percentiles of the lag to include
+    :type percentiles: tuple
+    :returns: A dict of agreement name to a dict with the consumer, the number
+              of samples, of unavailable samples, the first and last sample
+              times, the last lag and the lag distribution (min, max, mean and
+              percentiles, in seconds)
+    """
+    result = {}
+    histograms = {}
+    for sample in samples:
+        summary = result.get(sample["agmt"])
+        if summary is None:
+            summary = result[sample["agmt"]] = {"consumer": sample["consumer"], "samples": 0, "unavailable": 0,
+                                                "first": sample["time"], "last": sample["time"], "last_lag": None}
+            histograms[sample["agmt"]] = Histogram(scale=1)
+        summary["samples"] += 1
+        summary["first"] = min(summary["first"], sample["time"])
+        if sample["time"] >= summary["last"]:
+            summary["last"] = sample["time"]
+            summary["last_lag"] = sample["lag"]
+        if sample["lag"] is None:
+            summary["unavailable"] += 1
+        else:
+            histograms[sample["agmt"]].record(sample["lag"])
+    for name, summary in result.items():
+        summary["lag"] = histograms[name].summary(percentiles)
+    return result
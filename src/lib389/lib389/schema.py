@@ -10,10 +10,14 @@
    You will access this from:
    schema = Schema(instance)
 """
+import copy
 import glob
 import ldap
 import ldif
 import re
+import threading
+import time
+import weakref
 from itertools import count
 from json import dumps as dump_json
 from operator import itemgetter
@@ -67,6 +71,126 @@ ATTR_SYNTAXES = {"1.3.6.1.4.1.1466.115.121.1.5": "Binary",
 
 X_ORIGIN_REGEX = r'\'(.*?)\''
 
+SCHEMA_MODELS = (AttributeType, ObjectClass, MatchingRule)
+
+
+class _SchemaCache(object):
+    """The parsed schema of an instance at a given nsSchemaCSN, with the
+    indexes used by the Schema lookups.
+
+    The objects held here are never handed out: Schema returns copies, as
+    callers like _edit_schema_object() modify them.
+    """
+
+    def __init__(self, csn, values):
+        self.csn = csn
+        # The CSN of a schema update only has a one second resolution: two
+        # updates in the same second get the same CSN. The cache is only
+        # trusted if its CSN was at least that old when it was read.
+        self.trusted = False
+        if csn is not None and re.match(r'^[0-9a-fA-F]{8}', csn):
+            self.trusted = time.time() - int(csn[:8], 16) > 2
+        self._values = values
+        self._parsed = {}
+        self._objects = {}
+        self._json = {}
+        self._names = {}
+        self._must = None
+        self._may = None
+
+    def _parse(self, object_model):
+        # The objects of a model, in the order of the schema entry values
+        if object_model not in self._parsed:
+            self._parsed[object_model] = [object_model(value) for value in
+                                          self._values[object_model.schema_attribute]]
+        return self._parsed[object_model]
+
+    def objects(self, object_model):
+        """The objects of a model, sorted by names"""
+        if object_model not in self._objects:
+            self._objects[object_model] = sorted(self._parse(object_model), key=lambda x: x.names, reverse=False)
+        return self._objects[object_model]
+
+    def json_items(self, object_model):
+        """The objects of a model as the dicts of the JSON output, sorted by name"""
+        if object_model not in self._json:
+            items = []
+            for (obj, value) in zip(self._parse(object_model), self._values[object_model.schema_attribute]):
+                obj_i = dict(vars(obj))
+                if len(obj_i["names"]) == 1:
+                    obj_i['name'] = obj_i['names'][0].lower()
+                    obj_i['aliases'] = None
+                elif len(obj_i["names"]) > 1:
+                    obj_i['name'] = obj_i['names'][0].lower()
+                    obj_i['aliases'] = obj_i['names'][1:]
+                else:
+                    obj_i['name'] = ""
+
+                # Temporary workaround for X-ORIGIN in ObjectClass objects.
+                # It should be removed after https://github.com/python-ldap/python-ldap/pull/247 is merged
+                if " X-ORIGIN " in value:
+                    remainder = value.split(" X-ORIGIN ")[1]
+                    if remainder[:1] == "(":
+                        # Have multiple values
+                        end = remainder.rfind(')')
+                        vals = remainder[1:end]
+                        vals = re.findall(X_ORIGIN_REGEX, vals)
+                        # For now use the first value, but this should be a set (another bug in python-ldap)
+                        obj_i['x_origin'] = vals[0]
+                    else:
+                        # Single X-ORIGIN value
+                        obj_i['x_origin'] = remainder.split("'")[1]
+                items.append(obj_i)
+
+            items = sorted(items, key=itemgetter('name'))
+            # Ensure that the string values are in list so we can use React filter component with it
+            for obj_i in items:
+                for key, value in obj_i.items():
+                    if isinstance(value, str):
+                        obj_i[key] = (value, )
+            self._json[object_model] = items
+        return self._json[object_model]
+
+    def lookup(self, name, object_model, json=False):
+        """The objects of a model with this name, alias or OID"""
+        if (object_model, json) not in self._names:
+            if json:
+                entries = [(obj_i['names'], obj_i['oid'][0] if obj_i['oid'] else None, obj_i)
+                           for obj_i in self.json_items(object_model)]
+            else:
+                entries = [(obj.names, obj.oid, obj) for obj in self.objects(object_model)]
+            index = {}
+            for (names, oid, obj) in entries:
+                keys = set(n.lower() for n in names)
+                if oid:
+                    keys.add(oid.lower())
+                for key in keys:
+                    index.setdefault(key, []).append(obj)
+            self._names[(object_model, json)] = index
+        return self._names[(object_model, json)].get(name.lower(), [])
+
+    def objectclasses_with(self, attr_name):
+        """The objectclasses that must and may have an attribute name"""
+        if self._must is None:
+            must = {}
+            may = {}
+            for oc in self.objects(ObjectClass):
+                for attr in set(a.lower() for a in oc.must):
+                    must.setdefault(attr, []).append(oc)
+                for attr in set(a.lower() for a in oc.may):
+                    may.setdefault(attr, []).append(oc)
+            self._must = must
+            self._may = may
+        return self._must.get(attr_name.lower(), []), self._may.get(attr_name.lower(), [])
+
+
+# DirSrv -> _SchemaCache of its schema
+_schema_caches = weakref.WeakKeyDictionary()
+# DirSrv -> the schema reload tasks that may not be complete. A reload
+# does not change nsSchemaCSN, so nothing is cached until they complete.
+_schema_reloads = weakref.WeakKeyDictionary()
+_schema_caches_lock = threading.Lock()
+
 
 class Schema(DSLdapObject):
     """An object that represents the schema entry
@@ -116,62 +240,52 @@ class Schema(DSLdapObject):
             result = ATTR_SYNTAXES
         return result
 
-    def _get_schema_objects(self, object_model, json=False):
+    def _get_cache(self):
+        """Get the parsed schema, it is downloaded again only when the
+        nsSchemaCSN changed since the last download.
+        """
+        csn = self.get_schema_csn()
+        with _schema_caches_lock:
+            cache = _schema_caches.get(self._instance)
+            reloads = _schema_reloads.get(self._instance, [])
+        if reloads:
+            reloads = [task for task in reloads if not task.is_complete()]
+            with _schema_caches_lock:
+                _schema_reloads[self._instance] = reloads
+        if cache is not None and cache.trusted and cache.csn == csn and not reloads:
+            return cache
+        attrs = [model.schema_attribute for model in SCHEMA_MODELS] + ['nsSchemaCSN']
+        values = self.get_attrs_vals_utf8(attrs)
+        values = {attr: values.get(attr, []) for attr in attrs}
+        csn = values['nsSchemaCSN'][0] if values['nsSchemaCSN'] else None
+        cache = _SchemaCache(csn, values)
+        if not reloads:
+            with _schema_caches_lock:
+                _schema_caches[self._instance] = cache
+        return cache
+
+    def _invalidate_cache(self):
+        with _schema_caches_lock:
+            _schema_caches.pop(self._instance, None)
+
+    def _get_schema_objects(self, object_model, json=False, cache=None):
         """Get all the schema objects for a specific model: Attribute, Objectclass,
         or Matchingreule.
         """
-        attr_name = self._get_attr_name_by_model(object_model)
-        results = self.get_attr_vals_utf8(attr_name)
+        self._get_attr_name_by_model(object_model)
+        if cache is None:
+            cache = self._get_cache()
 
         if json:
-            object_insts = []
-            for obj in results:
-                obj_i = vars(object_model(obj))
-                if len(obj_i["names"]) == 1:
-                    obj_i['name'] = obj_i['names'][0].lower()
-                    obj_i['aliases'] = None
-                elif len(obj_i["names"]) > 1:
-                    obj_i['name'] = obj_i['names'][0].lower()
-                    obj_i['aliases'] = obj_i['names'][1:]
-                else:
-                    obj_i['name'] = ""
-
-                # Temporary workaround for X-ORIGIN in ObjectClass objects.
-                # It should be removed after https://github.com/python-ldap/python-ldap/pull/247 is merged
-                if " X-ORIGIN " in obj and obj_i['names'] == vars(object_model(obj))['names']:
-                    remainder = obj.split(" X-ORIGIN ")[1]
-                    if remainder[:1] == "(":
-                        # Have multiple values
-                        end = remainder.rfind(')')
-                        vals = remainder[1:end]
-                        vals = re.findall(X_ORIGIN_REGEX, vals)
-                        # For now use the first value, but this should be a set (another bug in python-ldap)
-                        obj_i['x_origin'] = vals[0]
-                    else:
-                        # Single X-ORIGIN value
-                        obj_i['x_origin'] = obj.split(" X-ORIGIN ")[1].split("'")[1]
-                object_insts.append(obj_i)
-
-            object_insts = sorted(object_insts, key=itemgetter('name'))
-            # Ensure that the string values are in list so we can use React filter component with it
-            for obj_i in object_insts:
-                for key, value in obj_i.items():
-                    if isinstance(value, str):
-                        obj_i[key] = (value, )
-
-            return {'type': 'list', 'items': object_insts}
+            return {'type': 'list', 'items': [dict(obj_i) for obj_i in cache.json_items(object_model)]}
         else:
-            object_insts = [object_model(obj_i) for obj_i in results]
-            return sorted(object_insts, key=lambda x: x.names, reverse=False)
+            return [copy.copy(obj_i) for obj_i in cache.objects(object_model)]
 
-    def _get_schema_object(self, name, object_model, json=False):
-        objects = self._get_schema_objects(object_model, json=json)
-        if json:
-            schema_object = [obj_i for obj_i in objects["items"] if name.lower() in
-                             list(map(str.lower, obj_i["names"]))]
-        else:
-            schema_object = [obj_i for obj_i in objects if name.lower() in
-                             list(map(str.lower, obj_i.names))]
+    def _get_schema_object(self, name, object_model, json=False, cache=None):
+        self._get_attr_name_by_model(object_model)
+        if cache is None:
+            cache = self._get_cache()
+        schema_object = cache.lookup(name, object_model, json=json)
 
         if len(schema_object) != 1:
             # This is an error.
@@ -180,7 +294,9 @@ class Schema(DSLdapObject):
             else:
                 return None
 
-        return schema_object[0]
+        if json:
+            return dict(schema_object[0])
+        return copy.copy(schema_object[0])
 
     def _add_schema_object(self, parameters, object_model):
         attr_name = self._get_attr_name_by_model(object_model)
@@ -222,12 +338,14 @@ class Schema(DSLdapObject):
             if k == "x_origin" and v is None:
                 continue
             setattr(schema_object, k, OBJECT_MODEL_PARAMS[object_model][k])
+        self._invalidate_cache()
         return self.add(attr_name, str(schema_object))
 
     def _remove_schema_object(self, name, object_model):
         attr_name = self._get_attr_name_by_model(object_model)
         schema_object = self._get_schema_object(name, object_model)
 
+        self._invalidate_cache()
         return self.remove(attr_name, str(schema_object))
 
     def _edit_schema_object(self, name, parameters, object_model):
@@ -274,6 +392,7 @@ class Schema(DSLdapObject):
         if schema_object_str == schema_object_str_old:
             raise ValueError('Schema is already in the required state. Nothing to change')
 
+        self._invalidate_cache()
         self.remove(attr_name, schema_object_str_old)
         return self.add(attr_name, schema_object_str)
 
@@ -287,6 +406,9 @@ class Schema(DSLdapObject):
             task_properties['schemadir'] = schema_dir
 
         task.create(properties=task_properties)
+        with _schema_caches_lock:
+            _schema_reloads.setdefault(self._instance, []).append(task)
+        self._invalidate_cache()
 
         return task
 
@@ -484,11 +606,10 @@ class Schema(DSLdapObject):
          [<ldap.schema.models.ObjectClass instance>, ...] )
         """
 
-        # First, get the attribute that matches name. We need to consider
-        # alternate names. There is no way to search this, so we have to
-        # filter our set of all attribute types.
-        attributetype = self._get_schema_object(attributetypename, AttributeType, json=json)
-        objectclasses = self.get_objectclasses()
+        # First, get the attribute that matches name, alternate names
+        # included, then the objectclasses that have one of its names.
+        cache = self._get_cache()
+        attributetype = self._get_schema_object(attributetypename, AttributeType, json=json, cache=cache)
 
         # Get the primary name of this attribute
         if json:
@@ -496,16 +617,12 @@ class Schema(DSLdapObject):
         else:
             attributetypenames = attributetype.names
 
-        # Build a set if they have may.
         may = []
-        for attributetypename in attributetypenames:
-            may.extend([oc for oc in objectclasses if attributetypename.lower() in
-                        list(map(str.lower, oc.may))])
-        # Build a set if they have must.
         must = []
         for attributetypename in attributetypenames:
-            must.extend([oc for oc in objectclasses if attributetypename.lower() in
-                         list(map(str.lower, oc.must))])
+            (oc_must, oc_may) = cache.objectclasses_with(attributetypename)
+            may.extend([copy.copy(oc) for oc in oc_may])
+            must.extend([copy.copy(oc) for oc in oc_must])
 
         if json:
             # convert Objectclass class to dict, then sort each list
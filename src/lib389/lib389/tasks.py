@@ -6,13 +6,16 @@
 # See LICENSE for details.
 # --- END COPYRIGHT BLOCK ---
 
+import re
 import time
 import os.path
 import ldap
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+from ldap.controls.psearch import PersistentSearchControl, EntryChangeNotificationControl, CHANGE_TYPES_INT
 from lib389 import Entry
 from lib389._mapped_object import DSLdapObject
-from lib389.utils import ensure_str
+from lib389.utils import ensure_str, ensure_list_str
 from lib389.exceptions import Error
 from lib389._constants import *
 from lib389.properties import (
@@ -20,6 +23,28 @@ from lib389.properties import (
         TASK_TOMB_STRIP
         )
 
+# The attributes read to know if a task is complete
+TASK_STATUS_ATTRS = ['nsTaskStatus', 'nsTaskExitCode', 'nsTaskLog', 'nsTaskWarning']
+
+# The attributes read to follow the progress of a task
+TASK_PROGRESS_ATTRS = TASK_STATUS_ATTRS + ['nsTaskCurrentItem', 'nsTaskTotalItems']
+
+# The bounds of the delay between two reads of a task entry, when a
+# persistent search can't be used
+TASK_POLL_MIN_DELAY = 0.05
+TASK_POLL_MAX_DELAY = 2
+
+# The delay between two checks of the persistent search results, when
+# several tasks are watched together
+TASK_PSEARCH_DELAY = 0.1
+
+# The period, in seconds, counted by the timeout of Task.wait()
+TASK_WAIT_PERIOD = 2
+
+# The default number of seconds to wait for tasks (the default of
+# Task.wait(), 120 periods)
+TASK_WAIT_TIMEOUT = 240
+
 
 class Task(DSLdapObject):
     """A single instance of a task entry
@@ -39,27 +64,48 @@ class Task(DSLdapObject):
         self._exit_code = None
         self._task_log = ""
         self._task_warn = None
+        self._task_status = None
 
     def status(self):
         """Return the decoded status of the task
         """
         return self.get_attr_val_utf8('nsTaskStatus')
 
-    def is_complete(self):
-        """Return True if task is complete, else False."""
+    def _set_status(self, attrs):
+        """Update the task status from the values of TASK_STATUS_ATTRS
 
-        self._exit_code = self.get_attr_val_utf8("nsTaskExitCode")
-        self._task_log = self.get_attr_val_utf8("nsTaskLog")
-        self._task_warn = self.get_attr_val_utf8("nsTaskWarning")
-        if not self.exists():
-            self._log.debug("complete: task has self cleaned ...")
-            # The task cleaned it self up.
-            return True
-        elif self._exit_code is not None:
-            self._log.debug("complete status: %s -> %s" % (self._exit_code, self.status()))
+        :param attrs: A dict of attribute name to list of str values
+        :type attrs: dict
+        :returns: True if the task is complete
+        """
+        vals = {k.lower(): v[0] if v else None for (k, v) in attrs.items()}
+        self._task_status = vals.get('nstaskstatus')
+        self._exit_code = vals.get('nstaskexitcode')
+        self._task_log = vals.get('nstasklog')
+        self._task_warn = vals.get('nstaskwarning')
+        if self._exit_code is not None:
+            self._log.debug("complete status: %s -> %s" % (self._exit_code, self._task_status))
             return True
         return False
 
+    def _fetch_status(self):
+        """Read the task status with a single search
+
+        :returns: True if the task is complete
+        """
+        try:
+            attrs = self.get_attrs_vals_utf8(TASK_STATUS_ATTRS)
+        except ldap.NO_SUCH_OBJECT:
+            # The task cleaned it self up.
+            self._log.debug("complete: task has self cleaned ...")
+            return True
+        return self._set_status(attrs)
+
+    def is_complete(self):
+        """Return True if task is complete, else False."""
+
+        return self._fetch_status()
+
     def get_exit_code(self):
         """Return task's exit code if task is complete, else None."""
 
@@ -88,18 +134,135 @@ class Task(DSLdapObject):
                 return None
         return None
 
-    def wait(self, timeout=120):
-        """Wait until task is complete."""
+    def wait(self, timeout=120, psearch=True, timeout_secs=None):
+        """Wait until task is complete.
+
+        The task entry is watched with a persistent search, so the wait ends
+        as soon as the server sets the exit code. If the persistent search
+        is refused, the entry is read again after a delay that doubles up
+        to TASK_POLL_MAX_DELAY seconds.
+
+        :param timeout: The number of TASK_WAIT_PERIOD (2 seconds) periods
+                        to wait, or None to wait until the task is complete
+        :type timeout: int
+        :param psearch: Use a persistent search
+        :type psearch: bool
+        :param timeout_secs: The number of seconds to wait, instead of timeout
+        :type timeout_secs: int
+        :returns: True if the task is complete, False if the timeout expired
+        """
 
-        count = 0
-        if timeout is None:
+        if timeout_secs is None and timeout is not None:
+            timeout_secs = timeout * TASK_WAIT_PERIOD
+        if timeout_secs is None:
             self._log.debug("No timeout is set, this may take a long time ...")
+        return not wait_tasks([self], timeout_secs, psearch)
 
-        while timeout is None or count < timeout:
-            if self.is_complete():
-                break
-            count = count + 1
-            time.sleep(2)
+    def _watch_status(self, attrlist, deadline, psearch=True, interval=1):
+        """Yield the values of attrlist when the task entry changes, as a
+        dict of attribute name to list of str values, or None when the entry
+        was deleted. With a persistent search the entry is returned first,
+        and then on every change. Else it is read every interval seconds.
+        """
+        if psearch:
+            msgid = None
+            controls = [PersistentSearchControl(criticality=True, changeTypes=['modify', 'delete'],
+                                                changesOnly=False, returnECs=True)]
+            if self._server_controls is not None:
+                controls += self._server_controls
+            try:
+                msgid = self._instance.search_ext(self._dn, ldap.SCOPE_BASE, '(objectClass=*)', attrlist=attrlist,
+                                                  serverctrls=controls, escapehatch='i am sure')
+                while msgid is not None:
+                    if deadline is None:
+                        timeout = -1
+                    else:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            return
+                    try:
+                        rtype, rdata, rmsgid, rctrls = self._instance.result4(
+                            msgid, all=0, timeout=timeout, add_ctrls=1,
+                            resp_ctrl_classes={EntryChangeNotificationControl.controlType: EntryChangeNotificationControl},
+                            escapehatch='i am sure')
+                    except ldap.TIMEOUT:
+                        return
+                    except ldap.NO_SUCH_OBJECT:
+                        msgid = None
+                        yield None
+                        return
+                    if rtype == ldap.RES_SEARCH_RESULT:
+                        # The server ended the search, poll the entry instead
+                        msgid = None
+                        break
+                    if rtype != ldap.RES_SEARCH_ENTRY:
+                        continue
+                    for (dn, attrs, ctrls) in rdata:
+                        yield {k: ensure_list_str(v) for (k, v) in attrs.items()}
+                        if any(c.changeType == CHANGE_TYPES_INT['delete'] for c in ctrls
+                               if isinstance(c, EntryChangeNotificationControl)):
+                            return
+            except ldap.LDAPError as e:
+                self._log.debug("Persistent search on the task failed, polling it: %s" % e)
+            finally:
+                if msgid is not None:
+                    self._instance.abandon(msgid)
+
+        while True:
+            try:
+                yield self.get_attrs_vals_utf8(attrlist)
+            except ldap.NO_SUCH_OBJECT:
+                yield None
+                return
+            if deadline is None:
+                time.sleep(interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                time.sleep(min(interval, remaining))
+
+    def progress(self, interval=1, timeout=None, psearch=True, total=None):
+        """Follow the progress of the task until it is complete, i.e.:
+
+            for progress in task.progress():
+                for line in progress.lines:
+                    print(line)
+                print(progress)
+
+        The same TaskProgress is updated and yielded when the task entry
+        changes (with a persistent search), or every interval seconds.
+
+        :param interval: The number of seconds between two reads of the task
+                         entry, when a persistent search can't be used
+        :type interval: int
+        :param timeout: The number of seconds to follow the task, or None to
+                        follow it until it is complete
+        :type timeout: int
+        :param psearch: Use a persistent search
+        :type psearch: bool
+        :param total: The expected number of entries, to compute the ETA of
+                      tasks that don't report a percentage (i.e. an import)
+        :type total: int
+        :returns: A generator of TaskProgress
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        progress = TaskProgress(total=total)
+        for attrs in self._watch_status(TASK_PROGRESS_ATTRS, deadline, psearch, interval):
+            if attrs is None:
+                # The task cleaned it self up.
+                progress.update(complete=True)
+                yield progress
+                return
+            complete = self._set_status(attrs)
+            vals = {k.lower(): v[0] if v else None for (k, v) in attrs.items()}
+            progress.update(log=vals.get('nstasklog'), status=vals.get('nstaskstatus'),
+                            current_item=vals.get('nstaskcurrentitem'), total_items=vals.get('nstasktotalitems'),
+                            exit_code=vals.get('nstaskexitcode'), complete=complete)
+            yield progress
+            if complete:
+                return
 
     def create(self, rdn=None, properties={}, basedn=None):
         """Create a Task entry
@@ -124,6 +287,276 @@ class Task(DSLdapObject):
         return datetime.now().isoformat()
 
 
+def _psearch_tasks(instance, pending, deadline):
+    """Wait for the completion of tasks of an instance, with one persistent
+    search on each task entry. The complete tasks are removed from pending.
+
+    Returns when all the tasks are complete, on timeout, or when the server
+    ended all the persistent searches.
+    """
+    searches = {}
+    try:
+        for task in pending:
+            # Not changes only: the current entry is returned first, so a
+            # task completed before the search started is not missed.
+            controls = [PersistentSearchControl(criticality=True, changeTypes=['modify', 'delete'],
+                                                changesOnly=False, returnECs=True)]
+            if task._server_controls is not None:
+                controls += task._server_controls
+            msgid = instance.search_ext(task.dn, ldap.SCOPE_BASE, '(objectClass=*)', attrlist=TASK_STATUS_ATTRS,
+                                        serverctrls=controls, escapehatch='i am sure')
+            searches[msgid] = task
+        while searches:
+            # The results are read search by search: the connection is shared
+            # with the caller, so the results of its other asynchronous
+            # operations must be left to it
+            received = False
+            for msgid in list(searches):
+                task = searches[msgid]
+                if len(searches) > 1:
+                    # Don't block on a search while the others may have results
+                    timeout = 0
+                elif deadline is None:
+                    timeout = -1
+                else:
+                    timeout = max(deadline - time.monotonic(), 0)
+                try:
+                    rtype, rdata, rmsgid, rctrls = instance.result4(
+                        msgid, all=0, timeout=timeout, add_ctrls=1,
+                        resp_ctrl_classes={EntryChangeNotificationControl.controlType: EntryChangeNotificationControl},
+                        escapehatch='i am sure')
+                except ldap.TIMEOUT:
+                    continue
+                except ldap.NO_SUCH_OBJECT:
+                    # The task cleaned it self up before the search.
+                    del searches[msgid]
+                    pending.remove(task)
+                    received = True
+                    continue
+                if rtype is None:
+                    continue
+                received = True
+                if rtype == ldap.RES_SEARCH_RESULT:
+                    # The server ended this search, the task is polled instead
+                    del searches[msgid]
+                    continue
+                if rtype != ldap.RES_SEARCH_ENTRY:
+                    continue
+                for (dn, attrs, ctrls) in rdata:
+                    deleted = any(c.changeType == CHANGE_TYPES_INT['delete'] for c in ctrls
+                                  if isinstance(c, EntryChangeNotificationControl))
+                    complete = task._set_status({k: ensure_list_str(v) for (k, v) in attrs.items()})
+                    if complete or deleted:
+                        instance.abandon(msgid)
+                        del searches[msgid]
+                        pending.remove(task)
+                        break
+            if not searches:
+                return
+            if deadline is not None and deadline - time.monotonic() <= 0:
+                return
+            if not received and len(searches) > 1:
+                if deadline is None:
+                    time.sleep(TASK_PSEARCH_DELAY)
+                else:
+                    time.sleep(min(TASK_PSEARCH_DELAY, max(deadline - time.monotonic(), 0)))
+    finally:
+        for msgid in searches:
+            instance.abandon(msgid)
+
+
+def wait_tasks(tasks, timeout=TASK_WAIT_TIMEOUT, psearch=True):
+    """Wait until several tasks are complete, i.e.:
+
+        tasks = [task.reindex(...) for ...]
+        incomplete = wait_tasks(tasks, timeout=600)
+
+    The tasks are watched together, with persistent searches sent on a
+    single connection to each instance. If the server refuses them, the
+    task entries are read again after a delay that doubles up to
+    TASK_POLL_MAX_DELAY seconds.
+
+    :param tasks: The tasks to wait for
+    :type tasks: list of Task
+    :param timeout: The number of seconds to wait, or None to wait until all the tasks are complete
+    :type timeout: int
+    :param psearch: Use persistent searches
+    :type psearch: bool
+    :returns: The list of the tasks that are not complete when the timeout expired
+    """
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = list(tasks)
+    if psearch:
+        by_instance = {}
+        for task in pending:
+            by_instance.setdefault(id(task._instance), []).append(task)
+        pending = []
+        for instance_tasks in by_instance.values():
+            instance = instance_tasks[0]._instance
+            try:
+                _psearch_tasks(instance, instance_tasks, deadline)
+            except ldap.LDAPError as e:
+                instance.log.debug("Persistent search on the tasks failed, polling them: %s" % e)
+            pending += instance_tasks
+
+    delay = TASK_POLL_MIN_DELAY
+    while True:
+        pending = [task for task in pending if not task._fetch_status()]
+        if not pending:
+            break
+        if deadline is None:
+            time.sleep(delay)
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+        delay = min(delay * 2, TASK_POLL_MAX_DELAY)
+    # Keep the order of the caller
+    return [task for task in tasks if task in pending]
+
+
+class TaskProgress(object):
+    """The progress of a task: the new lines of its log, the number of
+    entries processed, the throughput and the estimated time to completion.
+
+    The number of entries and the percentage come from the last task log
+    line or status like "Processed 1000 entries (10%)" or "Indexed 1000
+    entries (10%)", and else from nsTaskCurrentItem/nsTaskTotalItems.
+    The throughput is measured over the last window seconds.
+
+    :param total: The expected number of entries, or None
+    :type total: int
+    :param window: The number of seconds the throughput is measured over
+    :type window: int
+    """
+
+    _counter_re = re.compile(r'(?:Processed|Indexed) (\d+) entries(?:.*?\((\d+)%\))?')
+
+    def __init__(self, total=None, window=60):
+        self.total = total
+        self.window = window
+        self.start = time.monotonic()
+        self.lines = []
+        self.status = None
+        self.entries = None
+        self.percent = None
+        self.current_item = None
+        self.total_items = None
+        self.exit_code = None
+        self.complete = False
+        self.rate = None
+        self.eta = None
+        self._log = None
+        self._log_percent = None
+        # (time, entries) samples of the last window seconds
+        self._samples = deque()
+
+    @property
+    def elapsed(self):
+        """The number of seconds since the progress is followed"""
+        return time.monotonic() - self.start
+
+    @staticmethod
+    def _new_lines(old, new):
+        # The server drops the first half of the log when it grows too big,
+        # find where the old lines end in the new log.
+        new_lines = new.splitlines()
+        if not old:
+            return new_lines
+        if new.startswith(old):
+            return new[len(old):].lstrip('\n').splitlines()
+        old_lines = old.splitlines()
+        for start in range(len(old_lines)):
+            overlap = len(old_lines) - start
+            if old_lines[start] == new_lines[0] and new_lines[:overlap] == old_lines[start:]:
+                return new_lines[overlap:]
+        return new_lines
+
+    def update(self, log=None, lines=None, status=None, current_item=None, total_items=None,
+               exit_code=None, complete=False):
+        """Update the progress with new task values
+
+        :param log: The whole task log (nsTaskLog), the new lines are found by
+                    comparing it with the previous one
+        :type log: str
+        :param lines: New log lines, i.e. the output of an offline task
+        :type lines: list
+        :param status: The task status (nsTaskStatus)
+        :type status: str
+        :param current_item: nsTaskCurrentItem
+        :type current_item: int
+        :param total_items: nsTaskTotalItems
+        :type total_items: int
+        :param exit_code: nsTaskExitCode
+        :type exit_code: int
+        :param complete: The task is complete
+        :type complete: bool
+        """
+        now = time.monotonic()
+        self.lines = list(lines or [])
+        if log is not None:
+            self.lines += self._new_lines(self._log, log)
+            self._log = log
+        if status is not None:
+            self.status = status
+        if current_item is not None:
+            self.current_item = int(current_item)
+        if total_items is not None:
+            self.total_items = int(total_items)
+        if exit_code is not None:
+            self.exit_code = int(exit_code)
+        self.complete = complete
+
+        for text in reversed(self.lines + [self.status or '']):
+            match = self._counter_re.search(text)
+            if match:
+                self.entries = int(match.group(1))
+                if match.group(2) is not None:
+                    self._log_percent = int(match.group(2))
+                break
+        if self.total and self.entries is not None:
+            self.percent = min(self.entries * 100 // self.total, 100)
+        elif self._log_percent is not None:
+            self.percent = self._log_percent
+        elif self.total_items and self.total_items > 1 and self.current_item is not None:
+            self.percent = self.current_item * 100 // self.total_items
+
+        self.rate = None
+        self.eta = None
+        if self.entries is not None:
+            if not self._samples or self._samples[-1][1] != self.entries:
+                self._samples.append((now, self.entries))
+            while len(self._samples) > 2 and now - self._samples[1][0] > self.window:
+                self._samples.popleft()
+            (first_time, first_entries) = self._samples[0]
+            if now > first_time and self.entries > first_entries:
+                self.rate = (self.entries - first_entries) / (now - first_time)
+            if self.rate and self.percent:
+                expected = self.total or self.entries * 100 / self.percent
+                self.eta = max(expected - self.entries, 0) / self.rate
+        if self.complete:
+            self.eta = 0
+
+    def __str__(self):
+        parts = []
+        if self.entries is not None:
+            parts.append("%d entries" % self.entries)
+        elif self.total_items and self.total_items > 1:
+            parts.append("item %s/%s" % (self.current_item, self.total_items))
+        if self.percent is not None:
+            parts.append("%d%%" % self.percent)
+        if self.rate is not None:
+            parts.append("%.1f entries/sec" % self.rate)
+        if self.eta is not None and not self.complete:
+            parts.append("ETA %s" % timedelta(seconds=int(self.eta)))
+        parts.append("elapsed %s" % timedelta(seconds=int(self.elapsed)))
+        if self.complete:
+            parts.append("complete" if self.exit_code is None else "complete (exit code %d)" % self.exit_code)
+        return " - ".join(parts)
+
+
 class AutomemberRebuildMembershipTask(Task):
     """A single instance of automember rebuild membership task entry
 
@@ -445,19 +878,16 @@ class Tasks(object):
         exitCode = 0
         warningCode = 0
         dn = entry.dn
-        while not done:
-            entry = self.conn.getEntry(dn, attrlist=attrlist)
-            self.log.debug("task entry %r", entry)
-
-            if entry.nsTaskWarning:
-                warningCode = int(entry.nsTaskWarning)
-            if entry.nsTaskExitCode:
-                exitCode = int(entry.nsTaskExitCode)
-                done = True
-            if dowait:
-                time.sleep(1)
-            else:
-                break
+        if dowait:
+            Task(self.conn, dn).wait(timeout=None)
+        entry = self.conn.getEntry(dn, attrlist=attrlist)
+        self.log.debug("task entry %r", entry)
+
+        if entry.nsTaskWarning:
+            warningCode = int(entry.nsTaskWarning)
+        if entry.nsTaskExitCode:
+            exitCode = int(entry.nsTaskExitCode)
+            done = True
         return (done, exitCode, warningCode)
 
     def importLDIF(self, suffix=None, benamebase=None, input_file=None,
@@ -0,0 +1,149 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+
+import os
+import time
+import pytest
+
+from lib389.aci import AciModel
+
+SUFFIX = 'dc=example,dc=com'
+PEOPLE = 'ou=people,dc=example,dc=com'
+ADMINS = 'cn=admins,ou=groups,dc=example,dc=com'
+
+ACIS = [
+    (SUFFIX, [
+        '(targetattr!="userPassword")(version 3.0; acl "Anonymous read"; allow (read, search, compare) '
+        'userdn="ldap:///anyone";)',
+        '(targetattr="userPassword")(version 3.0; acl "No password read"; deny (read, search, compare) '
+        'userdn="ldap:///anyone";)',
+        '(targetattr="cn || sn")(version 3.0; acl "Admins write"; allow (write) '
+        f'groupdn="ldap:///{ADMINS}";)',
+    ]),
+    (PEOPLE, [
+        # Redundant with "Anonymous read"
+        '(targetattr="mail")(version 3.0; acl "Mail read"; allow (read) userdn="ldap:///anyone";)',
+        # Shadowed by "No password read"
+        '(targetattr="userPassword")(version 3.0; acl "Self password read"; allow (read) '
+        'userdn="ldap:///self";)',
+        '(targetattr="telephoneNumber")(targetscope="onelevel")(version 3.0; acl "Self write"; '
+        'allow (write) userdn="ldap:///self" and ip="10.0.0.*";)',
+        '(target="ldap:///uid=*,ou=people,dc=example,dc=com")(targetattr="description")'
+        '(version 3.0; acl "Manager write"; allow (write) userattr="manager#USERDN";)',
+        'this is not an aci',
+    ]),
+]
+
+
+@pytest.fixture
+def model():
+    return AciModel(ACIS)
+
+
+def _names(results):
+    return [aci.name for (aci, rule, match) in results]
+
+
+def test_aci_model_compile(model):
+    """Check that the acis are parsed into their parts, and that the invalid
+    ones are reported
+    """
+    assert len(model) == 7
+    assert len(model.invalid) == 1
+    aci = model.acis[5]
+    assert aci.targetscope == 'onelevel'
+    assert aci.attrs == frozenset(['telephonenumber'])
+    assert aci.rules[0].effect == 'allow'
+    assert aci.rules[0].rights == frozenset(['write'])
+    assert aci.rules[0].tree[0] == 'and'
+    assert model.acis[6].target_patterns
+
+
+def test_aci_model_query(model):
+    """Check the acis that apply to an entry, an attribute and an identity"""
+    user = f'uid=jdoe,{PEOPLE}'
+    assert _names(model.query(dn=SUFFIX)) == ['Anonymous read', 'No password read', 'Admins write']
+    assert 'Self write' in _names(model.query(dn=user))
+    assert 'Self write' not in _names(model.query(dn=PEOPLE))
+    assert _names(model.query(dn=user, attr='mail')) == ['Anonymous read', 'Mail read']
+    assert _names(model.query(attr='CN', binddn='')) == ['Anonymous read']
+    assert _names(model.query(attr='cn', binddn=user, groups=[ADMINS], rights=['write'])) == ['Admins write']
+    assert _names(model.query(attr='cn', binddn=user, groups=[], rights=['write'])) == []
+
+    # The conditions that are not known offline are reported as such
+    results = model.query(dn=user, attr='telephoneNumber', binddn=user, rights=['write'])
+    assert [(aci.name, match) for (aci, rule, match) in results] == [('Self write', None)]
+    results = model.query(dn=user, attr='telephoneNumber', binddn=f'uid=other,{PEOPLE}', rights=['write'])
+    assert results == []
+
+
+def test_aci_model_access(model):
+    """Check the access worked out from the acis alone"""
+    user = f'uid=jdoe,{PEOPLE}'
+    assert model.access(user, 'mail', '', 'read') is True
+    assert model.access(user, 'userPassword', user, 'read') is False
+    assert model.access(user, 'cn', user, 'write', groups=[]) is False
+    assert model.access(user, 'cn', user, 'write', groups=[ADMINS]) is True
+    assert model.access(user, 'cn', user, 'write') is None
+    assert model.access(user, 'description', user, 'write') is None
+
+
+def test_aci_model_lint(model):
+    """Check that redundant and shadowed acis are detected"""
+    redundant = [(aci.name, [c.name for c in covering]) for (aci, covering) in model.redundant()]
+    assert redundant == [('Mail read', ['Anonymous read'])]
+    shadowed = [(aci.name, [c.name for c in covering]) for (aci, covering) in model.shadowed()]
+    assert shadowed == [('Self password read', ['No password read'])]
+
+    # Of two identical acis, only the second one is redundant
+    duplicate = AciModel([(SUFFIX, [ACIS[0][1][2]]), (SUFFIX, [ACIS[0][1][2]])])
+    assert [aci.index for (aci, covering) in duplicate.redundant()] == [1]
+
+
+def test_aci_model_scale():
+    """Check that the queries do not check all the acis"""
+    entries = []
+    for i in range(20000):
+        entries.append((f'ou=unit{i},{SUFFIX}', [
+            f'(targetattr="attr{i % 100}")(version 3.0; acl "acl{i}"; allow (read) '
+            f'userdn="ldap:///uid=user{i},{PEOPLE}";)']))
+    model = AciModel(entries)
+    start = time.monotonic()
+    for i in range(1000):
+        results = model.query(dn=f'uid=x,ou=unit{i},{SUFFIX}', attr=f'attr{i % 100}',
+                              binddn=f'uid=user{i},{PEOPLE}')
+        assert _names(results) == [f'acl{i}']
+    assert time.monotonic() - start < 5
+    assert model.redundant() == []
+
+
+def test_aci_model_lint_sibling_entries():
+    """Check that an aci does not cover the acis of a sibling entry, even
+    when its target is above its own entry
+    """
+    groups = 'ou=groups,dc=example,dc=com'
+    model = AciModel([
+        (PEOPLE, [f'(target="ldap:///{SUFFIX}")(targetattr="*")(version 3.0; acl "People all"; '
+                  'allow (all) userdn="ldap:///anyone";)']),
+        (groups, ['(targetattr="cn")(version 3.0; acl "Groups read"; allow (read) userdn="ldap:///anyone";)']),
+    ])
+    people_all = model.acis[0]
+    assert people_all.applies_to_dn(tuple(f'cn=x,{groups}'.split(','))) is False
+    assert model.redundant() == []
+    assert model.shadowed() == []
+
+    # Below its own entry, the aci still covers the other ones
+    model.add_entry(f'ou=staff,{PEOPLE}', ['(targetattr="cn")(version 3.0; acl "Staff read"; '
+                                            'allow (read) userdn="ldap:///anyone";)'])
+    redundant = [(aci.name, [c.name for c in covering]) for (aci, covering) in model.redundant()]
+    assert redundant == [('Staff read', ['People all'])]
+
+
+if __name__ == "__main__":
+    CURRENT_FILE = os.path.realpath(__file__)
+    pytest.main("-s -vv %s" % CURRENT_FILE)
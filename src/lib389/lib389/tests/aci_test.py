@@ -112,11 +112,47 @@ def test_aci_lint(topology, complex_aci):
     assert (result is False)
     # print(topology.standalone.aci.format_lint(detail))
 
+    # The default acis and complex_aci are neither redundant (DSALE0003)
+    # nor shadowed (DSALE0004)
     assert(len(detail) == 2)
     assert (detail[0]['dsale'] == 'DSALE0001')
     assert (detail[1]['dsale'] == 'DSALE0002')
     # Check all the results
 
+
+def test_aci_lint_redundant_shadowed(topology):
+    """Checks that redundant and shadowed acis are reported"""
+
+    ACI_READ = ('(targetattr="cn || sn || mail")(version 3.0; acl "Anyone read"; '
+                'allow (read, search) userdn="ldap:///anyone";)')
+    # Covered by "Anyone read"
+    ACI_MAIL_READ = ('(targetattr="mail")(version 3.0; acl "Anyone mail read"; '
+                     'allow (read) userdn="ldap:///anyone";)')
+    ACI_DENY = ('(targetattr="userPassword")(version 3.0; acl "No password write"; '
+                'deny (write) userdn="ldap:///anyone";)')
+    # Always denied by "No password write"
+    ACI_SELF_WRITE = ('(targetattr="userPassword")(version 3.0; acl "Self password write"; '
+                      'allow (write) userdn="ldap:///self";)')
+
+    lint_dn = 'ou=lint,%s' % DEFAULT_SUFFIX
+    oentry = Entry(lint_dn)
+    oentry.setValues('objectclass', 'top', 'organizationalUnit')
+    oentry.setValues('ou', 'lint')
+    oentry.setValues('aci', ACI_READ, ACI_MAIL_READ, ACI_DENY, ACI_SELF_WRITE)
+    topology.standalone.add_s(oentry)
+
+    try:
+        (result, detail) = topology.standalone.aci.lint(lint_dn)
+        assert (result is False)
+        assert ([d['dsale'] for d in detail] == ['DSALE0003', 'DSALE0004'])
+        assert ('Anyone mail read' in detail[0]['acis'])
+        assert ('No password write' not in detail[0]['acis'])
+        assert ('Self password write' in detail[1]['acis'])
+        assert ('Anyone read' not in detail[1]['acis'])
+    finally:
+        topology.standalone.delete_s(lint_dn)
+
+
 if __name__ == "__main__":
     CURRENT_FILE = os.path.realpath(__file__)
     pytest.main("-s -vv %s" % CURRENT_FILE)
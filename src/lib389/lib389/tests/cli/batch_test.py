@@ -0,0 +1,107 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+
+import argparse
+import io
+import json
+import ldap
+import sys
+
+from lib389.cli_base import run_batch, setup_script_logger, _get_arg, _warn
+
+BATCH = """# A comment, then an empty line
+
+get first
+["get", "two words"]
+{"args": ["-b", "dc=other", "get"]}
+fail
+get last
+"""
+
+
+def _get(inst, basedn, log, args):
+    if args.json:
+        log.info(json.dumps({"type": "entry", "dn": basedn, "value": args.value}))
+    else:
+        log.info(f"{args.value} {basedn}")
+
+
+def _fail(inst, basedn, log, args):
+    raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+
+
+def _ask(inst, basedn, log, args):
+    log.info(_get_arg(args.value, msg="Enter a value"))
+
+
+def _delete(inst, basedn, log, args):
+    log.info(_warn(args.value, msg=f"Deleting {args.value}"))
+
+
+def _exit(inst, basedn, log, args):
+    sys.exit(int(args.value))
+
+
+def _run(batch, json_mode=False, stop_on_error=False):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('instance')
+    parser.add_argument('-j', '--json', action='store_true')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('-b', '--basedn')
+    subparsers = parser.add_subparsers()
+    get_parser = subparsers.add_parser('get')
+    get_parser.set_defaults(func=_get)
+    get_parser.add_argument('value', nargs='?')
+    subparsers.add_parser('fail').set_defaults(func=_fail)
+    for name, func in (('ask', _ask), ('delete', _delete), ('exit', _exit)):
+        cmd_parser = subparsers.add_parser(name)
+        cmd_parser.set_defaults(func=func)
+        cmd_parser.add_argument('value', nargs='?')
+
+    args = parser.parse_args(['localhost'] + (['-j'] if json_mode else []))
+    args.stop_on_error = stop_on_error
+    log = setup_script_logger('batch_test', False)
+    stream = batch if hasattr(batch, 'read') else io.StringIO(batch)
+    return run_batch(parser, None, 'dc=example,dc=com', log, args, stream)
+
+
+def test_batch_json(capsys):
+    """Check that every command of a batch gets its own JSON result line"""
+    assert not _run(BATCH, json_mode=True)
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r['line'] for r in results] == [3, 4, 5, 6, 7]
+    assert [r['result'] for r in results] == ['success', 'success', 'success', 'failure', 'success']
+    assert results[1]['output'][0]['value'] == 'two words'
+    assert results[2]['output'][0]['dn'] == 'dc=other'
+    assert results[0]['output'][0]['dn'] == 'dc=example,dc=com'
+    assert results[3]['error']['desc'] == 'No such object'
+
+
+def test_batch_stop_on_error(capsys):
+    """Check that --stop-on-error skips the commands after a failure"""
+    assert not _run(BATCH, json_mode=True, stop_on_error=True)
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r['result'] for r in results] == ['success', 'success', 'success', 'failure']
+    assert _run("get first\nget second\n")
+
+
+def test_batch_no_prompt(capsys, monkeypatch):
+    """Check that the commands of a batch read from stdin can't prompt (and
+    read the next lines of the batch), that the confirmations are skipped,
+    and that a command exiting doesn't end the batch
+    """
+    batch = io.StringIO("ask\nget next\ndelete uid=x\nexit 2\nexit 0\nget last\n")
+    monkeypatch.setattr(sys, 'stdin', batch)
+    assert not _run(batch, json_mode=True)
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r['line'] for r in results] == [1, 2, 3, 4, 5, 6]
+    assert [r['result'] for r in results] == ['failure', 'success', 'success', 'failure', 'success', 'success']
+    assert 'batch mode' in results[0]['error']['desc']
+    assert results[1]['output'][0]['value'] == 'next'
+    assert results[2]['output'] == ['uid=x']
+    assert sys.stdin is batch
@@ -0,0 +1,96 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+
+import argparse
+import pytest
+
+from lib389.cli_base import LazySubParsersAction
+
+
+def _parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('instance')
+    subparsers = parser.add_subparsers(help="resources to act upon", action=LazySubParsersAction)
+    subparsers.add_lazy_parsers('lib389.cli_conf.config', ['config'])
+    subparsers.add_lazy_parsers('lib389.cli_conf.backup', ['backup'])
+    subparsers.add_lazy_parsers('lib389.cli_conf.pwpolicy', ['pwpolicy', 'localpwp'])
+    return parser, subparsers
+
+
+def test_lazy_parser():
+    """Check that only the module of the parsed command is loaded, and that
+    the help and the errors show all the commands
+    """
+    parser, subparsers = _parser()
+    args = parser.parse_args(['localhost', 'config', 'get'])
+    assert args.func.__module__ == 'lib389.cli_conf.config'
+    assert [lazy[0] for lazy in subparsers._lazy] == ['lib389.cli_conf.backup', 'lib389.cli_conf.pwpolicy']
+
+    # The second command of a module
+    args = parser.parse_args(['localhost', 'localpwp', 'list'])
+    assert args.func.__module__ == 'lib389.cli_conf.pwpolicy'
+    assert [lazy[0] for lazy in subparsers._lazy] == ['lib389.cli_conf.backup']
+
+    # The help lists the commands in the declaration order
+    help = parser.format_help()
+    assert not subparsers._lazy
+    assert '{config,backup,pwpolicy,localpwp}' in help
+    assert help.index('Manage online backups') < help.index('Manage the global password policy')
+
+    parser, subparsers = _parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(['localhost', 'unknown'])
+    assert not subparsers._lazy
+
+
+def _walk_help(parser, prog, helps):
+    # Format the help of every parser of the tree, like argparse-manpage
+    helps[prog] = parser.format_help()
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            commands = {choice.dest: choice.help for choice in action._choices_actions}
+            for name, subparser in action.choices.items():
+                assert subparser is not None
+                assert name in commands
+                _walk_help(subparser, f"{prog} {name}", helps)
+
+
+def test_lazy_parser_walk():
+    """Check that walking the subcommands loads them all, with their help
+    entries, and renders the same help tree as the loaded parsers
+    """
+    parser, subparsers = _parser()
+    helps = {}
+    _walk_help(parser, 'dsconf', helps)
+    assert not subparsers._lazy
+    assert 'dsconf backup create' in helps
+    assert 'dsconf localpwp list' in helps
+    assert [choice.dest for choice in subparsers._choices_actions] == ['config', 'backup', 'pwpolicy', 'localpwp']
+
+    loaded, loaded_subparsers = _parser()
+    loaded_subparsers.load_all()
+    loaded_helps = {}
+    _walk_help(loaded, 'dsconf', loaded_helps)
+    assert helps == loaded_helps
+
+    # The choices are looked up one by one too
+    parser, subparsers = _parser()
+    assert subparsers.choices['backup'] is not None
+    assert [lazy[0] for lazy in subparsers._lazy] == ['lib389.cli_conf.config', 'lib389.cli_conf.pwpolicy']
+    assert subparsers.choices.get('unknown') is None
+    assert not subparsers._lazy
+
+
+def test_lazy_parser_manpage():
+    """Check that argparse-manpage renders all the subcommands"""
+    manpage = pytest.importorskip('argparse_manpage.manpage')
+    parser, subparsers = _parser()
+    page = str(manpage.Manpage(parser, format='pretty'))
+    assert not subparsers._lazy
+    assert 'backup create' in page
+    assert 'Manage online backups' in page
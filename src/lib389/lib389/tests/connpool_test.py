@@ -0,0 +1,51 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+#
+
+import ldap
+import pytest
+from lib389.topologies import topology_st
+from lib389.connpool import DirSrvPool
+from lib389._constants import DN_DM, PW_DM
+
+
+def test_pool_reuse(topology_st):
+    """
+    Assert that connections are reused for the same server and identity, and
+    that a connection closed after an error is replaced.
+    """
+    inst = topology_st.standalone
+    pool = DirSrvPool(max_size=2, timeout=1, check_interval=0)
+
+    with pool.connection(inst.host, inst.port, DN_DM, PW_DM) as conn:
+        assert conn.whoami_s().startswith('dn: ')
+    with pool.connection(inst.host, inst.port, DN_DM, PW_DM) as conn:
+        conn.search_s('', ldap.SCOPE_BASE)
+    assert pool.stats['created'] == 1
+    assert pool.stats['reused'] == 1
+
+    # Both connections are busy
+    first = pool.acquire(inst.host, inst.port, DN_DM, PW_DM)
+    second = pool.acquire(inst.host, inst.port, DN_DM, PW_DM)
+    with pytest.raises(ldap.TIMEOUT):
+        pool.acquire(inst.host, inst.port, DN_DM, PW_DM)
+    pool.release(first)
+    pool.release(second, discard=True)
+
+    # The idle connection is checked, and the discarded one is replaced
+    conn = pool.acquire(inst.host, inst.port, DN_DM, PW_DM)
+    other = pool.acquire(inst.host, inst.port, DN_DM, PW_DM)
+    assert pool.stats['created'] == 3
+    assert pool.stats['failed_checks'] == 0
+    pool.release(conn)
+    pool.release(other)
+
+    # Another identity gets another connection
+    with pytest.raises(ldap.INVALID_CREDENTIALS):
+        pool.acquire(inst.host, inst.port, DN_DM, 'wrong password')
+    pool.close()
@@ -9,11 +9,21 @@
 from lib389._constants import *
 from lib389.utils import ensure_bytes, ensure_str
 from lib389 import DirSrv, Entry
+import os
 import pytest
+import re
 import time
 import shutil
+import logging
 import datetime
+import gzip
+from types import SimpleNamespace
+from dateutil.parser import parse as dt_parse
 from dateutil.tz import tzoffset
+from lib389.dirsrv_log import (AccessLogAnalyser, DirsrvLog, DirsrvLogIndex, parse_log_timestamp,
+                               _log_timestamp_second, MONTH_LOOKUP)
+
+log = logging.getLogger(__name__)
 
 INSTANCE_PORT = 54321
 INSTANCE_SERVERID = 'standalone'
@@ -61,6 +71,9 @@ def test_access_log_rotation(topology):
     assert(len(access_lines) > 0)
     access_lines = topology.standalone.ds_access_log.match_archive('.*fd=.*')
     assert(len(access_lines) > 0)
+    # The parallel scan gives the same lines, in timestamp order
+    assert(topology.standalone.ds_access_log.match_archive('.*fd=.*', parallel=2) == access_lines)
+    assert(topology.standalone.ds_access_log.analyse(parallel=2).summary()['connections'] > 0)
 
 
 def test_access_log(topology):
@@ -74,7 +87,7 @@ def test_access_log(topology):
         topology.standalone.ds_access_log.parse_line('[27/Apr/2016:12:49:49.726093186 +1000] conn=1 fd=64 slot=64 connection from ::1 to ::1') ==
         {
             'slot': '64', 'remote': '::1', 'action': 'CONNECT', 'timestamp': '[27/Apr/2016:12:49:49.726093186 +1000]', 'fd': '64', 'conn': '1', 'local': '::1',
-            'datetime': datetime.datetime(2016, 4, 27, 12, 0, 0, 726093, tzinfo=tzoffset(None, 36000))
+            'datetime': datetime.datetime(2016, 4, 27, 12, 49, 49, 726093, tzinfo=tzoffset(None, 36000))
         }
     )
     assert(
@@ -82,21 +95,21 @@ def test_access_log(topology):
         {
             'rem': 'base="cn=config" scope=0 filter="(objectClass=*)" attrs="nsslapd-instancedir nsslapd-errorlog nsslapd-accesslog nsslapd-auditlog nsslapd-certdir nsslapd-schemadir nsslapd-bakdir nsslapd-ldifdir"',  # noqa
             'action': 'SRCH', 'timestamp': '[27/Apr/2016:12:49:49.727235997 +1000]', 'conn': '1', 'op': '2',
-            'datetime': datetime.datetime(2016, 4, 27, 12, 0, 0, 727235, tzinfo=tzoffset(None, 36000))
+            'datetime': datetime.datetime(2016, 4, 27, 12, 49, 49, 727235, tzinfo=tzoffset(None, 36000))
         }
     )
     assert(
         topology.standalone.ds_access_log.parse_line('[27/Apr/2016:12:49:49.736297002 +1000] conn=1 op=4 fd=64 closed - U1') ==
         {
             'status': 'U1', 'fd': '64', 'action': 'DISCONNECT', 'timestamp': '[27/Apr/2016:12:49:49.736297002 +1000]', 'conn': '1', 'op': '4',
-            'datetime': datetime.datetime(2016, 4, 27, 12, 0, 0, 736297, tzinfo=tzoffset(None, 36000))
+            'datetime': datetime.datetime(2016, 4, 27, 12, 49, 49, 736297, tzinfo=tzoffset(None, 36000))
         }
     )
     assert(
         topology.standalone.ds_access_log.parse_line('[27/Apr/2016:12:49:49.736297002 -1000] conn=1 op=4 fd=64 closed - U1') ==
         {
             'status': 'U1', 'fd': '64', 'action': 'DISCONNECT', 'timestamp': '[27/Apr/2016:12:49:49.736297002 -1000]', 'conn': '1', 'op': '4',
-            'datetime': datetime.datetime(2016, 4, 27, 12, 0, 0, 736297, tzinfo=tzoffset(None, -36000))
+            'datetime': datetime.datetime(2016, 4, 27, 12, 49, 49, 736297, tzinfo=tzoffset(None, -36000))
         }
     )
 
@@ -113,11 +126,200 @@ def test_error_log(topology):
         topology.standalone.ds_error_log.parse_line('[27/Apr/2016:13:46:35.775670167 +1000] slapd started.  Listening on All Interfaces port 54321 for LDAP requests') ==  # noqa
         {
             'timestamp': '[27/Apr/2016:13:46:35.775670167 +1000]', 'message': 'slapd started.  Listening on All Interfaces port 54321 for LDAP requests',
-            'datetime': datetime.datetime(2016, 4, 27, 13, 0, 0, 775670, tzinfo=tzoffset(None, 36000))
+            'datetime': datetime.datetime(2016, 4, 27, 13, 46, 35, 775670, tzinfo=tzoffset(None, 36000))
         }
     )
 
 
+def test_access_log_operations(topology):
+    """Check the streaming operation parser and the aggregates"""
+    lines = [
+        '[27/Apr/2016:12:49:49.726093186 +1000] conn=1 fd=64 slot=64 connection from ::1 to ::1',
+        '[27/Apr/2016:12:49:49.727235997 +1000] conn=1 op=0 BIND dn="cn=Directory Manager" method=128 version=3',
+        '[27/Apr/2016:12:49:49.727235997 +1000] conn=1 op=0 RESULT err=0 tag=97 nentries=0 wtime=0.000 optime=0.001 etime=0.001 dn="cn=directory manager"',  # noqa
+        '[27/Apr/2016:12:49:49.727235997 +1000] conn=1 op=1 SRCH base="dc=example,dc=com" scope=2 filter="(description=x y)" attrs=ALL',  # noqa
+        '[27/Apr/2016:12:49:49.727235997 +1000] conn=1 op=1 RESULT err=0 tag=101 nentries=10 wtime=0.000 optime=0.500 etime=0.500 notes=A',  # noqa
+        '[27/Apr/2016:12:49:49.727235997 +1000] conn=1 op=2 SRCH base="dc=example,dc=com" scope=2 filter="(uid=a)" attrs=ALL',
+        '[27/Apr/2016:12:49:49.736297002 +1000] conn=1 op=3 UNBIND',
+        '[27/Apr/2016:12:49:49.736297002 +1000] conn=1 op=3 fd=64 closed - U1',
+    ]
+    ops = list(topology.standalone.ds_access_log.iter_operations(lines))
+    assert [op.action for op in ops] == ['CONNECT', 'BIND', 'SRCH', 'UNBIND', 'DISCONNECT']
+    assert ops[2].base == 'dc=example,dc=com'
+    assert ops[2].filter == '(description=x y)'
+    assert ops[2].etime == 0.5
+    assert ops[2].notes == 'A'
+
+    summary = topology.standalone.ds_access_log.analyse(lines).summary()
+    assert summary['connections'] == 1
+    assert summary['operations'] == {'BIND': 1, 'SRCH': 1, 'UNBIND': 1}
+    assert summary['unindexed_searches'] == 1
+    assert summary['top_unindexed_filters'] == [('(description=x y)', 1)]
+    assert summary['etime']['max'] == 0.5
+
+    # And against the real logs, including the rotated ones
+    assert topology.standalone.ds_access_log.analyse().summary()['connections'] > 0
+
+
+def test_access_log_analyser_merge():
+    """Check that merged analysers keep the first and last timestamps in
+    time order, across days, months and years
+    """
+    old = AccessLogAnalyser()
+    old.first, old.last = '[30/Dec/2020:10:00:00 +0000]', '[31/Dec/2020:23:59:59.500000000 +0000]'
+    new = AccessLogAnalyser()
+    new.first, new.last = '[02/Jan/2021:00:00:01 +0000]', '[10/Jan/2021:00:00:02 +0000]'
+    for (a, b) in ((old, new), (new, old)):
+        merged = AccessLogAnalyser().merge(a).merge(b)
+        assert merged.first == old.first
+        assert merged.last == new.last
+
+
+def test_match_archive_parallel(tmp_path):
+    """Check that the parallel search of the rotated logs returns the same
+    lines, in the same order, as the serial one, with the continuation lines
+    kept after their timestamped line
+    """
+    class FileLog(DirsrvLog):
+        def _get_log_path(self):
+            return str(tmp_path / 'errors')
+
+    (tmp_path / 'errors.20201231-000000').write_text(
+        '[31/Dec/2020:23:59:59 +0000] - ERR - a\n'
+        '  detail a\n')
+    with gzip.open(str(tmp_path / 'errors.20210101-000000.gz'), 'wt') as lf:
+        lf.write('  more detail a\n'
+                 '[01/Jan/2021:00:00:01 +0000] - ERR - b\n'
+                 '  detail b\n'
+                 '[01/Jan/2021:00:00:02 +0000] - INFO - c\n')
+    (tmp_path / 'errors').write_text(
+        '  detail c\n'
+        '[02/Jan/2021:00:00:00 +0000] - ERR - d\n'
+        '  detail d\n')
+
+    error_log = FileLog(SimpleNamespace(log=log))
+    expected = ['[31/Dec/2020:23:59:59 +0000] - ERR - a\n', '  detail a\n',
+                '  more detail a\n',
+                '[01/Jan/2021:00:00:01 +0000] - ERR - b\n', '  detail b\n',
+                '  detail c\n',
+                '[02/Jan/2021:00:00:00 +0000] - ERR - d\n', '  detail d\n']
+    assert error_log.match_archive(r'.* ERR |\s') == expected
+    assert error_log.match_archive(r'.* ERR |\s', parallel=2) == expected
+
+
+def test_parse_log_timestamp():
+    """Check the fixed format timestamp decoder"""
+    assert parse_log_timestamp('[27/Apr/2016:12:49:49.726093186 +1000]') == \
+        datetime.datetime(2016, 4, 27, 12, 49, 49, 726093, tzinfo=tzoffset(None, 36000))
+    assert parse_log_timestamp('[05/Oct/2021:01:02:03 -0530]') == \
+        datetime.datetime(2021, 10, 5, 1, 2, 3, 0, tzinfo=tzoffset(None, -19800))
+    assert parse_log_timestamp('05/Sep/2021:01:02:03.5 +0000') == \
+        datetime.datetime(2021, 9, 5, 1, 2, 3, 500000, tzinfo=tzoffset(None, 0))
+    with pytest.raises(ValueError):
+        parse_log_timestamp('[not a timestamp]')
+
+
+def test_parse_log_timestamp_dateutil():
+    """Check the fixed format decoder agrees with the generic dateutil based
+    parsing it replaced, and decodes each second only once
+    """
+    prog = re.compile(r'\[(?P<day>\d*)\/(?P<month>\w*)\/(?P<year>\d*):(?P<hour>\d*):(?P<minute>\d*):(?P<second>\d*)(.(?P<nanosecond>\d*))+\s(?P<tz>[\+\-]\d*)')  # noqa
+
+    def dateutil_parse(ts):
+        timedata = prog.match(ts).groupdict()
+        dt = dt_parse('{}-{}-{} {}:{}:{} {}'.format(
+            timedata['year'], MONTH_LOOKUP[timedata['month']], timedata['day'],
+            timedata['hour'], timedata['minute'], timedata['second'], timedata['tz']))
+        return dt.replace(microsecond=int(int(timedata['nanosecond']) / 1000))
+
+    # Many lines per second, like a busy access log
+    stamps = ['[27/Apr/2016:12:%02d:%02d.%09d +1000]' % (i // 6000 % 60, i // 100 % 60, i)
+              for i in range(2000)]
+    _log_timestamp_second.cache_clear()
+    for ts in stamps:
+        assert parse_log_timestamp(ts) == dateutil_parse(ts)
+    assert _log_timestamp_second.cache_info().misses == len(set(ts[:21] for ts in stamps))
+
+
+def test_access_log_index(topology):
+    """Check the rotated logs are indexed, and that the indexed queries
+    return the same lines as a full scan
+    """
+    access_log = topology.standalone.ds_access_log
+    lpath = access_log._get_log_path()
+    shutil.copyfile(lpath, lpath + '.20160516-104822')
+    indexes = access_log.index_archive()
+    assert len(indexes) > 0
+    assert os.path.exists(indexes[-1].index_path)
+    assert indexes[-1].data['operations'].get('SRCH', 0) > 0
+
+    all_lines = access_log.readlines_archive()
+    assert list(access_log.iter_lines_archive(conn=1)) == \
+        [line for line in all_lines if ' conn=1 ' in line]
+    start = parse_log_timestamp(all_lines[0][:all_lines[0].index(']') + 1])
+    assert len(list(access_log.iter_lines_archive(start=start))) == len(all_lines)
+    assert list(access_log.iter_lines_archive(end=start - datetime.timedelta(days=1))) == []
+
+
+def test_log_index_sidecars(tmp_path, monkeypatch):
+    """Check the indexes are reused, that the queries outside of a rotated
+    log do not read it, and that the indexes of the logs that are gone are
+    removed
+    """
+    class FileLog(DirsrvLog):
+        def _get_log_path(self):
+            return str(tmp_path / 'access')
+
+    rotated = tmp_path / 'access.20201231-000000'
+    rotated.write_text(
+        '[31/Dec/2020:23:59:58 +0000] conn=1 fd=64 slot=64 connection from ::1 to ::1\n'
+        '[31/Dec/2020:23:59:59 +0000] conn=1 op=0 SRCH base="dc=example,dc=com" scope=2 filter="(uid=a)" attrs=ALL\n'
+        '[31/Dec/2020:23:59:59 +0000] conn=1 op=0 RESULT err=0 tag=101 nentries=1 wtime=0.000 optime=0.001 etime=0.001\n')
+    (tmp_path / 'access').write_text(
+        '[01/Jan/2021:00:00:01 +0000] conn=2 fd=64 slot=64 connection from ::1 to ::1\n')
+    # The indexes of an expired log and of the current log
+    (tmp_path / '.access.20201230-000000.idx').write_text('{}')
+    (tmp_path / '.access.idx').write_text('{}')
+
+    builds = []
+    opens = []
+    real_build = DirsrvLogIndex.build
+    real_open = DirsrvLogIndex._open
+    monkeypatch.setattr(DirsrvLogIndex, 'build', lambda self: builds.append(self.path) or real_build(self))
+    monkeypatch.setattr(DirsrvLogIndex, '_open', lambda self: opens.append(self.path) or real_open(self))
+
+    access_log = FileLog(SimpleNamespace(log=log))
+    indexes = access_log.index_archive()
+    assert [index.data['operations'] for index in indexes] == [{'SRCH': 1}]
+    assert sorted(os.listdir(str(tmp_path))) == ['.access.20201231-000000.idx', 'access', 'access.20201231-000000']
+    assert builds == [str(rotated)]
+
+    # The index is reused, and tells the rotated log has no line of conn 2
+    del builds[:], opens[:]
+    assert list(access_log.iter_lines_archive(conn=2)) == \
+        ['[01/Jan/2021:00:00:01 +0000] conn=2 fd=64 slot=64 connection from ::1 to ::1\n']
+    assert list(access_log.iter_lines_archive(start=parse_log_timestamp('[01/Jan/2021:00:00:00 +0000]'))) == \
+        ['[01/Jan/2021:00:00:01 +0000] conn=2 fd=64 slot=64 connection from ::1 to ::1\n']
+    assert builds == []
+    assert opens == []
+    assert len(list(access_log.iter_lines_archive(conn=1))) == 3
+    assert opens == [str(rotated)]
+
+    # The rotated log is compressed, its index is replaced
+    with open(str(rotated), 'rb') as src, gzip.open(str(rotated) + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(str(rotated))
+    access_log.index_archive()
+    assert sorted(os.listdir(str(tmp_path))) == ['.access.20201231-000000.gz.idx', 'access', 'access.20201231-000000.gz']
+
+    # A removed log has no index
+    index = DirsrvLogIndex(str(rotated) + '.gz')
+    os.remove(index.path)
+    with pytest.raises(FileNotFoundError):
+        index.load()
+    assert not os.path.exists(index.index_path)
+
+
 if __name__ == "__main__":
     CURRENT_FILE = os.path.realpath(__file__)
     pytest.main("-s -vv %s" % CURRENT_FILE)
@@ -128,3 +128,28 @@ def test_delete_multivalue(topo):
     dse_ldif.delete(DN_CONFIG, fake_attr)
     assert not dse_ldif.get(DN_CONFIG, fake_attr)
 
+
+def test_batch(topo):
+    """Check that the edits of a batch are written together, and dropped on error"""
+
+    dse_ldif = DSEldif(topo.standalone)
+    fake_attr = "fakeAttr"
+
+    log.info("Add {} values to {} in a batch".format(fake_attr, DN_CONFIG))
+    with dse_ldif.batch():
+        dse_ldif.add(DN_CONFIG, fake_attr, "fake1")
+        dse_ldif.add(DN_CONFIG, fake_attr, "fake2")
+        # Not written yet
+        assert not DSEldif(topo.standalone).get(DN_CONFIG, fake_attr)
+    assert len(DSEldif(topo.standalone).get(DN_CONFIG, fake_attr)) == 2
+
+    log.info("Fail in a batch")
+    with pytest.raises(ValueError):
+        with dse_ldif.batch():
+            dse_ldif.delete(DN_CONFIG, fake_attr)
+            dse_ldif.delete(DN_CONFIG, "nonexistent")
+    assert len(dse_ldif.get(DN_CONFIG, fake_attr)) == 2
+
+    log.info("Clean up")
+    dse_ldif.delete(DN_CONFIG, fake_attr)
+    assert not DSEldif(topo.standalone).get(DN_CONFIG, fake_attr)
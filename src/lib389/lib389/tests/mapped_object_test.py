@@ -7,9 +7,11 @@
 # --- END COPYRIGHT BLOCK ---
 #
 
+import ldap
+import pytest
 from lib389.topologies import topology_st
-from lib389._mapped_object import DSLdapObject
-from lib389.idm.group import Group
+from lib389._mapped_object import DSLdapObject, get_cache_stats, reset_cache_stats
+from lib389.idm.group import Group, Groups
 from lib389._constants import DEFAULT_SUFFIX
 
 
@@ -21,3 +23,94 @@ def test_exists(topology_st):
     assert not group.exists()
     group.create(properties={'cn': 'MyTestGroup', 'ou': 'groups'})
     assert group.exists()
+
+
+def test_iter_list(topology_st):
+    """
+    Assert that iter_list and iter_filter stream the same objects as list and
+    filter, with and without paging, and can be stopped early.
+    """
+    groups = Groups(topology_st.standalone, DEFAULT_SUFFIX)
+    for i in range(10):
+        groups.create(properties={'cn': 'iter_group_%d' % i})
+    expected = sorted(g.dn for g in groups.list())
+    assert len(expected) >= 10
+    assert sorted(g.dn for g in groups.iter_list()) == expected
+    assert sorted(g.dn for g in groups.iter_list(paged_search=3)) == expected
+    assert sorted(g.dn for g in groups.list(paged_search=3)) == expected
+
+    found = sorted(g.dn for g in groups.iter_filter('(cn=iter_group_*)', paged_search=4))
+    assert found == sorted(g.dn for g in groups.filter('(cn=iter_group_*)'))
+    assert len(found) == 10
+
+    # Stopping early abandons the next page, and the connection is still usable
+    it = groups.iter_list(paged_search=2)
+    next(it)
+    it.close()
+    assert groups.get('iter_group_0').exists()
+
+
+def test_attribute_cache(topology_st):
+    """
+    Assert that the attribute cache is seeded from the search that created the
+    object, is invalidated on writes and can be refreshed.
+    """
+    groups = Groups(topology_st.standalone, DEFAULT_SUFFIX)
+    group = groups.create(properties={'cn': 'cache_group', 'description': 'before'})
+    groups.enable_cache()
+    cached = groups.get('cache_group')
+
+    reset_cache_stats()
+    assert cached.get_attr_val_utf8('description') == 'before'
+    assert cached.present('cn', 'cache_group')
+    assert get_cache_stats()['hits'] == 2
+    assert get_cache_stats()['misses'] == 0
+
+    # Changes done through another object are not seen until refresh()
+    group.replace('description', 'after')
+    assert cached.get_attr_val_utf8('description') == 'before'
+    cached.refresh()
+    assert cached.get_attr_val_utf8('description') == 'after'
+
+    # Writes through the object drop the cached values
+    cached.replace('description', 'again')
+    assert cached.get_attr_val_utf8('description') == 'again'
+    assert get_cache_stats()['invalidations'] == 1
+
+
+def test_batch(topology_st):
+    """
+    Assert that the writes of a batch are sent when it ends, are visible to
+    its reads, and are dropped on error.
+    """
+    groups = Groups(topology_st.standalone, DEFAULT_SUFFIX)
+    group = groups.create(properties={'cn': 'batch_group', 'description': 'before'})
+    other = groups.get('batch_group')
+
+    with group.batch():
+        assert group.get_attr_val_utf8('description') == 'before'
+        group.replace('description', 'after')
+        group.add('ou', ['one', 'two'])
+        group.remove('ou', 'one')
+        assert group.get_attr_val_utf8('description') == 'after'
+        assert group.get_attr_vals_utf8('ou') == ['two']
+        # Nothing was sent yet
+        assert other.get_attr_val_utf8('description') == 'before'
+    assert other.get_attr_val_utf8('description') == 'after'
+    assert other.get_attr_vals_utf8('ou') == ['two']
+
+    try:
+        with group.batch():
+            group.replace('description', 'dropped')
+            raise ValueError('stop')
+    except ValueError:
+        pass
+    assert group.get_attr_val_utf8('description') == 'after'
+
+    # A batch that can't read its attributes leaves the object as it was
+    group.delete()
+    with pytest.raises(ldap.NO_SUCH_OBJECT):
+        with other.batch(['description']):
+            pass
+    assert other._batch_depth == 0
+    assert other._cache is None
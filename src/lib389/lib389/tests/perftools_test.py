@@ -0,0 +1,155 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+#
+import ldap
+import logging
+import multiprocessing.pool
+import pytest
+import socket
+
+from lib389 import perftools
+from lib389.perftools import LoadGenerator
+
+log = logging.getLogger(__name__)
+
+
+class _StubServer(object):
+    """Directory answering the operations of the stub connections: every
+    third add fails, the connection of every lostEvery-th result is lost and
+    the two next connection attempts are refused, the submission of the
+    operations numbered in failedSubmits fails.
+    """
+
+    def __init__(self, lostEvery=40, failedSubmits=()):
+        self.entries = set()
+        self.adds = 0
+        self.results = 0
+        self.submits = 0
+        self.refused = 0
+        self.connects = 0
+        self.bad_deletes = []
+        self.lostEvery = lostEvery
+        self.failedSubmits = failedSubmits
+
+    def initialize(self, uri):
+        if self.refused:
+            self.refused -= 1
+            raise ldap.SERVER_DOWN()
+        self.connects += 1
+        return _StubConnection(self)
+
+
+class _StubConnection(object):
+    """Asynchronous LDAPObject whose operations complete immediately"""
+
+    def __init__(self, server):
+        self.server = server
+        # The responses are always ready
+        self.sockets = socket.socketpair()
+        self.sockets[1].send(b'\0')
+        self.pending = {}
+        self.msgid = 0
+
+    def _submit(self, rtype, dn=None):
+        self.server.submits += 1
+        if self.server.submits in self.server.failedSubmits:
+            raise ldap.SERVER_DOWN()
+        self.msgid += 1
+        self.pending[self.msgid] = (rtype, dn)
+        return self.msgid
+
+    def get_option(self, option):
+        return self.sockets[0].fileno()
+
+    def simple_bind_s(self, binddn, bindpw):
+        pass
+
+    def simple_bind(self, binddn, bindpw):
+        return self._submit(ldap.RES_BIND)
+
+    def search_ext(self, base, scope, filt, attrlist):
+        return self._submit(ldap.RES_SEARCH_RESULT)
+
+    def modify_ext(self, dn, mods):
+        return self._submit(ldap.RES_MODIFY, dn)
+
+    def add_ext(self, dn, attrs):
+        return self._submit(ldap.RES_ADD, dn)
+
+    def delete_ext(self, dn):
+        return self._submit(ldap.RES_DELETE, dn)
+
+    def result3(self, msgid, all=1, timeout=0):
+        server = self.server
+        rtype, dn = self.pending.pop(msgid)
+        server.results += 1
+        if server.lostEvery and server.results % server.lostEvery == 0:
+            server.refused = 2
+            raise ldap.SERVER_DOWN()
+        if rtype == ldap.RES_ADD:
+            server.adds += 1
+            if server.adds % 3 == 0:
+                raise ldap.ALREADY_EXISTS()
+            server.entries.add(dn)
+        elif rtype == ldap.RES_DELETE:
+            if dn not in server.entries:
+                server.bad_deletes.append(dn)
+                raise ldap.NO_SUCH_OBJECT()
+            server.entries.remove(dn)
+        return (rtype, [], msgid, [])
+
+    def unbind_s(self):
+        for s in self.sockets:
+            s.close()
+
+
+def test_load_generator_errors(monkeypatch):
+    """Check the load goes on after lost connections and refused
+    reconnections, and only deletes the entries it succeeded to add
+    """
+    server = _StubServer()
+    monkeypatch.setattr(ldap, 'initialize', server.initialize)
+    # Run the worker in this process, to use the stub connections
+    monkeypatch.setattr(multiprocessing, 'Pool', multiprocessing.pool.ThreadPool)
+    monkeypatch.setattr(perftools, 'LOAD_RECONNECT_DELAY', 0.01)
+    load = LoadGenerator('ldap://localhost:389', 'cn=Directory Manager', 'password', 'ou=people,dc=example,dc=com',
+                         100, { 'search' : 40, 'add' : 30, 'delete' : 30 }, nbClients=3,
+                         interval=0.25, nbIntervals=2, seed=1)
+    res = load.run()
+    log.info(f"load result: {res}")
+    assert server.bad_deletes == []
+    assert res['errors']['add'] > 0
+    # Each lost connection is followed by two refused reconnections
+    assert server.connects > 3
+    assert res['connect_errors'] >= 2
+    assert all(rate > 0 for rate in res['rates'])
+
+
+def test_load_generator_submit_errors(monkeypatch):
+    """Check the clients whose operation could not be sent reconnect and
+    go on with the load
+    """
+    # The second operation of each of the three clients fails
+    server = _StubServer(lostEvery=0, failedSubmits=(4, 5, 6))
+    monkeypatch.setattr(ldap, 'initialize', server.initialize)
+    monkeypatch.setattr(multiprocessing, 'Pool', multiprocessing.pool.ThreadPool)
+    monkeypatch.setattr(perftools, 'LOAD_RECONNECT_DELAY', 0.01)
+    load = LoadGenerator('ldap://localhost:389', 'cn=Directory Manager', 'password', 'ou=people,dc=example,dc=com',
+                         100, { 'search' : 100 }, nbClients=3, interval=0.25, nbIntervals=2, seed=1)
+    res = load.run()
+    log.info(f"load result: {res}")
+    assert server.connects == 6
+    assert server.submits > 6
+    assert all(rate > 0 for rate in res['rates'])
+
+
+def test_load_generator_mix():
+    """Check a mix deleting entries without adding any is rejected"""
+    with pytest.raises(ValueError, match='add'):
+        LoadGenerator('ldap://localhost:389', 'cn=Directory Manager', 'password', 'ou=people,dc=example,dc=com',
+                      100, { 'search' : 50, 'delete' : 50 })
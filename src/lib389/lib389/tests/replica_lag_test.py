@@ -0,0 +1,86 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+#
+import json
+import logging
+
+from lib389 import replica
+from lib389.replica import ReplicationLagSampler, summarize_lag_samples
+from lib389.cli_base import FakeArgs, LogCapture
+from lib389.cli_conf.replication import tail_repl_lag, _tail_lag_samples
+
+log = logging.getLogger(__name__)
+
+
+def _samples(count, agmt='to-m2'):
+    return [{"time": 1617000000.0 + i, "agmt": agmt, "consumer": "m2.example.com:389",
+             "lag": None if i % 10 == 9 else i % 7, "supplier_csn": None, "consumer_csn": None,
+             "status": "Error (0)"} for i in range(count)]
+
+
+def test_lag_sampler_record(tmp_path):
+    """Check the samples are kept in a ring buffer per agreement, and appended to the file"""
+    path = str(tmp_path / 'lag.jsonl')
+    sampler = ReplicationLagSampler(None, 'dc=example,dc=com', capacity=5, path=path)
+    records = _samples(8) + _samples(3, agmt='to-m3')
+    sampler.record(records)
+    assert list(sampler.samples['to-m2']) == records[3:8]
+    assert list(sampler.samples['to-m3']) == records[8:]
+    assert ReplicationLagSampler.read_samples(path) == records
+    summary = sampler.summary()
+    assert summary['to-m2']['samples'] == 5
+    assert summary['to-m3']['samples'] == 3
+    assert ReplicationLagSampler._csn_time('5f0000010000000a0000') == 0x5f000001
+    assert ReplicationLagSampler._csn_time(None) is None
+
+
+def test_lag_sampler_run():
+    """Check the sampler takes the given number of samples and calls back with each of them"""
+    sampler = ReplicationLagSampler(None, 'dc=example,dc=com', interval=0)
+    records = iter(_samples(3))
+    sampler.sample = lambda: [next(records)]
+    seen = []
+    sampler.run(count=3, callback=seen.append)
+    assert [s[0]['time'] for s in seen] == [1617000000.0, 1617000001.0, 1617000002.0]
+
+
+def test_lag_read_samples_last(tmp_path, monkeypatch):
+    """Check the last samples are read from the end of the file, across
+    blocks, and skipping a partially written last line
+    """
+    path = tmp_path / 'lag.jsonl'
+    records = _samples(50)
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records) + '{"time": 161')
+    monkeypatch.setattr(replica, 'LAG_SAMPLES_READ_SIZE', 100)
+    for last in (0, 1, 7, 50, 80):
+        assert ReplicationLagSampler.read_samples(str(path), last=last) == records[50 - min(last, 50):]
+
+
+def test_lag_tail(tmp_path):
+    """Check the samples displayed by lag-tail, with and without --lines"""
+    path = str(tmp_path / 'lag.jsonl')
+    records = _samples(30)
+    ReplicationLagSampler(None, 'dc=example,dc=com', path=path).record(records)
+
+    samples, summary = _tail_lag_samples(path, 4, False)
+    assert samples == records[-4:]
+    assert summary == summarize_lag_samples(records)
+    assert _tail_lag_samples(path, 4, True) == (records[-4:], None)
+    assert _tail_lag_samples(path, 0, False)[0] == []
+    assert _tail_lag_samples(path, 0, True) == ([], None)
+
+    logcap = LogCapture()
+    args = FakeArgs()
+    args.file = path
+    args.lines = 0
+    args.follow = False
+    args.json = True
+    tail_repl_lag(None, None, logcap.log, args)
+    # Only the summary, no sample
+    assert len(logcap.outputs) == 1
+    assert json.loads(logcap.outputs[0].getMessage())['items']['to-m2']['samples'] == 30
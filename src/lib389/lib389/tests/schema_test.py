@@ -113,6 +113,40 @@ def test_x_origin(topo):
     assert " 'USER_DEFINED' " in str(myschema.query_attributetype("testattrtwo"))
 
 
+def test_schema_cache(topo):
+    """Check that the parsed schema is reused, and refreshed on schema changes
+
+    :id: 4d1a0c3e-6a8f-4d2b-9a55-0c86d8a4a1f2
+    :setup: Standalone Instance
+    :steps:
+        1. Query an objectclass by name and by OID
+        2. Add an attribute type with another Schema object
+        3. Query the new attribute type
+        4. Remove it and query it again
+    :expectedresults:
+        1. Success
+        2. Success
+        3. The attribute type is found
+        4. The attribute type is not found
+    """
+    schema = Schema(topo.standalone)
+    account = schema.query_objectclass('account')
+    assert account.names == ('account', )
+    assert schema.query_objectclass(account.oid).names == ('account', )
+    # The lookups return copies of the cached objects
+    account.names = ('changed', )
+    assert schema.query_objectclass('account').names == ('account', )
+
+    Schema(topo.standalone).add_attributetype({'names': ('testcacheattr', ), 'oid': '8.9.10.11.12.13.20',
+                                               'syntax': '1.3.6.1.4.1.1466.115.121.1.15'})
+    attrtype, must, may = schema.query_attributetype('testcacheattr')
+    assert "'testcacheattr'" in attrtype
+
+    Schema(topo.standalone).remove_attributetype('testcacheattr')
+    with pytest.raises(ValueError):
+        schema.query_attributetype('testcacheattr', json=True)
+
+
 if __name__ == '__main__':
     # Run isolated
     # -s for DEBUG mode
@@ -0,0 +1,70 @@
+# --- BEGIN COPYRIGHT BLOCK ---
+# Copyright (C) 2021 Red Hat, Inc.
+# All rights reserved.
+#
+# License: GPL (version 3 or any later version).
+# See LICENSE for details.
+# --- END COPYRIGHT BLOCK ---
+#
+import os
+import time
+
+from lib389.topologies import topology_st
+from lib389.cli_conf.backend import _count_ldif_entries
+from lib389.tasks import TASK_WAIT_PERIOD, Task, SchemaReloadTask, SyntaxValidateTask, ExportTask, wait_tasks
+from lib389._constants import DEFAULT_SUFFIX
+
+
+def test_task_wait(topology_st):
+    """
+    Assert that a task is seen as complete with and without persistent
+    search, and that several tasks can be waited for together.
+    """
+    inst = topology_st.standalone
+
+    for psearch in (True, False):
+        task = SchemaReloadTask(inst)
+        task.create()
+        assert task.wait(psearch=psearch, timeout_secs=60)
+        assert task.get_exit_code() == 0
+
+    tasks = []
+    for i in range(3):
+        task = SyntaxValidateTask(inst)
+        task.create(properties={'basedn': DEFAULT_SUFFIX})
+        tasks.append(task)
+    assert wait_tasks(tasks, timeout=60) == []
+    assert all(task.get_exit_code() == 0 for task in tasks)
+
+    # An entry without exit code is never complete
+    task = Task(inst, DEFAULT_SUFFIX)
+    assert not task.wait(timeout_secs=1)
+    # The timeout counts periods of 2 seconds, as it always did
+    start = time.monotonic()
+    assert not task.wait(timeout=1, psearch=False)
+    assert time.monotonic() - start >= TASK_WAIT_PERIOD
+    assert wait_tasks([task], timeout=1, psearch=False) == [task]
+
+
+def test_task_progress(topology_st, tmp_path):
+    """
+    Assert that the progress of an export is followed until it is complete,
+    that the whole task log is returned line by line, and that the entries
+    exported are the ones of the LDIF file.
+    """
+    inst = topology_st.standalone
+    # The server writes the LDIF file
+    os.chmod(str(tmp_path), 0o777)
+    ldif = str(tmp_path / 'task_progress_test.ldif')
+
+    task = ExportTask(inst)
+    task.export_suffix_to_ldif(ldiffile=ldif, suffix=DEFAULT_SUFFIX)
+    lines = []
+    for progress in task.progress(timeout=60):
+        lines += progress.lines
+    assert progress.complete
+    assert progress.exit_code == 0
+    assert progress.entries is not None
+    assert lines == task.get_task_log().splitlines()
+    assert _count_ldif_entries([ldif]) == progress.entries
+    assert _count_ldif_entries([ldif, str(tmp_path / 'missing.ldif')]) is None
@@ -1451,3 +1451,106 @@ def is_fips():
         return False
 
 
+class Histogram(object):
+    """A bounded memory histogram for latencies and other positive values.
+
+    Values are kept in log-linear buckets (in the spirit of HdrHistogram), so
+    memory use only depends on the dynamic range of the data and not on the
+    number of recorded values. Percentiles are accurate to roughly 1/64 of
+    the value.
+
+    :param scale: Multiplier applied to recorded values before bucketing,
+                  the default keeps microsecond resolution for seconds
+    :type scale: int
+    :param precision: Number of significant bits kept per bucket
+    :type precision: int
+    """
+
+    def __init__(self, scale=1000000, precision=7):
+        self._scale = scale
+        self._precision = precision
+        self._buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value):
+        shift = max(value.bit_length() - self._precision, 0)
+        return (shift, value >> shift)
+
+    def record(self, value, count=1):
+        """Record a value
+
+        :param value: The value to record, negative values are clamped to 0
+        :type value: float
+        :param count: How many times the value was seen
+        :type count: int
+        """
+        if value < 0:
+            value = 0
+        key = self._key(int(value * self._scale))
+        self._buckets[key] = self._buckets.get(key, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add all the values recorded by another histogram to this one
+
+        :param other: A histogram created with the same scale and precision
+        :type other: Histogram
+        """
+        for key, count in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def mean(self):
+        """Return the mean of the recorded values, or None if empty"""
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def percentile(self, pct):
+        """Return the value at the given percentile, or None if empty
+
+        :param pct: The percentile, between 0 and 100
+        :type pct: float
+        :returns: float
+        """
+        if self.count == 0:
+            return None
+        target = max(math.ceil(self.count * pct / 100.0), 1)
+        seen = 0
+        for (shift, base) in sorted(self._buckets):
+            seen += self._buckets[(shift, base)]
+            if seen >= target:
+                # Report the middle of the bucket, clamped to what was seen
+                value = ((base << shift) + ((1 << shift) - 1) / 2) / self._scale
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Return a dict describing the distribution
+
+        :param percentiles: The percentiles to include in the summary
+        :type percentiles: tuple
+        :returns: dict
+        """
+        result = {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean(),
+        }
+        for pct in percentiles:
+            result['p%s' % ('%g' % pct).replace('.', '')] = self.percentile(pct)
+        return result